@@ -4,17 +4,16 @@ import sys, os
 from typing import Optional, List
 from agent_app.models import Campaign, Lead
 from django.utils import timezone
-from agent_app.message_service import generate_message
+from agent_app.message_service import prepare_campaign_context
+from agent_app.services.campaign_engine import generate_campaign_messages
+from agent_app.services.llm_cache import get_llm_cache_stats
 from agent_app.fetch_replies import fetch_lead_replies
 
 
 
 
-# --- Add ragImplementation folder to Python path ---
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../ragImplementation")))
-
-# --- Importing RAG query function ---
-from rag_main import query
+# --- RAG pipeline (rag_main), imported on first use ---
+from agent_app.integrations import rag_main
 
 
 # --- Importing Lead model ---
@@ -33,21 +32,20 @@ def hello(request):
 # -------------------------------
 
 @api.get("/search")
-def search(request, q: str):
+def search(request, q: str, mode: Optional[str] = None, projects: Optional[str] = None):
     print(f"📨 Received query via API: {q}")
 
+    # Comma-separated project names narrow the search to those brochures
+    project_names = [p.strip() for p in (projects or "").split(",") if p.strip()]
     
-    # Call your RAG query function
-    results = query(q)
+    # Call your RAG query function ('vector', 'lexical' or 'hybrid' retrieval)
+    try:
+        results = rag_main.query(q, mode=mode, projects=project_names or None)
+    except ValueError as e:
+        return api.create_response(request, {"query": q, "message": str(e)}, status=400)
     
     # Format the results for JSON output
-    response = []
-    for r in results:
-        response.append({
-            "source": r.metadata["file_name"],
-            "chunk_id": r.metadata["chunk_id"],
-            "text": r.page_content
-        })
+    response = format_search_results(results)
 
     if not results:
         return {"query": q, "message": "No relevant brochures found."}
@@ -56,6 +54,90 @@ def search(request, q: str):
     return {"query": q, "results": response}
 
 
+def format_search_results(results):
+    return [
+        {
+            "source": r.metadata["file_name"],
+            "chunk_id": r.metadata["chunk_id"],
+            "project": r.metadata.get("project"),
+            # Brochure page the chunk comes from (None for chunks stored before page-anchored chunking)
+            "page": r.metadata.get("page"),
+            # Every brochure that contains this chunk (duplicates are stored once)
+            "sources": rag_main.chunk_sources(r.metadata["file_name"], r.metadata["chunk_id"]),
+            "text": r.page_content
+        }
+        for r in results
+    ]
+
+
+# Largest number of queries accepted by one /search/batch request
+SEARCH_BATCH_MAX_QUERIES = int(os.environ.get('SEARCH_BATCH_MAX_QUERIES', '256'))
+
+
+class BatchSearchQuery(Schema):
+    q: str
+    top_k: Optional[int] = None
+    projects: Optional[List[str]] = None
+
+
+class BatchSearchIn(Schema):
+    queries: List[BatchSearchQuery]
+    mode: Optional[str] = None
+
+
+@api.post("/search/batch")
+def search_batch(request, payload: BatchSearchIn):
+    """
+    Runs many searches in one request: the queries are embedded in one
+    batched call and their vector searches run together. Results are keyed
+    by query text, so each `q` may appear once per batch.
+    """
+    queries = payload.queries
+    print(f"📨 Received batch of {len(queries)} queries via API")
+
+    if len(queries) > SEARCH_BATCH_MAX_QUERIES:
+        return api.create_response(
+            request, {"message": f"At most {SEARCH_BATCH_MAX_QUERIES} queries per batch"}, status=400
+        )
+    texts = [item.q for item in queries]
+    if len(set(texts)) != len(texts):
+        return api.create_response(request, {"message": "Each query may appear only once per batch"}, status=400)
+    if any(item.top_k is not None and item.top_k < 1 for item in queries):
+        return api.create_response(request, {"message": "top_k must be at least 1"}, status=400)
+
+    try:
+        results = rag_main.query_brochures_batch(
+            [
+                {
+                    "query": item.q,
+                    "top_k": item.top_k,
+                    "projects": [p.strip() for p in (item.projects or []) if p.strip()] or None,
+                }
+                for item in queries
+            ],
+            mode=payload.mode
+        )
+    except ValueError as e:
+        return api.create_response(request, {"message": str(e)}, status=400)
+
+    return {
+        "count": len(queries),
+        "results": {item.q: format_search_results(found) for item, found in zip(queries, results)},
+    }
+
+
+@api.get("/search/cache_stats")
+def search_cache_stats(request):
+    """Hit/miss counters of this worker's retrieval cache."""
+    return rag_main.get_query_cache_stats()
+
+
+@api.get("/llm/cache_stats")
+def llm_cache_stats(request, campaign_id: Optional[int] = None):
+    """Hits, hit rate and model latency saved by the LLM response cache in this worker, overall or for one campaign."""
+    return get_llm_cache_stats(campaign_id)
+
+
 
 
 # -------------------------------
@@ -177,28 +259,75 @@ def create_campaign(request, data: CampaignIn):
 
 
 @api.post("/campaigns/generate_messages")
-def send_messages(request, campaign_id: int):
-    campaign = Campaign.objects.get(id=campaign_id)
-    leads = campaign.leads.all()
+def send_messages(request, campaign_id: int, use_cache: bool = True):
+    # use_cache=false redrafts every message instead of reusing cached Gemini responses
+    try:
+        campaign = Campaign.objects.get(id=campaign_id)
+    except Campaign.DoesNotExist:
+        return api.create_response(request, {"status": "error", "message": "Campaign not found"}, status=404)
+    leads = list(campaign.leads.all())
+
+    # One RAG lookup per distinct project pair instead of one per lead
+    contexts, context_stats = prepare_campaign_context(campaign, leads)
+
+    # Gemini calls run several at a time, with the template as per-lead fallback
+    messages, generation_stats = generate_campaign_messages(campaign, leads, contexts, use_cache=use_cache)
 
     generated = []
-    for lead in leads:
-        message_body = generate_message(lead, campaign)
+    for message in messages:
+        lead = message["lead"]
         generated.append({
             "lead_id": lead.lead_id,
             "lead_name": lead.lead_name,
             "email": lead.email,
-            "message_preview": message_body[:120]
+            "source": message["source"],
+            "message_preview": message["body"][:120]
         })
 
     return {
         "status": "success",
         "campaign_id": campaign.id,
         "messages_generated": len(generated),
+        "template_fallbacks": generation_stats["fallback"],
+        "leads_per_minute": generation_stats["leads_per_minute"],
+        "p95_ms": generation_stats["p95_ms"],
+        "llm_cache_hits": generation_stats["cache_hits"],
+        "llm_cache_hit_rate": generation_stats["cache_hit_rate"],
+        "llm_cache_saved_ms": generation_stats["cache_saved_ms"],
+        "context_lookups": context_stats["lookups"],
+        "context_lookups_saved": context_stats["lookups_saved"],
         "details": generated
     }
 
 
+from agent_app.services.campaign_sends import send_progress, start_campaign_send
+
+
+@api.post("/campaigns/{campaign_id}/send")
+def start_send(request, campaign_id: int):
+    """Queues the campaign's pending and failed leads for sending; poll send_progress for progress."""
+    try:
+        campaign = Campaign.objects.get(id=campaign_id)
+    except Campaign.DoesNotExist:
+        return api.create_response(request, {"status": "error", "message": "Campaign not found"}, status=404)
+    job = start_campaign_send(campaign)
+    return {
+        "status": "queued",
+        "campaign_id": campaign.id,
+        "job_id": job.id,
+        "progress_url": f"/api/campaigns/{campaign.id}/send_progress",
+    }
+
+
+@api.get("/campaigns/{campaign_id}/send_progress")
+def campaign_send_progress(request, campaign_id: int):
+    """Per-status lead counts and the stage (generate/send/log) of the campaign's latest send job."""
+    try:
+        return send_progress(Campaign.objects.get(id=campaign_id))
+    except Campaign.DoesNotExist:
+        return api.create_response(request, {"status": "error", "message": "Campaign not found"}, status=404)
+
+
 from agent_app.models import Campaign, FollowUpMessage
 from agent_app.message_service import send_followup_email
 
@@ -243,94 +372,56 @@ def get_replies(request):
 # 5️⃣ Document Upload/Ingestion Endpoint
 # -------------------------------
 
-# Add ragImplementation to path (already added above, but ensuring it's here)
-from rag_main import load_documents, split_into_chunks, generate_embeddings, store_in_chromadb
+from agent_app.models import IngestionJob
+from agent_app.services.ingestion_jobs import (
+    create_ingestion_job, fail_stale_ingestion_jobs, ingestion_queue_full, job_status
+)
 
 @api.post("/documents/upload")
 def upload_document(request, file: UploadedFile = File(...)):
     """
-    Upload and ingest a document (PDF brochure).
-    Accepts PDF file, processes it through the ingestion pipeline:
-    1. File Upload
+    Upload a document (PDF brochure) for ingestion.
+    The file is buffered in memory (never written to disk) and queued; a background worker then runs the
+    incremental ingestion pipeline:
+    1. Extract
     2. Chunking/Splitting
     3. Embedding
     4. Storage in ChromaDB
+    Returns a job id at once; poll /documents/jobs/{job_id} for progress.
+    Re-uploading an unchanged file is a no-op; a changed file replaces its old chunks.
     """
     try:
         # Validate file type
         if not file.name.lower().endswith('.pdf'):
-            return {"status": "error", "message": "Only PDF files are supported"}, 400
-        
-        # Save uploaded file temporarily
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        temp_dir = os.path.join(BASE_DIR, "../../ragImplementation/temp_uploads")
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        file_path = os.path.join(temp_dir, file.name)
-        
-        # Read file content and save
-        file_content = file.read()
-        with open(file_path, 'wb') as destination:
-            destination.write(file_content)
-        
-        # Step 1: Load document
-        documents = load_documents(temp_dir)
-        if not documents:
-            # Clean up
-            try:
-                os.remove(file_path)
-            except Exception:
-                pass
-            return {"status": "error", "message": "Failed to load document"}, 400
-        
-        # Step 2: Split into chunks
-        chunks = split_into_chunks(documents)
-        if not chunks:
-            # Clean up
-            try:
-                os.remove(file_path)
-            except Exception:
-                pass
-            return {"status": "error", "message": "Failed to chunk document"}, 400
-        
-        # Step 3: Generate embeddings
-        try:
-            embedded_chunks = generate_embeddings(chunks)
-        except Exception as e:
-            # Clean up
-            try:
-                os.remove(file_path)
-            except Exception:
-                pass
-            return {"status": "error", "message": f"Failed to generate embeddings: {str(e)}"}, 500
-        
-        # Step 4: Store in ChromaDB
-        try:
-            # Get ChromaDB path
-            CHROMA_DB_PATH = os.path.abspath(os.path.join(BASE_DIR, "../../ragImplementation/chroma_db"))
-            
-            vectorstore = store_in_chromadb(embedded_chunks, persist_directory=CHROMA_DB_PATH)
-            
-            # Clean up temporary file
-            try:
-                os.remove(file_path)
-            except Exception:
-                pass
-            
-            return {
-                "status": "success",
-                "message": "Document uploaded and ingested successfully",
-                "chunks_created": len(embedded_chunks),
-                "file_name": file.name
-            }
-        except Exception as e:
-            # Clean up
-            try:
-                os.remove(file_path)
-            except Exception:
-                pass
-            return {"status": "error", "message": f"Failed to store in ChromaDB: {str(e)}"}, 500
+            return api.create_response(request, {"status": "error", "message": "Only PDF files are supported"},
+                                       status=400)
+
+        if ingestion_queue_full():
+            return api.create_response(
+                request, {"status": "error", "message": "Too many documents are being ingested, try again shortly"},
+                status=429
+            )
+
+        job = create_ingestion_job(file.name, file.chunks())
+
+        return {
+            "status": "queued",
+            "message": "Document uploaded and queued for ingestion",
+            "job_id": job.id,
+            "file_name": file.name,
+            "status_url": f"/api/documents/jobs/{job.id}"
+        }
         
     except Exception as e:
-        return {"status": "error", "message": f"Upload failed: {str(e)}"}, 500
+        return api.create_response(request, {"status": "error", "message": f"Upload failed: {str(e)}"}, status=500)
 
+
+@api.get("/documents/jobs/{job_id}")
+def ingestion_job_status(request, job_id: int):
+    """Stage (extract/chunk/embed/store), progress counts and errors of an ingestion job."""
+    try:
+        # A job lost with its worker process reads as failed instead of queued forever
+        fail_stale_ingestion_jobs()
+        return job_status(IngestionJob.objects.get(id=job_id))
+    except IngestionJob.DoesNotExist:
+        return api.create_response(request, {"status": "error", "message": "Ingestion job not found"}, status=404)
@@ -1,6 +1,19 @@
+import os
+
 from django.apps import AppConfig
 
 
 class AgentAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'agent_app'
+
+    def ready(self):
+        # Optionally load the embedding model at worker boot so the first
+        # /api/search request does not pay the model load.
+        if os.environ.get('RAG_WARM_EMBEDDINGS', 'False') == 'True':
+            from agent_app.integrations import rag_main
+            try:
+                rag_main.warm_up_embedding_model()
+                print("[RAG] Embedding model warmed up")
+            except Exception as e:
+                print(f"[WARNING] Embedding model warm-up failed: {e}")
@@ -0,0 +1,82 @@
+"""
+Lazy access to the heavy integrations: the RAG pipeline (rag_main, which
+pulls in langchain, chromadb and the embedding backends), Gemini
+(google.generativeai) and Vanna text-to-SQL.
+
+Importing this module is cheap. Each integration is imported the first time
+one of its attributes is used and is cached from then on, so
+`manage.py migrate`, test collection and worker boot do not pay for it.
+"""
+import importlib
+import os
+import sys
+import threading
+
+RAG_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../ragImplementation"))
+if RAG_DIR not in sys.path:
+    sys.path.append(RAG_DIR)
+
+# Only ever taken from the environment
+GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', '')
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported (and set up by `setup`, if given)
+    on first attribute access.
+    """
+
+    def __init__(self, name, setup=None):
+        self._name = name
+        self._setup = setup
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    module = importlib.import_module(self._name)
+                    if self._setup is not None:
+                        self._setup(module)
+                    self._module = module
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+rag_main = LazyModule("rag_main")
+
+def _configure_genai(module):
+    if not GEMINI_API_KEY:
+        raise RuntimeError(
+            "GEMINI_API_KEY is not set. Set it to call Gemini, or set LLM_PROVIDER=stub to run without a model."
+        )
+    module.configure(api_key=GEMINI_API_KEY)
+
+
+genai = LazyModule("google.generativeai", setup=_configure_genai)
+
+
+_vanna = None
+_vanna_lock = threading.Lock()
+
+
+def get_vanna(model, api_key):
+    """Returns the process's Vanna client for `model`, importing vanna on first use."""
+    global _vanna
+    if _vanna is None:
+        with _vanna_lock:
+            if _vanna is None:
+                from vanna.remote import VannaDefault
+                _vanna = VannaDefault(model=model, api_key=api_key)
+    return _vanna
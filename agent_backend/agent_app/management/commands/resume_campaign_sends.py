@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from agent_app.services.campaign_sends import get_executor, resume_campaign_sends
+
+
+class Command(BaseCommand):
+    help = (
+        "Resumes the campaign send jobs left queued or running by a crashed or restarted process. "
+        "Run it while no server process is sending."
+    )
+
+    def handle(self, *args, **options):
+        jobs = resume_campaign_sends()
+        # Jobs run in this process's pool; wait for them to finish
+        get_executor().shutdown(wait=True)
+        self.stdout.write(f"Resumed {len(jobs)} campaign send job(s)")
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.26 on 2026-10-17 04:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_app', '0008_campaignlead_proposed_datetime_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255)),
+                ('file_path', models.CharField(blank=True, default='', max_length=1024)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('stage', models.CharField(choices=[('queued', 'Queued'), ('extract', 'Extract'), ('chunk', 'Chunk'), ('embed', 'Embed'), ('store', 'Store'), ('done', 'Done')], default='queued', max_length=20)),
+                ('pages_extracted', models.IntegerField(default=0)),
+                ('chunks_created', models.IntegerField(default=0)),
+                ('chunks_embedded', models.IntegerField(default=0)),
+                ('chunks_stored', models.IntegerField(default=0)),
+                ('unchanged', models.BooleanField(default=False)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.26 on 2026-10-17 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_app', '0009_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='ingestionjob',
+            name='file_path',
+        ),
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='file_size',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
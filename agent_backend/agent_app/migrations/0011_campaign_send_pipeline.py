@@ -0,0 +1,32 @@
+# Generated by Django 4.2.26 on 2026-10-17 05:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_app', '0010_ingestionjob_file_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaignlead',
+            name='send_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='CampaignSendJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('stage', models.CharField(choices=[('queued', 'Queued'), ('generate', 'Generate'), ('send', 'Send'), ('log', 'Log'), ('done', 'Done')], default='queued', max_length=20)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='send_jobs', to='agent_app.campaign')),
+            ],
+        ),
+    ]
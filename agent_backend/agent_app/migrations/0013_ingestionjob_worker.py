@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-17 07:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_app', '0012_llmresponsecache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='worker',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.26 on 2026-10-17 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agent_app', '0013_ingestionjob_worker'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaignsendjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='campaignsendjob',
+            name='worker',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
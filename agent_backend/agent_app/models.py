@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class Lead(models.Model):
@@ -63,7 +64,9 @@ class CampaignLead(models.Model):
     lead = models.ForeignKey(Lead, on_delete=models.CASCADE, related_name="campaign_memberships")
     personalized_subject = models.CharField(max_length=255, blank=True, null=True)
     personalized_body = models.TextField(blank=True, null=True)
-    send_status = models.CharField(max_length=20, default="pending")  # pending | sent | failed
+    # pending → generated → sending → emailed → sent, or failed (see services/campaign_sends.py)
+    send_status = models.CharField(max_length=20, default="pending")
+    send_error = models.TextField(blank=True, null=True)
     sent_at = models.DateTimeField(blank=True, null=True)
     last_reply_at = models.DateTimeField(blank=True, null=True)
     goal_status = models.CharField(max_length=50, blank=True, null=True)  # e.g., viewing_scheduled
@@ -88,3 +91,79 @@ class MessageLog(models.Model):
 
     def __str__(self):
         return f"{self.direction} to {self.lead.lead_name} at {self.timestamp}"
+
+
+class IngestionJob(models.Model):
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("succeeded", "Succeeded"),
+        ("failed", "Failed"),
+    ]
+    STAGE_CHOICES = [
+        ("queued", "Queued"),
+        ("extract", "Extract"),
+        ("chunk", "Chunk"),
+        ("embed", "Embed"),
+        ("store", "Store"),
+        ("done", "Done"),
+    ]
+
+    file_name = models.CharField(max_length=255)
+    file_size = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued")
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES, default="queued")
+    pages_extracted = models.IntegerField(default=0)
+    chunks_created = models.IntegerField(default=0)
+    chunks_embedded = models.IntegerField(default=0)
+    chunks_stored = models.IntegerField(default=0)
+    unchanged = models.BooleanField(default=False)
+    # "host:pid" of the process holding the upload buffer
+    worker = models.CharField(max_length=255, blank=True, default="")
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Ingestion of {self.file_name} ({self.status})"
+
+
+class CampaignSendJob(models.Model):
+    STATUS_CHOICES = IngestionJob.STATUS_CHOICES
+    STAGE_CHOICES = [
+        ("queued", "Queued"),
+        ("generate", "Generate"),
+        ("send", "Send"),
+        ("log", "Log"),
+        ("done", "Done"),
+    ]
+
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name="send_jobs")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued")
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES, default="queued")
+    error = models.TextField(blank=True, null=True)
+    # "host:pid" of the process running the job, and when it last made progress
+    worker = models.CharField(max_length=255, blank=True, default="")
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Send of campaign {self.campaign_id} ({self.status})"
+
+
+class LLMResponseCache(models.Model):
+    # sha256 of the model name, prompt parts and generation settings
+    key = models.CharField(max_length=64, unique=True)
+    model_name = models.CharField(max_length=100)
+    response_text = models.TextField()
+    # How long the model took to answer, i.e. what a hit saves
+    latency_ms = models.FloatField(default=0)
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.model_name} response {self.key[:12]}"
@@ -0,0 +1,45 @@
+"""
+Process-wide thread pools for background jobs.
+
+Uploads (ingestion_jobs) and campaign sends (campaign_sends) each run their
+jobs on a BackgroundPool: a ThreadPoolExecutor created on first use, whose
+tasks start only once the transaction that queued them has committed and
+run on their own database connection.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, transaction
+
+
+class BackgroundPool:
+    """A lazily created thread pool whose tasks each get their own DB connection."""
+
+    def __init__(self, max_workers, thread_name_prefix):
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get_executor(self):
+        """Returns the pool's executor, creating it on first use."""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix=self.thread_name_prefix)
+        return self._executor
+
+    def submit_on_commit(self, func, *args):
+        """Runs func(*args) on the pool once the current transaction commits."""
+        # Start only once the job row is visible to the worker thread
+        transaction.on_commit(lambda: self.get_executor().submit(self._run, func, *args))
+
+    @staticmethod
+    def _run(func, *args):
+        # Worker threads get their own DB connection; drop it when the job is done
+        close_old_connections()
+        try:
+            func(*args)
+        finally:
+            close_old_connections()
@@ -0,0 +1,179 @@
+"""
+Bounded-concurrency message generation for campaign sends.
+
+Every Gemini call is a network round trip of a few seconds, so a campaign's
+messages are generated by a pool of CAMPAIGN_GENERATION_WORKERS threads
+instead of one after another. With a batch size above 1, leads sharing a
+RAG context are sent to the model CAMPAIGN_GENERATION_BATCH_SIZE at a time
+in one JSON request (message_service.generate_messages_batch), so the
+instructions and context are paid once per batch rather than once per lead.
+Workers only call the model, touching the database just for the LLM
+response cache (services/llm_cache.py); leads whose message could not be
+generated get the render_personalized_message template, and the generated
+messages are recorded with one bulk_create once the pool is done.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.db import connection
+
+# agent_app.integrations puts ragImplementation (latency_stats) on sys.path
+from agent_app import integrations  # noqa: F401
+from agent_app.models import FollowUpMessage
+from agent_app.services.llm_cache import get_llm_cache_stats
+from agent_app.services.personalization import render_personalized_message
+from latency_stats import percentile
+
+# Gemini calls in flight at once for one campaign
+CAMPAIGN_GENERATION_WORKERS = int(os.environ.get('CAMPAIGN_GENERATION_WORKERS', '8'))
+# Leads per model request; 1 sends one request per lead
+CAMPAIGN_GENERATION_BATCH_SIZE = int(os.environ.get('CAMPAIGN_GENERATION_BATCH_SIZE', '1'))
+
+
+def _default_generate(lead, campaign, context=None, save=True, use_cache=True):
+    # Looked up on each call so tests and benchmarks can swap the generator
+    from agent_app import message_service
+    return message_service.generate_message(lead, campaign, context=context, save=save, use_cache=use_cache)
+
+
+def _default_generate_batch(leads, campaign, context=None, save=True, use_cache=True):
+    from agent_app import message_service
+    return message_service.generate_messages_batch(leads, campaign, context=context, save=save, use_cache=use_cache)
+
+
+def _batches(leads, campaign, batch_size):
+    """Indexes of the leads of each request: leads sharing a context, at most `batch_size` at a time."""
+    by_pair = {}
+    for i, lead in enumerate(leads):
+        by_pair.setdefault((lead.project_name, campaign.project_name), []).append(i)
+    return [
+        indexes[start:start + batch_size]
+        for indexes in by_pair.values()
+        for start in range(0, len(indexes), batch_size)
+    ]
+
+
+def generate_campaign_messages(campaign, leads, contexts, workers=None, generate=None, save=True,
+                               batch_size=None, generate_batch=None, use_cache=True):
+    """
+    Generates the messages of a campaign's leads with at most `workers`
+    model calls in flight.
+
+    Args:
+        campaign (Campaign): The campaign being sent.
+        leads (list[Lead]): Leads to write to, with their fields loaded.
+        contexts (dict): RAG context by (lead project, campaign project), as
+                         returned by prepare_campaign_context.
+        workers (int): Pool width (default CAMPAIGN_GENERATION_WORKERS).
+        generate (callable): generate_message stand-in, called as
+                             generate(lead, campaign, context=..., save=False).
+        save (bool): Record the AI messages as FollowUpMessages in bulk.
+        batch_size (int): Leads per model request (default
+                          CAMPAIGN_GENERATION_BATCH_SIZE).
+        generate_batch (callable): generate_messages_batch stand-in, called as
+                                   generate_batch(leads, campaign, context=..., save=False)
+                                   when `batch_size` is above 1.
+        use_cache (bool): False makes the default generators skip the LLM
+                          response cache, e.g. to redraft every message.
+
+    Returns:
+        tuple[list[dict], dict]: Per lead, in order, {'lead', 'subject',
+        'body', 'source' ('ai' or 'template'), 'seconds'}; and stats with the
+        number of 'leads', 'generated' and 'fallback' messages, the pool
+        'workers', the 'batch_size', the model 'requests' made (not counting
+        batch retries), total 'seconds', 'leads_per_minute', p50/p95/p99
+        per-lead latency in ms, and the LLM response cache 'cache_hits',
+        'cache_hit_rate' and 'cache_saved_ms' of this run.
+    """
+    leads = list(leads)
+    workers = max(1, workers or CAMPAIGN_GENERATION_WORKERS)
+    batch_size = max(1, batch_size or CAMPAIGN_GENERATION_BATCH_SIZE)
+    generate = generate or partial(_default_generate, use_cache=use_cache)
+    generate_batch = generate_batch or partial(_default_generate_batch, use_cache=use_cache)
+
+    def generate_request(indexes):
+        batch = [leads[i] for i in indexes]
+        context = contexts.get((batch[0].project_name, campaign.project_name))
+        start = time.perf_counter()
+        try:
+            if batch_size == 1:
+                bodies = [generate(batch[0], campaign, context=context, save=False)]
+            else:
+                bodies = list(generate_batch(batch, campaign, context=context, save=False))
+        except Exception as e:
+            print(f"[ERROR] Failed to generate AI message for {', '.join(lead.lead_name for lead in batch)}: {e}")
+            bodies = [None] * len(batch)
+        finally:
+            # Drop the DB connection the cache opened in this pool thread
+            connection.close()
+        return indexes, bodies, time.perf_counter() - start
+
+    requests = _batches(leads, campaign, batch_size)
+    outcomes = [(None, 0.0)] * len(leads)
+    cache_before = get_llm_cache_stats(campaign.id)
+    start = time.perf_counter()
+    if requests:
+        with ThreadPoolExecutor(max_workers=min(workers, len(requests)), thread_name_prefix="campaign-generation") as pool:
+            for indexes, bodies, request_seconds in pool.map(generate_request, requests):
+                for i, body in zip(indexes, bodies):
+                    outcomes[i] = (body, request_seconds)
+    seconds = time.perf_counter() - start
+
+    messages = []
+    for lead, (body, lead_seconds) in zip(leads, outcomes):
+        if body:
+            subject = f"{lead.lead_name}, an update on {campaign.project_name}"
+            source = "ai"
+        else:
+            # Fallback to lightweight template if AI fails
+            print(f"[FALLBACK] Using template for {lead.lead_name} (AI message was None/empty)")
+            subject, body = render_personalized_message(
+                lead=lead,
+                target_project=campaign.project_name,
+                offer_text=campaign.sales_offer or "",
+            )
+            source = "template"
+        messages.append({"lead": lead, "subject": subject, "body": body, "source": source, "seconds": lead_seconds})
+
+    if save:
+        FollowUpMessage.objects.bulk_create([
+            FollowUpMessage(
+                campaign=campaign,
+                lead=message["lead"],
+                channel=campaign.message_channel,
+                message_body=message["body"],
+                status="generated",
+            )
+            for message in messages if message["source"] == "ai"
+        ])
+
+    cache_after = get_llm_cache_stats(campaign.id)
+    cache_hits = cache_after["hits"] - cache_before["hits"]
+    cache_requests = cache_after["requests"] - cache_before["requests"]
+    latencies = [message["seconds"] * 1000 for message in messages]
+    generated = sum(message["source"] == "ai" for message in messages)
+    stats = {
+        "leads": len(messages),
+        "generated": generated,
+        "fallback": len(messages) - generated,
+        "workers": workers,
+        "batch_size": batch_size,
+        "requests": len(requests),
+        "seconds": round(seconds, 3),
+        "leads_per_minute": round(len(messages) / seconds * 60, 1) if seconds else None,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "cache_hits": cache_hits,
+        "cache_hit_rate": round(cache_hits / cache_requests, 3) if cache_requests else 0.0,
+        "cache_saved_ms": round(cache_after["saved_ms"] - cache_before["saved_ms"], 1),
+    }
+    print(f"[CAMPAIGN] Generated {stats['leads']} messages for campaign {campaign.id} in {stats['seconds']}s "
+          f"({len(requests)} requests, {workers} workers, {stats['leads_per_minute']} leads/min, "
+          f"p95 {stats['p95_ms']} ms, {stats['fallback']} template fallbacks)")
+    if cache_requests:
+        print(f"[LLM] Response cache for campaign {campaign.id}: {cache_hits}/{cache_requests} hits "
+              f"({stats['cache_hit_rate']:.0%}), {stats['cache_saved_ms'] / 1000:.1f}s of model time saved")
+    return messages, stats
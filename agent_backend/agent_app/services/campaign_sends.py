@@ -0,0 +1,337 @@
+"""
+Background campaign sends.
+
+/campaigns/<id>/send/ creates a CampaignSendJob and returns straight away; a
+bounded thread pool runs the job in three stages, each driven by
+CampaignLead.send_status so every lead's progress is on its row:
+
+    generate  pending   → generated  message written by generate_campaign_messages
+    send      generated → sending → emailed (or failed)
+    log       emailed   → sent       MessageLog written, lead marked "Follow-up sent"
+
+Generation and logging work in batches of CAMPAIGN_SEND_BATCH_SIZE leads;
+a lead is marked "sending" before its email goes out and "emailed" right
+after, so a crash loses at most one batch of generated messages and never
+an email's record. A job records the process running it and a heartbeat;
+starting a send whose active job lost its process (see send_job_is_dead)
+resumes that job, and resume_campaign_sends() restarts every job of a
+crashed process. Leads caught in "sending" are marked failed rather than
+emailed again, since their email may already have gone out.
+"""
+import os
+import threading
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from agent_app.message_service import get_query_cache_stats, prepare_campaign_context, send_campaign_message
+from agent_app.models import CampaignLead, CampaignSendJob, Lead, MessageLog
+from agent_app.services.background_pool import BackgroundPool
+from agent_app.services.campaign_engine import generate_campaign_messages
+from agent_app.services.worker_process import current_worker_id, worker_is_alive
+
+SEND_STATUSES = ["pending", "generated", "sending", "emailed", "sent", "failed"]
+
+CAMPAIGN_SEND_WORKERS = int(os.environ.get('CAMPAIGN_SEND_WORKERS', '2'))
+# Leads generated or logged per batch, and so per progress update
+CAMPAIGN_SEND_BATCH_SIZE = int(os.environ.get('CAMPAIGN_SEND_BATCH_SIZE', '50'))
+
+# An active job without a heartbeat for this long is taken to be dead, e.g.
+# its process was on a host that is gone
+CAMPAIGN_SEND_STALE_SECONDS = int(os.environ.get('CAMPAIGN_SEND_STALE_SECONDS', '900'))
+
+INTERRUPTED_SEND_ERROR = "Interrupted while sending; not retried automatically as the email may have gone out"
+
+_pool = BackgroundPool(CAMPAIGN_SEND_WORKERS, "campaign-send")
+
+# Ids of the send jobs queued or running in this process
+_live_jobs = set()
+_live_jobs_lock = threading.Lock()
+
+
+class SendJobTakenOver(Exception):
+    """Another process resumed the job; the run in this process stops."""
+
+
+def get_executor():
+    """Returns the process-wide campaign send pool, creating it on first use."""
+    return _pool.get_executor()
+
+
+def active_send_job(campaign):
+    """The queued or running send job of a campaign, or None."""
+    return CampaignSendJob.objects.filter(campaign=campaign, status__in=["queued", "running"]).order_by("-id").first()
+
+
+def send_job_is_dead(job):
+    """
+    True when no process is working on an active send job: its process on
+    this host has exited, it carries this process's id without running here
+    (a previous process with the same pid), or it has had no heartbeat for
+    CAMPAIGN_SEND_STALE_SECONDS.
+    """
+    if job.worker == current_worker_id():
+        with _live_jobs_lock:
+            return job.id not in _live_jobs
+    if not worker_is_alive(job.worker):
+        return True
+    last_seen = job.heartbeat_at or job.created_at
+    return last_seen < timezone.now() - timedelta(seconds=CAMPAIGN_SEND_STALE_SECONDS)
+
+
+def start_campaign_send(campaign):
+    """
+    Queues a send of a campaign's pending and failed leads. Returns the
+    campaign's active job instead when one is already queued or running,
+    resuming it first if its process is gone.
+    """
+    job = active_send_job(campaign)
+    if job is not None:
+        if send_job_is_dead(job) and _resume(job):
+            print(f"[CAMPAIGN] Send job {job.id} of campaign {campaign.id} had lost its process; resumed it")
+        else:
+            print(f"[CAMPAIGN] Send of campaign {campaign.id} already in progress (job {job.id})")
+        return job
+
+    # Failed leads are retried, as when a send is started again by hand
+    CampaignLead.objects.filter(campaign=campaign, send_status="failed").update(send_status="pending", send_error=None)
+    # Registered as live before another thread can see the row, so the job never reads as dead here
+    with _live_jobs_lock:
+        job = CampaignSendJob.objects.create(campaign=campaign, worker=current_worker_id(),
+                                             heartbeat_at=timezone.now())
+        _live_jobs.add(job.id)
+    _submit(job)
+    print(f"[CAMPAIGN] Queued send job {job.id} for campaign {campaign.id}")
+    return job
+
+
+def _submit(job):
+    _pool.submit_on_commit(run_campaign_send, job.id)
+
+
+def _resume(job):
+    """
+    Takes an interrupted job over for this process and requeues it. Returns
+    False, leaving `job` alone, when it is still running in this process or
+    another process took it over first.
+    """
+    worker_id = current_worker_id()
+    now = timezone.now()
+    with _live_jobs_lock:
+        # Checked under the lock: a job of this process is never taken from a live run
+        if job.worker == worker_id and job.id in _live_jobs:
+            return False
+        # Compare-and-set on the previous owner and heartbeat: one taker wins
+        taken = CampaignSendJob.objects.filter(
+            id=job.id, status__in=["queued", "running"], worker=job.worker, heartbeat_at=job.heartbeat_at
+        ).update(status="queued", stage="queued", worker=worker_id, heartbeat_at=now)
+        if not taken:
+            return False
+        _live_jobs.add(job.id)
+    job.status, job.stage, job.worker, job.heartbeat_at = "queued", "queued", worker_id, now
+
+    interrupted = CampaignLead.objects.filter(campaign_id=job.campaign_id, send_status="sending").update(
+        send_status="failed", send_error=INTERRUPTED_SEND_ERROR
+    )
+    _submit(job)
+    print(f"[CAMPAIGN] Resumed send job {job.id} for campaign {job.campaign_id} "
+          f"({interrupted} interrupted sends marked failed)")
+    return True
+
+
+def resume_campaign_sends():
+    """
+    Requeues the send jobs a crashed or restarted process left queued or
+    running. Run it when no other process is sending, e.g. at deploy; while
+    servers run, start_campaign_send resumes a dead job on its own.
+
+    Returns:
+        list[CampaignSendJob]: The requeued jobs.
+    """
+    jobs = list(CampaignSendJob.objects.filter(status__in=["queued", "running"]).order_by("id"))
+    return [job for job in jobs if _resume(job)]
+
+
+def _set_stage(job, stage):
+    job.stage = stage
+    job.save(update_fields=["stage"])
+
+
+def run_campaign_send(job_id):
+    """
+    Runs one send job through the generate, send and log stages.
+
+    Returns:
+        CampaignSendJob | None: The finished job, or None when another
+        process has taken the job over.
+    """
+    try:
+        return _run_campaign_send(job_id, current_worker_id())
+    finally:
+        with _live_jobs_lock:
+            _live_jobs.discard(job_id)
+
+
+def _run_campaign_send(job_id, worker_id):
+    def heartbeat():
+        # Also checks this process still owns the job before more work is done
+        if not CampaignSendJob.objects.filter(id=job_id, worker=worker_id).update(heartbeat_at=timezone.now()):
+            raise SendJobTakenOver(f"Send job {job_id} was taken over by another process")
+
+    job = CampaignSendJob.objects.select_related("campaign").get(id=job_id)
+    if job.worker != worker_id:
+        print(f"[CAMPAIGN] Send job {job_id} now belongs to {job.worker or 'no process'}; not running it here")
+        return None
+    campaign = job.campaign
+    job.status = "running"
+    job.started_at = job.started_at or timezone.now()
+    job.error = None
+    job.save(update_fields=["status", "started_at", "error"])
+
+    try:
+        heartbeat()
+        _set_stage(job, "generate")
+        generate_stage(campaign, heartbeat=heartbeat)
+        _set_stage(job, "send")
+        send_stage(campaign, heartbeat=heartbeat)
+        _set_stage(job, "log")
+        log_stage(campaign, heartbeat=heartbeat)
+        job.status = "succeeded"
+    except SendJobTakenOver as e:
+        # The new owner records the outcome
+        print(f"[CAMPAIGN] {e}; stopping here")
+        return None
+    except Exception as e:
+        print(f"[ERROR] Campaign send job {job.id} failed: {e}")
+        job.status = "failed"
+        job.error = str(e)
+    job.stage = "done"
+    job.finished_at = timezone.now()
+    job.save()
+
+    counts = send_status_counts(campaign)
+    print(f"[CAMPAIGN] Send job {job.id} {job.status}: {counts['sent']} sent, {counts['failed']} failed")
+    cache_stats = get_query_cache_stats()
+    print(f"[RAG] Query cache after campaign {campaign.id}: hits={cache_stats['hits']} misses={cache_stats['misses']}")
+    return job
+
+
+def generate_stage(campaign, batch_size=None, heartbeat=None):
+    """
+    Generates the messages of pending leads, batch by batch (pending →
+    generated). `heartbeat`, if given, is called before each batch.
+    """
+    batch_size = batch_size or CAMPAIGN_SEND_BATCH_SIZE
+    pending = CampaignLead.objects.filter(campaign=campaign, send_status="pending").select_related("lead")
+
+    # Retrieve RAG context once per distinct project pair
+    contexts, _ = prepare_campaign_context(campaign, [cl.lead for cl in pending])
+
+    while True:
+        batch = list(pending.order_by("id")[:batch_size])
+        if not batch:
+            return
+        if heartbeat is not None:
+            heartbeat()
+        messages, _ = generate_campaign_messages(campaign, [cl.lead for cl in batch], contexts)
+        for cl, message in zip(batch, messages):
+            cl.personalized_subject = message["subject"]
+            cl.personalized_body = message["body"] or ""
+            cl.send_status = "generated"
+        CampaignLead.objects.bulk_update(batch, ["personalized_subject", "personalized_body", "send_status"])
+
+
+def send_stage(campaign, heartbeat=None):
+    """
+    Emails the generated messages one lead at a time (generated → sending →
+    emailed | failed). `heartbeat`, if given, is called before each email.
+    """
+    generated = CampaignLead.objects.filter(campaign=campaign, send_status="generated").select_related("lead")
+    for cl in list(generated.order_by("id")):
+        if heartbeat is not None:
+            heartbeat()
+        if campaign.message_channel != "Email" or not cl.lead.email:
+            cl.send_status = "failed"
+            cl.send_error = f"No {campaign.message_channel} address for this lead"
+            cl.save(update_fields=["send_status", "send_error"])
+            continue
+
+        cl.send_status = "sending"
+        cl.save(update_fields=["send_status"])
+        # Use send_campaign_message for initial campaign messages
+        try:
+            sent_ok = send_campaign_message(cl.lead, cl.personalized_body or "", cl.personalized_subject)
+        except Exception as e:
+            print(f"[ERROR] Failed sending to {cl.lead.email}: {e}")
+            sent_ok = False
+        if sent_ok:
+            cl.send_status = "emailed"
+            cl.sent_at = timezone.now()
+            cl.send_error = None
+            print(f"[SENT] Email to {cl.lead.lead_name} ({cl.lead.email})")
+        else:
+            cl.send_status = "failed"
+            cl.send_error = "Email service returned False"
+        cl.save(update_fields=["send_status", "sent_at", "send_error"])
+
+
+def log_stage(campaign, batch_size=None, heartbeat=None):
+    """
+    Records the emailed messages and updates lead statuses, batch by batch
+    (emailed → sent). `heartbeat`, if given, is called before each batch.
+    """
+    batch_size = batch_size or CAMPAIGN_SEND_BATCH_SIZE
+    emailed = CampaignLead.objects.filter(campaign=campaign, send_status="emailed").select_related("lead")
+    while True:
+        batch = list(emailed.order_by("id")[:batch_size])
+        if not batch:
+            return
+        if heartbeat is not None:
+            heartbeat()
+        with transaction.atomic():
+            MessageLog.objects.bulk_create([
+                MessageLog(
+                    campaign=campaign,
+                    lead=cl.lead,
+                    direction="outbound",
+                    subject=cl.personalized_subject,
+                    body=cl.personalized_body,
+                )
+                for cl in batch
+            ])
+            # update lead status to reflect outbound follow-up
+            Lead.objects.filter(id__in=[cl.lead_id for cl in batch]).update(lead_status="Follow-up sent")
+            CampaignLead.objects.filter(id__in=[cl.id for cl in batch]).update(send_status="sent")
+
+
+def send_status_counts(campaign):
+    """Number of the campaign's leads in each send status."""
+    counts = dict.fromkeys(SEND_STATUSES, 0)
+    rows = CampaignLead.objects.filter(campaign=campaign).values("send_status").annotate(count=Count("id"))
+    for row in rows:
+        counts[row["send_status"]] = row["count"]
+    return counts
+
+
+def send_progress(campaign):
+    """Serializes a campaign's send progress for the progress endpoint."""
+    job = CampaignSendJob.objects.filter(campaign=campaign).order_by("-id").first()
+    counts = send_status_counts(campaign)
+    total = sum(counts.values())
+    return {
+        "campaign_id": campaign.id,
+        "total": total,
+        "counts": counts,
+        "finished": job is not None and job.status in ("succeeded", "failed"),
+        "job": None if job is None else {
+            "job_id": job.id,
+            "status": job.status,
+            "stage": job.stage,
+            "error": job.error,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        },
+    }
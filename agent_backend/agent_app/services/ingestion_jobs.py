@@ -0,0 +1,203 @@
+"""
+Background ingestion of uploaded brochures.
+
+/api/documents/upload copies the file into a private in-memory buffer,
+creates an IngestionJob and returns straight away; a bounded thread pool
+drains the queued jobs through rag_main.ingest_pdf_buffer and records stage
+and progress on the job row. Uploads never touch the disk, so a job whose
+process exits before it finishes cannot be resumed: it is marked failed and
+the file has to be uploaded again.
+"""
+import io
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from agent_app.integrations import RAG_DIR, rag_main
+from agent_app.models import IngestionJob
+from agent_app.services.background_pool import BackgroundPool
+from agent_app.services.worker_process import current_worker_id, worker_is_alive
+
+# Uploads are ingested into the same store the search endpoint reads
+UPLOAD_CHROMA_DB_PATH = os.path.join(RAG_DIR, "chroma_db")
+
+INGESTION_WORKERS = int(os.environ.get('INGESTION_WORKERS', '2'))
+# Uploads are rejected while this many jobs are queued or running
+INGESTION_MAX_PENDING = int(os.environ.get('INGESTION_MAX_PENDING', '20'))
+# Jobs queued, or running, for longer than this are taken to be lost (their
+# process died with the upload buffer) and are marked failed
+INGESTION_STALE_SECONDS = int(os.environ.get('INGESTION_STALE_SECONDS', '3600'))
+STALE_JOB_ERROR = "Ingestion was interrupted before it finished, please upload the file again"
+LOST_BUFFER_ERROR = "Uploaded file is no longer available, please upload it again"
+# Minimum seconds between progress writes while a stage is running
+PROGRESS_SAVE_INTERVAL = 1.0
+
+_pool = BackgroundPool(INGESTION_WORKERS, "ingestion")
+
+# Upload buffers of jobs queued or running in this process, by job id
+_job_buffers = {}
+_job_buffers_lock = threading.Lock()
+
+
+def get_executor():
+    """Returns the process-wide ingestion worker pool, creating it on first use."""
+    return _pool.get_executor()
+
+
+def fail_orphaned_ingestion_jobs():
+    """
+    Marks queued and running jobs failed whose upload buffer is gone: jobs
+    of a process on this host that has exited, and jobs recorded under this
+    process's id (a previous process with the same pid) that it does not hold.
+
+    Returns:
+        int: Number of jobs marked failed.
+    """
+    worker_id = current_worker_id()
+    orphaned = []
+    with _job_buffers_lock:
+        pending = IngestionJob.objects.filter(status__in=["queued", "running"]).exclude(worker="")
+        for job_id, worker in pending.values_list("id", "worker"):
+            if worker == worker_id:
+                lost = job_id not in _job_buffers
+            else:
+                lost = not worker_is_alive(worker)
+            if lost:
+                orphaned.append(job_id)
+    if not orphaned:
+        return 0
+    count = IngestionJob.objects.filter(id__in=orphaned, status__in=["queued", "running"]).update(
+        status="failed", stage="done", error=LOST_BUFFER_ERROR, finished_at=timezone.now()
+    )
+    print(f"[INGEST] Marked {count} ingestion jobs failed: their worker process exited")
+    return count
+
+
+def fail_stale_ingestion_jobs():
+    """
+    Marks jobs failed that will never finish, so they stop counting against
+    INGESTION_MAX_PENDING: jobs whose buffer went with their process (see
+    fail_orphaned_ingestion_jobs), and jobs queued or running for longer than
+    INGESTION_STALE_SECONDS, e.g. on a host that is gone.
+
+    Returns:
+        int: Number of jobs marked failed.
+    """
+    count = fail_orphaned_ingestion_jobs()
+    cutoff = timezone.now() - timedelta(seconds=INGESTION_STALE_SECONDS)
+    stale = IngestionJob.objects.filter(
+        Q(status="queued", created_at__lt=cutoff) | Q(status="running", started_at__lt=cutoff)
+    )
+    stale_count = stale.update(status="failed", stage="done", error=STALE_JOB_ERROR, finished_at=timezone.now())
+    if stale_count:
+        print(f"[INGEST] Marked {stale_count} stale ingestion jobs failed")
+    return count + stale_count
+
+
+def ingestion_queue_full():
+    """True when INGESTION_MAX_PENDING live jobs are already queued or running."""
+    fail_stale_ingestion_jobs()
+    return IngestionJob.objects.filter(status__in=["queued", "running"]).count() >= INGESTION_MAX_PENDING
+
+
+def create_ingestion_job(file_name, chunks):
+    """
+    Copies an uploaded file into its own in-memory buffer and enqueues it.
+
+    Args:
+        file_name (str): Original file name, used as the document name in Chroma.
+        chunks (iterable[bytes]): The file content, e.g. UploadedFile.chunks().
+
+    Returns:
+        IngestionJob: The queued job.
+    """
+    buffer = io.BytesIO()
+    for chunk in chunks:
+        buffer.write(chunk)
+
+    # Registered under the lock so fail_orphaned_ingestion_jobs never sees the row without its buffer
+    with _job_buffers_lock:
+        job = IngestionJob.objects.create(
+            file_name=os.path.basename(file_name), file_size=buffer.tell(), worker=current_worker_id()
+        )
+        _job_buffers[job.id] = buffer
+
+    _pool.submit_on_commit(run_ingestion_job, job.id)
+    print(f"[INGEST] Queued job {job.id} for {file_name}")
+    return job
+
+
+def run_ingestion_job(job_id, persist_directory=UPLOAD_CHROMA_DB_PATH):
+    """Runs one queued job to completion, recording stage, counts and errors."""
+    job = IngestionJob.objects.get(id=job_id)
+    # The buffer stays registered while the job runs, which marks the job as live in this process
+    buffer = _job_buffers.get(job_id)
+    job.status = "running"
+    job.stage = "extract"
+    job.started_at = timezone.now()
+    job.save(update_fields=["status", "stage", "started_at"])
+
+    last_saved = time.monotonic()
+
+    def progress(file_name, stage, counts):
+        nonlocal last_saved
+        stage_changed = stage != job.stage
+        job.stage = stage
+        job.pages_extracted = counts["pages"]
+        job.chunks_created = counts["chunks"]
+        job.chunks_embedded = counts["embedded"]
+        job.chunks_stored = counts["stored"]
+        if stage_changed or time.monotonic() - last_saved >= PROGRESS_SAVE_INTERVAL:
+            job.save(update_fields=["stage", "pages_extracted", "chunks_created", "chunks_embedded", "chunks_stored"])
+            last_saved = time.monotonic()
+
+    try:
+        if buffer is None:
+            # Queued by a process that has since exited
+            raise RuntimeError(LOST_BUFFER_ERROR)
+        summary = rag_main.ingest_pdf_buffer(job.file_name, buffer, persist_directory=persist_directory, progress=progress)
+        if summary["failed"]:
+            job.status = "failed"
+            job.error = summary["errors"].get(job.file_name) or "Failed to load document"
+        else:
+            job.status = "succeeded"
+            job.unchanged = bool(summary["unchanged"])
+    except Exception as e:
+        print(f"[ERROR] Ingestion job {job.id} failed: {e}")
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        job.stage = "done"
+        job.finished_at = timezone.now()
+        job.save()
+        if buffer is not None:
+            with _job_buffers_lock:
+                _job_buffers.pop(job_id, None)
+            buffer.close()
+
+    print(f"[INGEST] Job {job.id} {job.status}: {job.chunks_stored} chunks stored")
+    return job
+
+
+def job_status(job):
+    """Serializes a job for the status endpoint."""
+    return {
+        "job_id": job.id,
+        "file_name": job.file_name,
+        "file_size": job.file_size,
+        "status": job.status,
+        "stage": job.stage,
+        "pages_extracted": job.pages_extracted,
+        "chunks_created": job.chunks_created,
+        "chunks_embedded": job.chunks_embedded,
+        "chunks_stored": job.chunks_stored,
+        "unchanged": job.unchanged,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,142 @@
+"""
+Persistent, content-addressed cache of LLM responses.
+
+Drafts and intent labels are stored in the LLMResponseCache table under a
+sha256 of the model name, the prompt parts (instructions and RAG context)
+and the generation settings, so re-sending failed leads, re-running
+/api/campaigns/generate_messages or re-processing a duplicate reply reuses
+the earlier answer instead of calling Gemini again.
+
+Entries older than LLM_CACHE_TTL_SECONDS are ignored and deleted; past
+LLM_CACHE_MAX_ENTRIES the least recently used entries are evicted. Only
+responses that pass the caller's validation are stored, and any cache error
+falls through to a normal model call. Hit/miss counters and the model
+latency saved are kept per scope (e.g. a campaign) for this process.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+
+from agent_app.models import LLMResponseCache
+
+LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'True') == 'True'
+LLM_CACHE_TTL_SECONDS = int(os.environ.get('LLM_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', '10000'))
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def cache_key(model_name, parts, generation_config=None):
+    """sha256 hex digest of a model request."""
+    if isinstance(parts, str):
+        parts = [parts]
+    payload = json.dumps([model_name, list(parts), generation_config], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _record(scope, hit, saved_ms=0.0):
+    with _stats_lock:
+        for name in {None, scope}:
+            stats = _stats.setdefault(name, {"hits": 0, "misses": 0, "saved_ms": 0.0})
+            stats["hits" if hit else "misses"] += 1
+            stats["saved_ms"] += saved_ms
+
+
+def get_llm_cache_stats(scope=None):
+    """
+    Hits, misses, hit rate and model latency saved (ms) in this process, for
+    one scope or (scope None) overall.
+    """
+    with _stats_lock:
+        stats = dict(_stats.get(scope, {"hits": 0, "misses": 0, "saved_ms": 0.0}))
+    requests = stats["hits"] + stats["misses"]
+    stats["requests"] = requests
+    stats["hit_rate"] = round(stats["hits"] / requests, 3) if requests else 0.0
+    stats["saved_ms"] = round(stats["saved_ms"], 1)
+    return stats
+
+
+def clear_llm_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _lookup(key):
+    entry = LLMResponseCache.objects.filter(key=key).first()
+    if entry is None:
+        return None
+    if entry.created_at < timezone.now() - timedelta(seconds=LLM_CACHE_TTL_SECONDS):
+        entry.delete()
+        return None
+    LLMResponseCache.objects.filter(id=entry.id).update(hits=F("hits") + 1, last_used_at=timezone.now())
+    return entry
+
+
+def _store(key, model_name, text, latency_ms):
+    LLMResponseCache.objects.update_or_create(
+        key=key,
+        defaults={"model_name": model_name, "response_text": text, "latency_ms": latency_ms,
+                  "hits": 0, "created_at": timezone.now(), "last_used_at": timezone.now()},
+    )
+    evict()
+
+
+def evict():
+    """Deletes expired entries, then the least recently used ones past LLM_CACHE_MAX_ENTRIES."""
+    LLMResponseCache.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=LLM_CACHE_TTL_SECONDS)).delete()
+    excess = LLMResponseCache.objects.count() - LLM_CACHE_MAX_ENTRIES
+    if excess > 0:
+        oldest = LLMResponseCache.objects.order_by("last_used_at", "id").values_list("id", flat=True)[:excess]
+        LLMResponseCache.objects.filter(id__in=list(oldest)).delete()
+
+
+def cached_generate(model_name, parts, call, generation_config=None, use_cache=True, scope=None, validate=None):
+    """
+    The text of a model response, from the cache when an identical request
+    was answered before.
+
+    Args:
+        model_name (str): Model the request goes to.
+        parts (str | list[str]): Prompt parts, including any RAG context.
+        call (callable): Makes the request; returns a response with '.text'.
+        generation_config (dict): Settings that change the answer (part of the key).
+        use_cache (bool): False skips the cache for this call (nothing is read or stored).
+        scope: Counter bucket for get_llm_cache_stats, e.g. a campaign id.
+        validate (callable): Only texts for which validate(text) is true are stored.
+
+    Returns:
+        dict: {'text', 'cached' (bool), 'seconds' (model time, 0 on a hit),
+        'usage' (the response's usage_metadata, None on a hit)}.
+    """
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    key = cache_key(model_name, parts, generation_config) if use_cache else None
+    if use_cache:
+        try:
+            entry = _lookup(key)
+        except Exception as e:
+            print(f"[WARNING] LLM cache lookup failed: {e}")
+            entry = None
+        if entry is not None:
+            _record(scope, hit=True, saved_ms=entry.latency_ms)
+            return {"text": entry.response_text, "cached": True, "seconds": 0.0, "usage": None}
+
+    start = time.perf_counter()
+    response = call()
+    seconds = time.perf_counter() - start
+    text = response.text
+
+    if use_cache:
+        _record(scope, hit=False)
+        if text and text.strip() and (validate is None or validate(text)):
+            try:
+                _store(key, model_name, text, seconds * 1000)
+            except Exception as e:
+                print(f"[WARNING] LLM cache write failed: {e}")
+    return {"text": text, "cached": False, "seconds": seconds, "usage": getattr(response, "usage_metadata", None)}
@@ -0,0 +1,205 @@
+"""
+Process-wide LLM client.
+
+Message drafting (message_service) and intent detection
+(ai_agent/intent_service) call the model through get_llm_client() instead of
+building a genai.GenerativeModel on every call. The client wraps one
+provider, chosen by LLM_PROVIDER:
+
+    gemini  google.generativeai. One GenerativeModel per model name is kept
+            and shared by all threads, so the underlying API client and its
+            connections are reused from call to call.
+    stub    Deterministic local answers (plain drafts, JSON for batched
+            prompts, an intent label for classification prompts) with no
+            network, for throughput tests, benchmarks and CI.
+
+The model (LLM_MODEL) and the per-request timeout (LLM_TIMEOUT_SECONDS) are
+set here for every call site. Other providers subclass LLMProvider and are
+made available with register_provider().
+"""
+import abc
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from agent_app.integrations import genai
+
+LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'gemini')
+LLM_MODEL = os.environ.get('LLM_MODEL', 'gemini-2.5-flash')
+LLM_TIMEOUT_SECONDS = float(os.environ.get('LLM_TIMEOUT_SECONDS', '60'))
+# Simulated response time of the stub provider
+LLM_STUB_LATENCY_MS = float(os.environ.get('LLM_STUB_LATENCY_MS', '0'))
+
+
+class LLMResponse:
+    """A model answer: its text and, when the provider reports it, token usage."""
+
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class LLMProvider(abc.ABC):
+    """
+    Interface of a model backend. Implementations must be safe to call from
+    several threads at once.
+    """
+
+    name = None
+
+    @abc.abstractmethod
+    def generate(self, model, parts, generation_config=None, timeout=None):
+        """
+        Sends one request.
+
+        Args:
+            model (str): Model name.
+            parts (str | list[str]): Prompt parts.
+            generation_config (dict): Provider generation settings, e.g.
+                                      {'response_mime_type': 'application/json'}.
+            timeout (float): Seconds to wait for the answer.
+
+        Returns:
+            A response with '.text' and optionally '.usage_metadata'.
+        """
+
+
+class GeminiProvider(LLMProvider):
+    """google.generativeai, with one shared GenerativeModel per model name."""
+
+    name = "gemini"
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get_model(self, model):
+        if model not in self._models:
+            with self._lock:
+                if model not in self._models:
+                    self._models[model] = genai.GenerativeModel(model)
+        return self._models[model]
+
+    def generate(self, model, parts, generation_config=None, timeout=None):
+        kwargs = {"request_options": {"timeout": timeout}} if timeout else {}
+        if generation_config:
+            kwargs["generation_config"] = generation_config
+        return self.get_model(model).generate_content(parts, **kwargs)
+
+
+class StubProvider(LLMProvider):
+    """
+    Network-free provider whose answer depends only on the prompt: the same
+    request always gets the same text.
+    """
+
+    name = "stub"
+    CUSTOMER_REPLY_RE = re.compile(r"Customer reply: '(.*)'")
+    LEAD_KEY_RE = re.compile(r"^\s*\[(lead_\d+)\]\s*\n\s*- Name: (.+)$", re.MULTILINE)
+    NAME_RE = re.compile(r"- Name: (.+)")
+    NOTIFY_WORDS = ("call", "visit", "viewing", "schedule", "meet", "buy", "book", "purchase", "proceed")
+
+    def __init__(self, latency_ms=None):
+        self.latency_ms = LLM_STUB_LATENCY_MS if latency_ms is None else latency_ms
+
+    def draft(self, name, prompt):
+        digest = hashlib.sha256(f"{name}\n{prompt}".encode("utf-8")).hexdigest()[:8]
+        return (f"Dear {name},\n\nThank you for your interest. We have a new project that matches your "
+                f"preferences and would be glad to share the details.\n\nBest regards,\nSales Team [stub {digest}]")
+
+    def generate(self, model, parts, generation_config=None, timeout=None):
+        prompt = "".join(parts) if isinstance(parts, (list, tuple)) else parts
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+        reply = self.CUSTOMER_REPLY_RE.search(prompt)
+        if reply:
+            wants_agent = any(word in reply.group(1).lower() for word in self.NOTIFY_WORDS)
+            return LLMResponse("notify_agent" if wants_agent else "auto_reply")
+        if (generation_config or {}).get("response_mime_type") == "application/json":
+            drafts = {key: self.draft(name, prompt) for key, name in self.LEAD_KEY_RE.findall(prompt)}
+            return LLMResponse(json.dumps(drafts))
+        name = self.NAME_RE.search(prompt)
+        return LLMResponse(self.draft(name.group(1) if name else "Customer", prompt))
+
+
+PROVIDERS = {
+    GeminiProvider.name: GeminiProvider,
+    StubProvider.name: StubProvider,
+}
+
+
+def register_provider(name, factory):
+    """Makes a provider available as LLM_PROVIDER=`name`; `factory()` returns an LLMProvider."""
+    PROVIDERS[name] = factory
+
+
+class LLMClient:
+    """A provider with the model and timeout every call site uses."""
+
+    def __init__(self, provider, model=None, timeout=None):
+        self.provider = provider
+        self.model = model or LLM_MODEL
+        self.timeout = LLM_TIMEOUT_SECONDS if timeout is None else timeout
+
+    @property
+    def cache_name(self):
+        """Model name for the LLM response cache key; answers of different providers never mix."""
+        return self.model if self.provider.name == "gemini" else f"{self.provider.name}/{self.model}"
+
+    def generate(self, parts, generation_config=None, model=None):
+        return self.provider.generate(model or self.model, parts, generation_config=generation_config,
+                                      timeout=self.timeout)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def create_provider(name):
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider '{name}'; expected one of {', '.join(sorted(PROVIDERS))}")
+    return PROVIDERS[name]()
+
+
+def get_llm_client():
+    """Returns the process-wide LLM client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient(create_provider(LLM_PROVIDER))
+                print(f"[LLM] Using provider '{LLM_PROVIDER}' with model {_client.model} "
+                      f"(timeout {_client.timeout:g}s)")
+    return _client
+
+
+def configure_llm_client(provider=None, model=None, timeout=None):
+    """
+    Replaces the process-wide client, e.g. to run tests or benchmarks on a
+    stand-in provider.
+
+    Args:
+        provider (str | LLMProvider): Provider name or instance (default LLM_PROVIDER).
+        model (str): Model name (default LLM_MODEL).
+        timeout (float): Request timeout in seconds (default LLM_TIMEOUT_SECONDS).
+
+    Returns:
+        LLMClient: The new client.
+    """
+    global _client
+    if provider is None or isinstance(provider, str):
+        provider = create_provider(provider or LLM_PROVIDER)
+    with _client_lock:
+        _client = LLMClient(provider, model=model, timeout=timeout)
+    return _client
+
+
+def reset_llm_client():
+    """Drops the process-wide client; the next get_llm_client() builds it from the settings."""
+    global _client
+    with _client_lock:
+        _client = None
@@ -0,0 +1,36 @@
+"""
+Identity of the process that owns an in-memory background job.
+
+Uploads (ingestion_jobs) are held in the memory of the process that queued
+them, so a job row records that process as "host:pid". Another process on
+the same host can then tell a job whose worker exited (e.g. gunicorn
+recycled it) from one that is still being worked on.
+"""
+import os
+import socket
+
+
+def current_worker_id():
+    """Returns "host:pid" of this process (read on every call: gunicorn forks after import)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def worker_is_alive(worker_id):
+    """
+    False only when `worker_id` names another process on this host that is
+    no longer running. Workers on other hosts, and ids that cannot be
+    checked, count as alive.
+    """
+    host, _, pid = (worker_id or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    if int(pid) == os.getpid() or os.name == "nt":
+        # On Windows os.kill would terminate the process instead of probing it
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
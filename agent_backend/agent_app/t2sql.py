@@ -1,11 +1,12 @@
 """
 Text-to-SQL using Vanna
 """
-import vanna as vn
-from vanna.remote import VannaDefault
 import os
 import sys
 
+# vanna is only imported when the Vanna API is configured and first used
+from agent_app.integrations import get_vanna
+
 # Add path for ChromaDB
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CHROMA_DB_PATH = os.path.abspath(os.path.join(BASE_DIR, "../../../ragImplementation/chroma_db"))
@@ -18,11 +19,9 @@ vn_model = os.getenv("VANNA_MODEL", "")
 # If Vanna API not available, use simple SQL generation
 USE_VANNA_API = bool(vn_api_key and vn_model)
 
-if USE_VANNA_API:
-    vn = VannaDefault(model=vn_model, api_key=vn_api_key)
-else:
-    # Fallback: Simple SQL generation for MVP
-    vn = None
+def get_vanna_client():
+    """The Vanna client, or None to fall back to simple SQL generation (MVP)."""
+    return get_vanna(vn_model, vn_api_key) if USE_VANNA_API else None
 
 
 def get_db_schema():
@@ -83,7 +82,8 @@ def run_sql_query(natural_language_query: str) -> str:
     from django.db import connection
     
     try:
-        if USE_VANNA_API and vn:
+        vn = get_vanna_client()
+        if vn:
             # Use Vanna to generate SQL
             sql = vn.generate_sql(natural_language_query)
         else:
@@ -131,6 +131,7 @@ def train_vanna():
     if not USE_VANNA_API:
         return "Vanna API not configured. Using simple SQL generation."
     
+    vn = get_vanna_client()
     schema = get_db_schema()
     vn.train(ddl=schema)
     
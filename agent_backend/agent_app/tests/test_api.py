@@ -262,3 +262,121 @@ class TestAPIWorkflow:
         campaign = Campaign.objects.get(id=data["id"])
         assert campaign.leads.count() == 0
 
+
+
+@pytest.fixture
+def fake_rag(monkeypatch):
+    """Replace rag_main in the API with a recorder returning one chunk per query."""
+    from types import SimpleNamespace
+    from agent_app import api
+
+    calls = []
+
+    def result(q):
+        return SimpleNamespace(page_content=f"About {q}",
+                               metadata={"file_name": "Lumina Grand.pdf", "chunk_id": 1, "project": "lumina-grand"})
+
+    def query(q, mode=None, projects=None):
+        if mode not in (None, "vector", "lexical", "hybrid"):
+            raise ValueError(f"Unknown search mode '{mode}'")
+        calls.append(("query", q, mode, projects))
+        return [result(q)]
+
+    def query_brochures_batch(queries, mode=None):
+        calls.append(("batch", [item["query"] for item in queries], mode))
+        return [[result(item["query"])] for item in queries]
+
+    monkeypatch.setattr(api, "rag_main", SimpleNamespace(
+        query=query,
+        query_brochures_batch=query_brochures_batch,
+        chunk_sources=lambda file_name, chunk_id: [file_name],
+    ))
+    return calls
+
+
+@pytest.mark.django_db
+class TestSearchAndJobEndpoints:
+    """End-to-end tests of the search, ingestion job and campaign send endpoints."""
+
+    def test_search_mode_and_projects(self, api_client, fake_rag):
+        """Test that mode and comma-separated projects reach the retriever, and bad modes give 400."""
+        response = api_client.get("/api/search", {"q": "payment plan", "mode": "hybrid",
+                                                  "projects": "Lumina Grand, Sobha Crest"})
+        assert response.status_code == 200
+        data = json.loads(response.content)
+        assert data["results"][0]["sources"] == ["Lumina Grand.pdf"]
+        assert fake_rag == [("query", "payment plan", "hybrid", ["Lumina Grand", "Sobha Crest"])]
+
+        response = api_client.get("/api/search", {"q": "payment plan", "mode": "fuzzy"})
+        assert response.status_code == 400
+
+    def test_batch_search(self, api_client, fake_rag):
+        """Test that a batch is searched in one call and duplicate queries are rejected."""
+        response = api_client.post(
+            "/api/search/batch",
+            data=json.dumps({"queries": [{"q": "amenities"}, {"q": "payment plan", "top_k": 2}], "mode": "vector"}),
+            content_type="application/json"
+        )
+        assert response.status_code == 200
+        data = json.loads(response.content)
+        assert data["count"] == 2
+        assert data["results"]["payment plan"][0]["text"] == "About payment plan"
+        assert fake_rag == [("batch", ["amenities", "payment plan"], "vector")]
+
+        response = api_client.post(
+            "/api/search/batch",
+            data=json.dumps({"queries": [{"q": "amenities"}, {"q": "amenities"}]}),
+            content_type="application/json"
+        )
+        assert response.status_code == 400
+
+    def test_upload_creates_pollable_job(self, api_client):
+        """Test that an upload is queued as a job whose status can be polled."""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        response = api_client.post(
+            "/api/documents/upload",
+            {"file": SimpleUploadedFile("Sobha Waves.pdf", b"%PDF-1.4 test", content_type="application/pdf")}
+        )
+        assert response.status_code == 200
+        data = json.loads(response.content)
+        assert data["status"] == "queued"
+
+        status = json.loads(api_client.get(data["status_url"]).content)
+        assert (status["file_name"], status["file_size"], status["status"]) == ("Sobha Waves.pdf", 13, "queued")
+        assert api_client.get("/api/documents/jobs/99999").status_code == 404
+
+    def test_upload_rejected_with_status_codes(self, api_client, monkeypatch):
+        """Test that a non-PDF gets 400 and a full ingestion queue gets 429."""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from agent_app import api
+
+        response = api_client.post("/api/documents/upload",
+                                   {"file": SimpleUploadedFile("notes.txt", b"text", content_type="text/plain")})
+        assert response.status_code == 400
+
+        monkeypatch.setattr(api, "ingestion_queue_full", lambda: True)
+        response = api_client.post(
+            "/api/documents/upload",
+            {"file": SimpleUploadedFile("Sobha Waves.pdf", b"%PDF-1.4 test", content_type="application/pdf")}
+        )
+        assert response.status_code == 429
+        assert json.loads(response.content)["status"] == "error"
+
+    def test_campaign_send_progress(self, api_client, sample_campaign):
+        """Test that starting a send queues one job and progress reports every lead."""
+        response = api_client.post(f"/api/campaigns/{sample_campaign.id}/send")
+        data = json.loads(response.content)
+        assert data["status"] == "queued"
+        again = json.loads(api_client.post(f"/api/campaigns/{sample_campaign.id}/send").content)
+        assert again["job_id"] == data["job_id"]
+
+        progress = json.loads(api_client.get(data["progress_url"]).content)
+        assert progress["job"]["status"] == "queued"
+        assert progress["total"] == progress["counts"]["pending"] == sample_campaign.leads.count()
+        assert progress["finished"] is False
+
+    def test_unknown_campaign_send_gives_404(self, api_client, db):
+        """Test that sending or polling a missing campaign gives 404."""
+        assert api_client.post("/api/campaigns/99999/send").status_code == 404
+        assert api_client.get("/api/campaigns/99999/send_progress").status_code == 404
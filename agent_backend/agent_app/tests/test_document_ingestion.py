@@ -17,9 +17,18 @@ from rag_main import (
     load_documents,
     split_into_chunks,
     generate_embeddings,
-    store_in_chromadb
+    store_in_chromadb,
+    ingest_pdfs,
+    ingest_pdf_stream,
+    iter_chunks,
+    load_manifest,
+    save_manifest
 )
 
+SAMPLE_PDF = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), "../../../ragImplementation/pdfs/DLF West Park details.pdf"
+))
+
 
 @pytest.mark.django_db
 class TestDocumentIngestion:
@@ -287,3 +296,617 @@ class TestDocumentIngestion:
         for chunk in chunks:
             assert len(chunk["chunk_text"]) <= 1500  # Allow some margin
 
+    
+    def test_store_in_chromadb_embeds_each_chunk_once(self, fake_embeddings, temp_pdf_directory):
+        """Test that storing precomputed embeddings does not embed the chunks again."""
+        chunks = split_into_chunks(
+            [{"file_name": "single_pass.pdf", "text": "Payment plan details. " * 200}],
+            chunk_size=100,
+            chunk_overlap=10
+        )
+        
+        embedded_chunks = generate_embeddings(chunks, batch_size=8)
+        assert fake_embeddings.texts_embedded == len(chunks)
+        
+        vectorstore = store_in_chromadb(embedded_chunks, persist_directory=temp_pdf_directory)
+        
+        assert fake_embeddings.texts_embedded == len(chunks)
+        assert vectorstore._collection.count() == len(chunks)
+    
+    def test_store_in_chromadb_embeds_missing_vectors(self, fake_embeddings, temp_pdf_directory):
+        """Test that chunks without an embedding are embedded before storage."""
+        chunks = [
+            {"file_name": "a.pdf", "chunk_id": 1, "chunk_text": "Sea view apartments", "embedding": None},
+            {"file_name": "a.pdf", "chunk_id": 2, "chunk_text": "Golf course villas", "embedding": None}
+        ]
+        
+        vectorstore = store_in_chromadb(chunks, persist_directory=temp_pdf_directory)
+        
+        assert fake_embeddings.texts_embedded == 2
+        assert vectorstore._collection.count() == 2
+
+    
+    def test_parallel_load_matches_serial(self, temp_pdf_directory):
+        """Test that the process-pool extraction returns the serial results in the same order."""
+        for name in ["b.pdf", "a.pdf", "c.pdf"]:
+            shutil.copy(SAMPLE_PDF, os.path.join(temp_pdf_directory, name))
+        
+        serial = load_documents(temp_pdf_directory, workers=1)
+        parallel = load_documents(temp_pdf_directory, workers=2, timeout=120)
+        
+        assert [d["file_name"] for d in parallel] == ["a.pdf", "b.pdf", "c.pdf"]
+        assert parallel == serial
+        assert all(d["text"] for d in parallel)
+    
+    def test_parallel_load_falls_back_and_skips_unreadable(self, temp_pdf_directory):
+        """Test that an unreadable file is skipped without dropping the others."""
+        shutil.copy(SAMPLE_PDF, os.path.join(temp_pdf_directory, "good.pdf"))
+        with open(os.path.join(temp_pdf_directory, "broken.pdf"), "wb") as f:
+            f.write(b"not a pdf")
+        
+        docs = load_documents(temp_pdf_directory, workers=2, timeout=120)
+        
+        assert [d["file_name"] for d in docs] == ["good.pdf"]
+
+    def test_timed_out_workers_are_terminated(self):
+        """Test that shutting the pool down after a timeout kills workers stuck on a file."""
+        import multiprocessing
+        import time
+        from concurrent.futures import ProcessPoolExecutor
+        from rag_main import _shutdown_pool
+
+        pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        pool.submit(time.sleep, 60)
+        time.sleep(0.5)
+        processes = list(pool._processes.values())
+
+        start = time.monotonic()
+        _shutdown_pool(pool, terminate=True)
+
+        assert time.monotonic() - start < 10
+        assert processes and not any(p.is_alive() for p in processes)
+
+    def test_pypdf2_fallback_keeps_pages(self):
+        """Test that the PyPDF2 fallback returns one text per page, as page anchors need."""
+        from pdf_extraction import count_pages, extract_pages_with_pypdf2, extract_with_pypdf2
+
+        pages = extract_pages_with_pypdf2(SAMPLE_PDF)
+        assert len(pages) == count_pages(SAMPLE_PDF) > 1
+        assert "".join(pages) == extract_with_pypdf2(SAMPLE_PDF)
+
+
+    def test_streaming_chunks_match_batch_chunking(self):
+        """Test that page-by-page chunking yields the same chunks as split_into_chunks."""
+        pages = [f"Page {i} describes the payment plan and amenities of tower {i}. " * 12 for i in range(40)]
+        text = "".join(page + "\n" for page in pages)
+        
+        batch = split_into_chunks([{"file_name": "big.pdf", "text": text}], chunk_size=300, chunk_overlap=30)
+        streamed = list(iter_chunks("big.pdf", iter(pages), chunk_size=300, chunk_overlap=30, window_chunks=3))
+        
+        assert [c["chunk_text"] for c in streamed] == [c["chunk_text"] for c in batch]
+        assert [c["chunk_id"] for c in streamed] == list(range(1, len(batch) + 1))
+    
+    def test_stream_ingestion_reads_pages_lazily(self, fake_embeddings, temp_pdf_directory, monkeypatch):
+        """Test that the streaming pipeline stores batches before the whole document is read."""
+        import rag_main
+        pages_read = []
+        stored_when = []
+        upsert = rag_main._upsert_chunks
+        
+        def pages():
+            for i in range(200):
+                pages_read.append(i)
+                yield f"Catalogue page {i} with floor plans and prices. " * 20
+        
+        def recording_upsert(vectorstore, chunks):
+            stored_when.append(len(pages_read))
+            upsert(vectorstore, chunks)
+        
+        monkeypatch.setattr(rag_main, "_upsert_chunks", recording_upsert)
+        stored = ingest_pdf_stream("catalogue.pdf", pages(), persist_directory=temp_pdf_directory, batch_size=16)
+        
+        assert stored > 16
+        assert stored_when[0] < 200
+
+
+@pytest.mark.django_db
+class TestIncrementalIngestion:
+    """Test manifest-driven incremental ingestion."""
+    
+    @pytest.fixture
+    def pdf_folder(self, temp_pdf_directory):
+        folder = os.path.join(temp_pdf_directory, "pdfs")
+        os.makedirs(folder)
+        shutil.copy(SAMPLE_PDF, os.path.join(folder, "west_park.pdf"))
+        return folder
+    
+    @pytest.fixture
+    def chroma_dir(self, temp_pdf_directory):
+        return os.path.join(temp_pdf_directory, "chroma_db")
+    
+    def _pdf_paths(self, folder):
+        return [os.path.join(folder, f) for f in sorted(os.listdir(folder))]
+    
+    def test_first_run_adds_files(self, fake_embeddings, pdf_folder, chroma_dir):
+        """Test that a new file is ingested and recorded in the manifest."""
+        import rag_main
+        summary = ingest_pdfs(self._pdf_paths(pdf_folder), persist_directory=chroma_dir)
+        
+        assert summary["added"] == ["west_park.pdf"]
+        assert summary["chunks_created"] > 0
+        entry = load_manifest(chroma_dir)["files"]["west_park.pdf"]
+        assert entry["chunks"] == summary["chunks_created"]
+        assert entry["chunker"] == "tokens"
+        assert entry["chunk_size"] == rag_main.CHUNK_TOKENS
+    
+    def test_unchanged_files_are_skipped(self, fake_embeddings, pdf_folder, chroma_dir):
+        """Test that re-running ingestion on an unchanged corpus embeds nothing."""
+        ingest_pdfs(self._pdf_paths(pdf_folder), persist_directory=chroma_dir)
+        embedded = fake_embeddings.texts_embedded
+        
+        summary = ingest_pdfs(self._pdf_paths(pdf_folder), persist_directory=chroma_dir)
+        
+        assert summary["unchanged"] == ["west_park.pdf"]
+        assert summary["chunks_created"] == 0
+        assert fake_embeddings.texts_embedded == embedded
+    
+    def test_changed_chunking_parameters_reingest(self, fake_embeddings, pdf_folder, chroma_dir):
+        """Test that new chunking parameters replace the stored chunks of a file."""
+        import rag_main
+        ingest_pdfs(self._pdf_paths(pdf_folder), persist_directory=chroma_dir)
+        
+        summary = ingest_pdfs(self._pdf_paths(pdf_folder), persist_directory=chroma_dir, chunk_size=400, chunk_overlap=40)
+        
+        assert summary["updated"] == ["west_park.pdf"]
+        store = rag_main.Chroma(persist_directory=chroma_dir, collection_name=rag_main.COLLECTION_NAME,
+                                embedding_function=rag_main.get_embedding_model())
+        assert store._collection.count() == summary["chunks_created"]
+    
+    def test_changed_content_reingests(self, fake_embeddings, pdf_folder, chroma_dir):
+        """Test that a content hash mismatch triggers re-ingestion."""
+        ingest_pdfs(self._pdf_paths(pdf_folder), persist_directory=chroma_dir)
+        manifest = load_manifest(chroma_dir)
+        manifest["files"]["west_park.pdf"]["sha256"] = "stale"
+        save_manifest(manifest, chroma_dir)
+        
+        summary = ingest_pdfs(self._pdf_paths(pdf_folder), persist_directory=chroma_dir)
+        
+        assert summary["updated"] == ["west_park.pdf"]
+    
+    def test_removed_files_are_pruned(self, fake_embeddings, pdf_folder, chroma_dir):
+        """Test that files deleted from the folder lose their chunks."""
+        import rag_main
+        ingest_pdfs(self._pdf_paths(pdf_folder), persist_directory=chroma_dir)
+        shutil.copy(SAMPLE_PDF, os.path.join(pdf_folder, "copy.pdf"))
+        ingest_pdfs(self._pdf_paths(pdf_folder), persist_directory=chroma_dir)
+        os.remove(os.path.join(pdf_folder, "west_park.pdf"))
+        
+        summary = ingest_pdfs(self._pdf_paths(pdf_folder), persist_directory=chroma_dir, prune_missing=True)
+        
+        assert summary["removed"] == ["west_park.pdf"]
+        assert "west_park.pdf" not in load_manifest(chroma_dir)["files"]
+        store = rag_main.Chroma(persist_directory=chroma_dir, collection_name=rag_main.COLLECTION_NAME,
+                                embedding_function=rag_main.get_embedding_model())
+        assert store._collection.get(where={"file_name": "west_park.pdf"})["ids"] == []
+
+    def test_lexical_index_written_once_per_run(self, fake_embeddings, pdf_folder, chroma_dir, monkeypatch):
+        """Test that a multi-file run loads and saves the BM25 index and bumps the version once."""
+        import rag_main
+        from lexical_index import BM25Index
+        monkeypatch.setattr(rag_main, "DEDUP_ENABLED", False)
+        ingest_pdfs(self._pdf_paths(pdf_folder), persist_directory=chroma_dir)
+        for name in ("copy1.pdf", "copy2.pdf", "copy3.pdf"):
+            shutil.copy(SAMPLE_PDF, os.path.join(pdf_folder, name))
+        os.remove(os.path.join(pdf_folder, "west_park.pdf"))
+
+        calls = []
+        load, save, refresh = BM25Index.load, BM25Index.save, rag_main.refresh_vectorstore
+        monkeypatch.setattr(BM25Index, "load", classmethod(lambda cls, d: calls.append("load") or load.__func__(cls, d)))
+        monkeypatch.setattr(BM25Index, "save", lambda index, d: calls.append("save") or save(index, d))
+        # Every real version bump refreshes the pooled handle
+        monkeypatch.setattr(rag_main, "refresh_vectorstore", lambda d=None: calls.append("bump") or refresh(d))
+
+        summary = ingest_pdfs(self._pdf_paths(pdf_folder), persist_directory=chroma_dir, prune_missing=True)
+
+        assert summary["added"] == ["copy1.pdf", "copy2.pdf", "copy3.pdf"]
+        assert summary["removed"] == ["west_park.pdf"]
+        assert calls == ["load", "save", "bump"]
+        index = BM25Index.load(chroma_dir)
+        assert {doc_id.split("_chunk")[0] for doc_id in index.docs} == {"copy1.pdf", "copy2.pdf", "copy3.pdf"}
+
+    def test_overlapping_ingestions_each_save_their_indexes(self, fake_embeddings, pdf_folder, chroma_dir,
+                                                            monkeypatch):
+        """Test that an ingestion finishing while another is running saves its own index changes."""
+        import threading
+        import rag_main
+        from lexical_index import BM25Index
+        monkeypatch.setattr(rag_main, "DEDUP_ENABLED", False)
+        other = os.path.join(pdf_folder, "other.pdf")
+        shutil.copy(SAMPLE_PDF, other)
+
+        # The background ingestion waits, inside its batch, until the first one has finished
+        inside, first_done = threading.Event(), threading.Event()
+        update = rag_main.update_lexical_index
+
+        def paused_update(*args, **kwargs):
+            update(*args, **kwargs)
+            if threading.current_thread().name == "background-ingest":
+                inside.set()
+                first_done.wait(10)
+
+        monkeypatch.setattr(rag_main, "update_lexical_index", paused_update)
+        background = threading.Thread(name="background-ingest",
+                                      target=lambda: ingest_pdfs([other], persist_directory=chroma_dir))
+        background.start()
+        try:
+            assert inside.wait(10)
+            ingest_pdfs([os.path.join(pdf_folder, "west_park.pdf")], persist_directory=chroma_dir)
+
+            files = lambda: {doc_id.split("_chunk")[0] for doc_id in BM25Index.load(chroma_dir).docs}
+            assert "west_park.pdf" in files()
+            assert rag_main.get_collection_version(chroma_dir) != ""
+            assert set(load_manifest(chroma_dir)["files"]) == {"west_park.pdf"}
+        finally:
+            first_done.set()
+            background.join()
+
+        assert files() == {"west_park.pdf", "other.pdf"}
+        assert set(load_manifest(chroma_dir)["files"]) == {"west_park.pdf", "other.pdf"}
+
+
+@pytest.mark.django_db
+class TestIngestionJobs:
+    """Test background ingestion jobs for uploaded documents."""
+    
+    @pytest.fixture
+    def jobs(self):
+        from agent_app.services import ingestion_jobs
+        yield ingestion_jobs
+        ingestion_jobs._job_buffers.clear()
+    
+    def _upload(self, jobs, file_name, content):
+        return jobs.create_ingestion_job(file_name, [content[i:i + 4096] for i in range(0, len(content), 4096)])
+    
+    def test_job_queued_with_buffered_file(self, jobs):
+        """Test that creating a job buffers the file in memory and returns immediately."""
+        with open(SAMPLE_PDF, "rb") as f:
+            content = f.read()
+        job = self._upload(jobs, "west_park.pdf", content)
+        
+        assert job.status == "queued"
+        assert job.stage == "queued"
+        assert job.file_size == len(content)
+        assert jobs._job_buffers[job.id].getvalue() == content
+    
+    def test_job_runs_to_completion(self, jobs, fake_embeddings, temp_pdf_directory):
+        """Test that a job records stage and progress counts and releases its buffer."""
+        from agent_app.models import IngestionJob
+        with open(SAMPLE_PDF, "rb") as f:
+            job = self._upload(jobs, "west_park.pdf", f.read())
+        
+        chroma_dir = os.path.join(temp_pdf_directory, "chroma_db")
+        jobs.run_ingestion_job(job.id, persist_directory=chroma_dir)
+        
+        job = IngestionJob.objects.get(id=job.id)
+        assert job.status == "succeeded"
+        assert job.stage == "done"
+        assert job.pages_extracted > 0
+        assert job.chunks_stored == job.chunks_created > 0
+        entry = load_manifest(chroma_dir)["files"]["west_park.pdf"]
+        assert entry["chunks"] == job.chunks_stored
+        assert entry["source"] == "upload"
+        assert job.id not in jobs._job_buffers
+        
+        status = jobs.job_status(job)
+        assert status["status"] == "succeeded"
+        assert status["finished_at"] is not None
+    
+    def test_job_failure_is_reported(self, jobs, fake_embeddings, temp_pdf_directory):
+        """Test that an unreadable PDF marks the job failed with an error."""
+        from agent_app.models import IngestionJob
+        job = self._upload(jobs, "broken.pdf", b"not a pdf")
+        
+        jobs.run_ingestion_job(job.id, persist_directory=os.path.join(temp_pdf_directory, "chroma_db"))
+        
+        job = IngestionJob.objects.get(id=job.id)
+        assert job.status == "failed"
+        assert job.error
+    
+    def test_queue_is_bounded(self, jobs, monkeypatch):
+        """Test that uploads are refused once the pending limit is reached."""
+        monkeypatch.setattr(jobs, "INGESTION_MAX_PENDING", 1)
+        assert not jobs.ingestion_queue_full()
+        self._upload(jobs, "queued.pdf", b"%PDF-1.4")
+        assert jobs.ingestion_queue_full()
+
+    def test_stale_jobs_do_not_fill_queue(self, jobs, monkeypatch):
+        """Test that jobs left queued or running by a crashed process are failed and free the queue."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from agent_app.models import IngestionJob
+        monkeypatch.setattr(jobs, "INGESTION_MAX_PENDING", 2)
+        long_ago = timezone.now() - timedelta(seconds=jobs.INGESTION_STALE_SECONDS + 60)
+        queued = IngestionJob.objects.create(file_name="queued.pdf")
+        running = IngestionJob.objects.create(file_name="running.pdf", status="running", started_at=long_ago)
+        IngestionJob.objects.filter(id=queued.id).update(created_at=long_ago)
+        fresh = self._upload(jobs, "fresh.pdf", b"%PDF-1.4")
+
+        assert not jobs.ingestion_queue_full()
+        for job in (queued, running):
+            job.refresh_from_db()
+            assert job.status == "failed"
+            assert job.error == jobs.STALE_JOB_ERROR
+        fresh.refresh_from_db()
+        assert fresh.status == "queued"
+
+    def test_jobs_without_buffer_fail_at_once(self, jobs):
+        """Test that jobs whose worker process exited, taking the upload with it, are failed on the next check."""
+        import socket
+        import subprocess
+        from agent_app.models import IngestionJob
+        from agent_app.services.worker_process import current_worker_id
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        dead = IngestionJob.objects.create(file_name="dead.pdf", worker=f"{socket.gethostname()}:{exited.pid}")
+        restarted = IngestionJob.objects.create(file_name="restarted.pdf", status="running", worker=current_worker_id())
+        remote = IngestionJob.objects.create(file_name="remote.pdf", worker="other-host:1")
+        live = self._upload(jobs, "live.pdf", b"%PDF-1.4")
+
+        assert jobs.fail_orphaned_ingestion_jobs() == 2
+        for job in (dead, restarted):
+            job.refresh_from_db()
+            assert job.status == "failed"
+            assert job.error == jobs.LOST_BUFFER_ERROR
+        for job in (remote, live):
+            job.refresh_from_db()
+            assert job.status == "queued"
+
+
+class TestBufferIngestion:
+    """Test ingesting PDFs straight from memory."""
+    
+    def test_buffer_matches_file_ingestion(self, fake_embeddings, temp_pdf_directory):
+        """Test that a buffer yields the same chunks as the file on disk and is idempotent."""
+        import io
+        from rag_main import ingest_pdf_buffer
+        
+        file_dir = os.path.join(temp_pdf_directory, "from_file")
+        buffer_dir = os.path.join(temp_pdf_directory, "from_buffer")
+        with open(SAMPLE_PDF, "rb") as f:
+            buffer = io.BytesIO(f.read())
+        
+        from_file = ingest_pdfs([SAMPLE_PDF], persist_directory=file_dir)
+        from_buffer = ingest_pdf_buffer(os.path.basename(SAMPLE_PDF), buffer, persist_directory=buffer_dir)
+        
+        assert from_buffer["added"] == from_file["added"]
+        assert from_buffer["chunks_created"] == from_file["chunks_created"] > 0
+        file_entry = load_manifest(file_dir)["files"][os.path.basename(SAMPLE_PDF)]
+        buffer_entry = load_manifest(buffer_dir)["files"][os.path.basename(SAMPLE_PDF)]
+        assert buffer_entry["sha256"] == file_entry["sha256"]
+        
+        again = ingest_pdf_buffer(os.path.basename(SAMPLE_PDF), buffer, persist_directory=buffer_dir)
+        assert again["unchanged"] == [os.path.basename(SAMPLE_PDF)]
+        assert again["chunks_created"] == 0
+
+
+class TestChunkDedup:
+    """Test exact and near-duplicate chunk detection at ingestion."""
+    
+    @pytest.fixture
+    def pdf_folders(self, temp_pdf_directory):
+        # The same brochure under two names of one project, like pdfs/ and "pdfs copy/"
+        folders = []
+        for name, file_name in (("pdfs", "west_park.pdf"), ("pdfs copy", "west_park copy.pdf")):
+            folder = os.path.join(temp_pdf_directory, name)
+            os.makedirs(folder)
+            shutil.copy(SAMPLE_PDF, os.path.join(folder, file_name))
+            folders.append(folder)
+        return folders
+    
+    def _collection(self, chroma_dir):
+        import rag_main
+        return rag_main.get_vectorstore(chroma_dir)._collection
+    
+    def test_near_duplicates_detected(self):
+        """Test that exact and near-identical texts match and unrelated text does not."""
+        from dedup import DedupIndex
+        from pdf_extraction import extract_pdf_text
+        text = extract_pdf_text(SAMPLE_PDF)[:1000]
+        index = DedupIndex(max_distance=3)
+        key = index.add_canonical("a.pdf", 1, text)
+        
+        words = text.split()
+        assert index.find("  ".join(words).upper()) == key
+        assert index.find(" ".join(words[:-1])) == key
+        assert index.find("Sobha Waves offers sea facing apartments with private beach access") is None
+    
+    def test_duplicate_file_stored_once(self, fake_embeddings, pdf_folders, temp_pdf_directory):
+        """Test that a second copy of a brochure adds sources instead of chunks."""
+        import rag_main
+        chroma_dir = os.path.join(temp_pdf_directory, "chroma_db")
+        first = ingest_pdfs([os.path.join(pdf_folders[0], "west_park.pdf")], persist_directory=chroma_dir)
+        embedded = fake_embeddings.texts_embedded
+        second = ingest_pdfs([os.path.join(pdf_folders[1], "west_park copy.pdf")], persist_directory=chroma_dir)
+        
+        assert first["chunks_created"] > 0
+        assert second["added"] == ["west_park copy.pdf"]
+        assert second["chunks_created"] == 0
+        assert fake_embeddings.texts_embedded == embedded
+        assert self._collection(chroma_dir).count() == first["chunks_created"]
+        assert rag_main.chunk_sources("west_park.pdf", 1, chroma_dir) == ["west_park.pdf", "west_park copy.pdf"]
+    
+    def test_removing_canonical_file_keeps_shared_chunks(self, fake_embeddings, pdf_folders, temp_pdf_directory):
+        """Test that deleting the first copy moves its chunks to the remaining copy."""
+        import rag_main
+        from lexical_index import BM25Index
+        chroma_dir = os.path.join(temp_pdf_directory, "chroma_db")
+        first = ingest_pdfs([os.path.join(pdf_folders[0], "west_park.pdf")], persist_directory=chroma_dir)
+        ingest_pdfs([os.path.join(pdf_folders[1], "west_park copy.pdf")], persist_directory=chroma_dir)
+        
+        rag_main.delete_file_chunks("west_park.pdf", chroma_dir)
+        
+        stored = self._collection(chroma_dir).get(include=["metadatas"])
+        assert len(stored["ids"]) == first["chunks_created"]
+        assert {m["file_name"] for m in stored["metadatas"]} == {"west_park copy.pdf"}
+        assert {d["file_name"] for d in BM25Index.load(chroma_dir).docs.values()} == {"west_park copy.pdf"}
+        assert rag_main.chunk_sources("west_park copy.pdf", 1, chroma_dir) == ["west_park copy.pdf"]
+    
+    def test_existing_store_is_deduplicated(self, fake_embeddings, temp_pdf_directory):
+        """Test that a store built without dedup loses its duplicates on first use."""
+        import rag_main
+        from dedup import DEDUP_INDEX_FILE_NAME
+        chroma_dir = os.path.join(temp_pdf_directory, "chroma_db")
+        text = "Legal disclaimer: all images are artist impressions. " * 5
+        store_in_chromadb(
+            [
+                {"file_name": "Sobha Waves.pdf", "chunk_id": 1, "chunk_text": text},
+                {"file_name": "Sobha Waves brochure.pdf", "chunk_id": 1, "chunk_text": text},
+                {"file_name": "Sobha Waves brochure.pdf", "chunk_id": 2, "chunk_text": "Sobha Waves amenities and clubhouse"},
+            ],
+            persist_directory=chroma_dir
+        )
+        assert not os.path.exists(os.path.join(chroma_dir, DEDUP_INDEX_FILE_NAME))
+        
+        index = rag_main.get_dedup_index(chroma_dir)
+        
+        assert len(index) == 2
+        assert index.duplicate_count() == 1
+        assert sorted(self._collection(chroma_dir).get()["ids"]) == \
+            ["Sobha Waves brochure.pdf_chunk1", "Sobha Waves brochure.pdf_chunk2"]
+
+    def test_dedup_index_written_once_per_run(self, fake_embeddings, pdf_folders, monkeypatch):
+        """Test that a multi-file run saves the dedup index once, with every file's sources."""
+        import rag_main
+        from dedup import DedupIndex
+        chroma_dir = os.path.join(os.path.dirname(pdf_folders[0]), "chroma_db")
+        shutil.copy(SAMPLE_PDF, os.path.join(pdf_folders[0], "west_park final.pdf"))
+        paths = [os.path.join(folder, name) for folder in pdf_folders for name in sorted(os.listdir(folder))]
+        saves = []
+        save = DedupIndex.save
+        monkeypatch.setattr(DedupIndex, "save", lambda index, d: saves.append(d) or save(index, d))
+
+        summary = ingest_pdfs(paths, persist_directory=chroma_dir)
+
+        assert len(summary["added"]) == 3
+        assert saves == [chroma_dir]
+        index = DedupIndex.load(chroma_dir)
+        assert {name for name, _ in index.sources(f"{summary['added'][0]}_chunk1")} == set(summary["added"])
+
+    @pytest.mark.parametrize("mode,backend", [
+        ("vector", "chroma"), ("vector", "numpy"), ("lexical", "chroma"), ("hybrid", "chroma"),
+    ])
+    def test_identical_text_kept_per_project(self, fake_embeddings, temp_pdf_directory, monkeypatch, mode, backend):
+        """Test that text shared by two projects is found when searching either project."""
+        import rag_main
+        chroma_dir = os.path.join(temp_pdf_directory, "chroma_db")
+        monkeypatch.setenv("CHROMA_DB_PATH", chroma_dir)
+        pages = ["Payment plan 60/40 with 10% on booking and the balance on handover. " * 3]
+        for file_name in ("Sobha Waves.pdf", "Lumina Grand.pdf"):
+            ingest_pdf_stream(file_name, pages, persist_directory=chroma_dir)
+
+        results = rag_main.query_brochures("payment plan on booking", use_cache=False, mode=mode, backend=backend,
+                                           projects=["Lumina Grand"])
+
+        assert results
+        assert {r.metadata["file_name"] for r in results} == {"Lumina Grand.pdf"}
+        assert rag_main.chunk_sources("Lumina Grand.pdf", 1, chroma_dir) == ["Lumina Grand.pdf"]
+
+    def test_legacy_index_split_per_project(self, fake_embeddings, temp_pdf_directory, monkeypatch):
+        """Test that an index written before per-project dedup gets a stored chunk for each project."""
+        import json
+        import rag_main
+        from dedup import DEDUP_INDEX_FILE_NAME, content_digest, simhash
+        chroma_dir = os.path.join(temp_pdf_directory, "chroma_db")
+        monkeypatch.setenv("CHROMA_DB_PATH", chroma_dir)
+        text = "Payment plan 60/40 with 10% on booking and the balance on handover."
+        store_in_chromadb([{"file_name": "Sobha Waves.pdf", "chunk_id": 1, "chunk_text": text}],
+                          persist_directory=chroma_dir)
+        legacy = {"file_name": "Sobha Waves.pdf", "chunk_id": 1, "digest": content_digest(text),
+                  "simhash": simhash(text), "sources": [["Sobha Waves.pdf", 1], ["Lumina Grand.pdf", 1]]}
+        with open(os.path.join(chroma_dir, DEDUP_INDEX_FILE_NAME), "w", encoding="utf-8") as f:
+            json.dump({"max_distance": 3, "entries": {"Sobha Waves.pdf_chunk1": legacy}}, f)
+
+        index = rag_main.get_dedup_index(chroma_dir)
+
+        assert index.sources("Sobha Waves.pdf_chunk1") == [("Sobha Waves.pdf", 1)]
+        assert index.sources("Lumina Grand.pdf_chunk1") == [("Lumina Grand.pdf", 1)]
+        assert sorted(self._collection(chroma_dir).get()["ids"]) == ["Lumina Grand.pdf_chunk1", "Sobha Waves.pdf_chunk1"]
+        results = rag_main.query_brochures("payment plan", use_cache=False, mode="lexical", projects=["Lumina Grand"])
+        assert [r.metadata["file_name"] for r in results] == ["Lumina Grand.pdf"]
+
+
+class TestTokenChunking:
+    """Test token-aware, page-anchored chunking."""
+
+    def _pages(self):
+        from pdf_extraction import iter_pdf_pages
+        return [text for _, text in iter_pdf_pages(SAMPLE_PDF)]
+
+    def test_chunks_fit_budget_and_stay_on_their_page(self):
+        """Test that no chunk exceeds the token budget or straddles two pages."""
+        from chunking import TokenCounter, iter_token_chunks
+        counter = TokenCounter()
+        pages = self._pages()
+
+        chunks = list(iter_token_chunks("west_park.pdf", iter(pages), counter, max_tokens=64, overlap_tokens=8))
+
+        assert [c["chunk_id"] for c in chunks] == list(range(1, len(chunks) + 1))
+        assert {c["page"] for c in chunks} == {n for n, text in enumerate(pages, start=1) if text.strip()}
+        for chunk in chunks:
+            assert 0 < counter.count(chunk["chunk_text"]) <= 64
+            assert chunk["chunk_text"] in pages[chunk["page"] - 1]
+
+    def test_sections_start_new_chunks(self):
+        """Test that a heading starts a new chunk and overlap is not carried across it."""
+        from chunking import TokenCounter, chunk_page
+        payment = "Payment Plan\n" + "Pay ten percent now and the rest on handover. " * 6
+        amenities = "Amenities\n" + "There is a pool, a gym and a padel court. " * 6
+        page = payment + "\n" + amenities
+
+        chunks = chunk_page(page, TokenCounter(), max_tokens=80, overlap_tokens=20)
+
+        assert chunks[0].startswith("Payment Plan")
+        assert any(chunk.startswith("Amenities") for chunk in chunks)
+        assert not any("handover" in chunk and "pool" in chunk for chunk in chunks)
+
+    def test_tokenizer_counter_leaves_model_tokenizer_untouched(self, tmp_path):
+        """Test exact counting with a model tokenizer, which keeps its truncation."""
+        from transformers import BertTokenizerFast
+        from chunking import TokenCounter
+        vocab_file = tmp_path / "vocab.txt"
+        vocab_file.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "pool", "gym", "##s"]))
+        tokenizer = BertTokenizerFast(vocab_file=str(vocab_file)).backend_tokenizer
+        tokenizer.enable_truncation(max_length=4)
+
+        counter = TokenCounter(tokenizer)
+
+        assert counter.exact
+        assert counter.count("pools gym pool gyms pool") == 7
+        assert counter.truncate("pools gym pool", 3) == "pools gym"
+        assert len(tokenizer.encode("pools gym pool gyms pool").ids) == 4
+
+    def test_ingested_chunks_cite_pages(self, fake_embeddings, temp_pdf_directory):
+        """Test that page numbers reach Chroma, the lexical index and the manifest."""
+        import rag_main
+        chroma_dir = os.path.join(temp_pdf_directory, "chroma_db")
+        folder = os.path.join(temp_pdf_directory, "pdfs")
+        os.makedirs(folder)
+        shutil.copy(SAMPLE_PDF, os.path.join(folder, "west_park.pdf"))
+
+        ingest_pdfs([os.path.join(folder, "west_park.pdf")], persist_directory=chroma_dir)
+
+        stored = rag_main.get_vectorstore(chroma_dir)._collection.get(include=["metadatas"])
+        assert all(isinstance(m["page"], int) and m["page"] >= 1 for m in stored["metadatas"])
+        results = rag_main.lexical_search("bowling alley", persist_directory=chroma_dir)
+        assert results and results[0].metadata["page"] >= 1
+
+        summary = ingest_pdfs([os.path.join(folder, "west_park.pdf")], persist_directory=chroma_dir, chunker="chars")
+        assert summary["updated"] == ["west_park.pdf"]
+        stored = rag_main.get_vectorstore(chroma_dir)._collection.get(include=["metadatas"])
+        assert not any("page" in m for m in stored["metadatas"])
+
+    def test_unknown_chunker_rejected(self):
+        """Test that an unknown chunker name is an error."""
+        import rag_main
+        with pytest.raises(ValueError):
+            rag_main.resolve_chunking("sentences")
@@ -0,0 +1,587 @@
+"""
+Message Service Tests
+Tests for campaign-level RAG context preparation used by message generation.
+"""
+import pytest
+from agent_app import message_service
+from agent_app.message_service import prepare_campaign_context, retrieve_project_context
+from agent_app.services.llm_client import LLMProvider, LLMResponse
+
+
+class FakeDocument:
+    def __init__(self, page_content):
+        self.page_content = page_content
+
+
+class FakeProvider(LLMProvider):
+    """LLM provider stand-in recording each request's parts and answering with `answer(parts, generation_config)`."""
+
+    name = "test"
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = []
+
+    def generate(self, model, parts, generation_config=None, timeout=None):
+        self.calls.append(parts)
+        return LLMResponse(self.answer(parts, generation_config))
+
+
+@pytest.fixture
+def rag_calls(monkeypatch):
+    """Replace the RAG query with a recorder returning one fake chunk."""
+    calls = []
+
+    def fake_query(query_text, mode=None, projects=None):
+        calls.append((query_text, tuple(projects or ())))
+        return [FakeDocument(f"context for {query_text}")]
+
+    monkeypatch.setattr(message_service, "query", fake_query)
+    return calls
+
+
+@pytest.fixture
+def use_provider():
+    """Install an LLM provider for the test (configure_llm_client); the default client is rebuilt afterwards."""
+    from agent_app.services import llm_client
+    yield llm_client.configure_llm_client
+    llm_client.reset_llm_client()
+
+
+@pytest.mark.django_db
+class TestCampaignContext:
+    """Test the per-campaign RAG context preparation stage."""
+
+    def test_one_lookup_per_project_pair(self, sample_campaign, sample_leads, rag_calls):
+        """Test that 5 leads over 3 projects need only 3 lookups."""
+        contexts, stats = prepare_campaign_context(sample_campaign, sample_leads)
+
+        assert stats == {"leads": 5, "lookups": 3, "lookups_saved": 2}
+        assert len(rag_calls) == 3
+        for lead in sample_leads:
+            assert contexts[(lead.project_name, "Sobha Crest")] == f"context for Compare {lead.project_name} and Sobha Crest"
+
+    def test_lookup_scoped_to_projects(self, rag_calls):
+        """Test that the lookup is restricted to both projects."""
+        retrieve_project_context("Lumina Grand", "Sobha Crest")
+        assert rag_calls == [("Compare Lumina Grand and Sobha Crest", ("Lumina Grand", "Sobha Crest"))]
+
+    def test_failed_lookup_gives_empty_context(self, sample_campaign, sample_leads, monkeypatch):
+        """Test that RAG failures degrade to an empty context."""
+        def broken_query(*args, **kwargs):
+            raise RuntimeError("chroma unavailable")
+        monkeypatch.setattr(message_service, "query", broken_query)
+
+        contexts, stats = prepare_campaign_context(sample_campaign, sample_leads)
+        assert set(contexts.values()) == {""}
+        assert stats["lookups"] == 3
+
+    def test_generate_message_uses_precomputed_context(self, sample_campaign, sample_lead, rag_calls, use_provider):
+        """Test that generate_message does not query RAG when context is given."""
+        provider = FakeProvider(lambda parts, generation_config: "Hello from the test model")
+        use_provider(provider)
+        prompts = provider.calls
+
+        body = message_service.generate_message(sample_lead, sample_campaign, context="Sobha Crest amenities")
+        assert body == "Hello from the test model"
+        assert rag_calls == []
+        assert "Sobha Crest amenities" in prompts[0][1]
+
+
+class TestContextPacking:
+    """Test the token-budgeted context packer used for generate_message prompts."""
+
+    @pytest.fixture
+    def counter(self):
+        from chunking import TokenCounter
+        return TokenCounter()
+
+    def _doc(self, text, file_name=None, page=None):
+        from langchain_core.documents import Document
+        metadata = {"file_name": file_name, "page": page} if file_name else {}
+        return Document(page_content=text, metadata=metadata)
+
+    def test_duplicates_dropped_and_overlap_trimmed(self, counter):
+        """Test that repeated text is packed once and shared chunk edges are cut."""
+        from context_packing import pack_context
+        first = "Sobha Crest offers golf villas with a private pool and a rooftop garden"
+        second = "with a private pool and a rooftop garden and handover in 2027"
+        docs = [self._doc(first), self._doc(first.upper()), self._doc(second)]
+
+        context, stats = pack_context(docs, counter, max_tokens=200)
+
+        assert context == f"{first}\n\nand handover in 2027"
+        assert stats["packed"] == 2
+        assert stats["duplicates"] == 1
+        assert stats["trimmed"] == 1
+
+    def test_budget_is_filled_but_never_exceeded(self, counter):
+        """Test that a chunk over budget is cut and smaller chunks still fill the rest."""
+        from context_packing import pack_context
+        docs = [
+            self._doc("Lumina Grand payment plan is sixty forty with four years post handover " * 3),
+            self._doc("Sobha Crest amenities include a lagoon, padel courts and a cinema " * 10),
+            self._doc("Prices start from AED 1.2 million"),
+        ]
+
+        context, stats = pack_context(docs, counter, max_tokens=60, min_partial_tokens=40)
+
+        assert counter.count(context) <= 60
+        assert stats["tokens"] == counter.count(context)
+        assert stats["skipped"] == 1
+        assert context.endswith("Prices start from AED 1.2 million")
+
+    def test_chunks_are_cited(self, counter):
+        """Test that packed chunks name their brochure and page."""
+        from context_packing import pack_context
+        context, _ = pack_context([self._doc("Eco Deck podium", "DLF West Park details.pdf", 3)], counter, 50)
+        assert context == "[DLF West Park details.pdf, page 3]\nEco Deck podium"
+
+    def test_retrieved_context_respects_budget(self, rag_calls, monkeypatch):
+        """Test that retrieve_project_context packs into the requested budget."""
+        long_text = "Sobha Crest golf villas with private pools and sea views. " * 40
+        monkeypatch.setattr(message_service, "query", lambda *args, **kwargs: [FakeDocument(long_text)])
+
+        context = retrieve_project_context("Lumina Grand", "Sobha Crest", max_tokens=64)
+
+        assert 0 < message_service.count_tokens(context) <= 64
+
+
+@pytest.mark.django_db
+class TestCampaignEngine:
+    """Test bounded-concurrency message generation for campaign sends."""
+
+    def test_concurrency_is_bounded(self, sample_campaign, sample_leads):
+        """Test that at most `workers` generations run at once, and more than one does."""
+        import threading
+        import time
+        from agent_app.services.campaign_engine import generate_campaign_messages
+
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def slow_generate(lead, campaign, context=None, save=True):
+            with lock:
+                running.append(lead)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(lead)
+            return f"Hi {lead.lead_name}"
+
+        messages, stats = generate_campaign_messages(
+            sample_campaign, sample_leads * 2, {}, workers=3, generate=slow_generate, save=False
+        )
+        assert 1 < max(peak) <= 3
+        assert [m["lead"] for m in messages] == sample_leads * 2
+        assert stats["leads"] == 10 and stats["generated"] == 10 and stats["workers"] == 3
+        assert stats["leads_per_minute"] > 0 and stats["p95_ms"] >= 50
+
+    def test_template_fallback_and_bulk_save(self, sample_campaign, sample_leads):
+        """Test that failed leads get the template and only AI messages are recorded."""
+        from agent_app.models import FollowUpMessage
+        from agent_app.services.campaign_engine import generate_campaign_messages
+
+        def flaky_generate(lead, campaign, context=None, save=True):
+            assert save is False
+            if lead is sample_leads[0]:
+                raise RuntimeError("quota exceeded")
+            if lead is sample_leads[1]:
+                return None
+            return f"{context}: Hi {lead.lead_name}"
+
+        contexts = {(lead.project_name, "Sobha Crest"): f"ctx {lead.project_name}" for lead in sample_leads}
+        messages, stats = generate_campaign_messages(sample_campaign, sample_leads, contexts, workers=4,
+                                                     generate=flaky_generate)
+
+        assert [m["source"] for m in messages] == ["template", "template", "ai", "ai", "ai"]
+        assert messages[0]["subject"] == f"{sample_leads[0].lead_name}, a quick update on Sobha Crest"
+        assert messages[2]["body"] == f"ctx {sample_leads[2].project_name}: Hi {sample_leads[2].lead_name}"
+        assert stats["fallback"] == 2
+        assert FollowUpMessage.objects.filter(campaign=sample_campaign).count() == 3
+
+
+@pytest.mark.django_db
+class TestCampaignSendPipeline:
+    """Test the background generate → send → log campaign send pipeline."""
+
+    @pytest.fixture
+    def pipeline(self, monkeypatch, rag_calls):
+        from agent_app.services import campaign_sends
+
+        sent = []
+        submitted = []
+
+        def fake_send(lead, body, subject):
+            sent.append(lead.email)
+            return lead.email != "lead2@example.com"
+
+        monkeypatch.setattr(message_service, "generate_message",
+                            lambda lead, campaign, context=None, save=True: f"Hi {lead.lead_name}")
+        monkeypatch.setattr(campaign_sends, "send_campaign_message", fake_send)
+        monkeypatch.setattr(campaign_sends, "_submit", submitted.append)
+        return campaign_sends, sent, submitted
+
+    def test_send_runs_all_stages(self, pipeline, sample_campaign, sample_leads):
+        """Test that a send job generates, emails and logs every lead."""
+        from agent_app.models import CampaignLead, Lead, MessageLog
+        campaign_sends, sent, submitted = pipeline
+
+        job = campaign_sends.start_campaign_send(sample_campaign)
+        assert submitted == [job]
+        job = campaign_sends.run_campaign_send(job.id)
+
+        assert (job.status, job.stage) == ("succeeded", "done")
+        assert len(sent) == 5
+        progress = campaign_sends.send_progress(sample_campaign)
+        assert progress["counts"]["sent"] == 4 and progress["counts"]["failed"] == 1
+        assert progress["total"] == 5 and progress["finished"]
+        assert MessageLog.objects.filter(campaign=sample_campaign, direction="outbound").count() == 4
+        assert Lead.objects.filter(lead_status="Follow-up sent").count() == 4
+        failed = CampaignLead.objects.get(campaign=sample_campaign, send_status="failed")
+        assert failed.send_error and failed.sent_at is None
+        assert CampaignLead.objects.filter(campaign=sample_campaign, send_status="sent",
+                                           personalized_body__startswith="Hi ").count() == 4
+
+    def test_active_job_is_reused_and_failed_leads_retried(self, pipeline, sample_campaign):
+        """Test that starting a send twice queues one job, and a new send retries failed leads."""
+        from agent_app.models import CampaignLead
+        campaign_sends, _, submitted = pipeline
+
+        job = campaign_sends.start_campaign_send(sample_campaign)
+        assert campaign_sends.start_campaign_send(sample_campaign) == job
+        assert len(submitted) == 1
+        # A job running in this process is never taken over by it
+        assert campaign_sends._resume(job) is False
+        assert len(submitted) == 1
+
+        campaign_sends.run_campaign_send(job.id)
+        second = campaign_sends.start_campaign_send(sample_campaign)
+        assert second != job
+        assert CampaignLead.objects.filter(campaign=sample_campaign, send_status="pending").count() == 1
+
+    def test_resume_after_crash(self, pipeline, sample_campaign, sample_leads):
+        """Test that a resumed job finishes every stage without emailing a lead twice."""
+        from agent_app.models import CampaignLead, CampaignSendJob, MessageLog
+        campaign_sends, sent, submitted = pipeline
+
+        # A process died mid-send: one lead per state
+        job = CampaignSendJob.objects.create(campaign=sample_campaign, status="running", stage="send")
+        rows = list(CampaignLead.objects.filter(campaign=sample_campaign).order_by("id").select_related("lead"))
+        for cl, status in zip(rows, ["sent", "emailed", "sending", "generated", "pending"]):
+            cl.send_status = status
+            cl.personalized_subject = "Earlier subject"
+            cl.personalized_body = "Earlier body"
+        CampaignLead.objects.bulk_update(rows, ["send_status", "personalized_subject", "personalized_body"])
+
+        assert campaign_sends.resume_campaign_sends() == [job]
+        assert submitted == [job]
+        interrupted = CampaignLead.objects.get(id=rows[2].id)
+        assert interrupted.send_status == "failed"
+        assert interrupted.send_error == campaign_sends.INTERRUPTED_SEND_ERROR
+
+        job = campaign_sends.run_campaign_send(job.id)
+        assert job.status == "succeeded"
+        # Only the generated and the pending lead are emailed
+        assert sent == [rows[3].lead.email, rows[4].lead.email]
+        statuses = [CampaignLead.objects.get(id=cl.id).send_status for cl in rows]
+        assert statuses == ["sent", "sent", "failed", "sent", "sent"]
+        # The emailed lead is logged with the message it was sent
+        log = MessageLog.objects.get(campaign=sample_campaign, lead=rows[1].lead)
+        assert log.body == "Earlier body"
+
+    def test_start_resumes_job_of_dead_worker(self, pipeline, sample_campaign, sample_leads):
+        """Test that starting a send resumes an active job whose process has exited."""
+        import socket
+        import subprocess
+        import sys
+        from agent_app.models import CampaignLead, CampaignSendJob
+        campaign_sends, _, submitted = pipeline
+
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        job = CampaignSendJob.objects.create(campaign=sample_campaign, status="running", stage="send",
+                                             worker=f"{socket.gethostname()}:{exited.pid}")
+        sending = CampaignLead.objects.filter(campaign=sample_campaign).order_by("id").first()
+        sending.send_status = "sending"
+        sending.save(update_fields=["send_status"])
+
+        assert campaign_sends.start_campaign_send(sample_campaign) == job
+        assert submitted == [job]
+        assert CampaignLead.objects.get(id=sending.id).send_status == "failed"
+        job.refresh_from_db()
+        assert (job.status, job.worker) == ("queued", campaign_sends.current_worker_id())
+        assert campaign_sends.run_campaign_send(job.id).status == "succeeded"
+
+    def test_start_resumes_job_without_heartbeat(self, pipeline, sample_campaign):
+        """Test that a job with a stale heartbeat is resumed and a live one is left alone."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from agent_app.models import CampaignSendJob
+        campaign_sends, _, submitted = pipeline
+
+        job = CampaignSendJob.objects.create(campaign=sample_campaign, status="running", stage="generate",
+                                             worker="other-host:1", heartbeat_at=timezone.now())
+        assert campaign_sends.start_campaign_send(sample_campaign) == job
+        assert submitted == []
+
+        stale = timezone.now() - timedelta(seconds=campaign_sends.CAMPAIGN_SEND_STALE_SECONDS + 1)
+        CampaignSendJob.objects.filter(id=job.id).update(heartbeat_at=stale)
+        assert campaign_sends.start_campaign_send(sample_campaign) == job
+        assert submitted == [job]
+
+    def test_run_stops_when_job_is_taken_over(self, pipeline, monkeypatch, sample_campaign, sample_leads):
+        """Test that a run stops sending once another process has resumed its job."""
+        from agent_app.models import CampaignSendJob
+        campaign_sends, sent, _ = pipeline
+
+        job = campaign_sends.start_campaign_send(sample_campaign)
+
+        def taken_over(lead, body, subject):
+            sent.append(lead.email)
+            CampaignSendJob.objects.filter(id=job.id).update(worker="other-host:1")
+            return True
+
+        monkeypatch.setattr(campaign_sends, "send_campaign_message", taken_over)
+        assert campaign_sends.run_campaign_send(job.id) is None
+        assert len(sent) == 1
+        job.refresh_from_db()
+        assert (job.status, job.worker) == ("running", "other-host:1")
+        assert campaign_sends.send_job_is_dead(job) is False
+
+
+@pytest.mark.django_db
+class TestBatchedGeneration:
+    """Test multi-lead batched prompts with JSON output and per-lead retries."""
+
+    def test_parse_batch_response(self):
+        """Test that only non-empty string messages under requested keys are kept."""
+        from agent_app.message_service import parse_batch_response
+        keys = {"lead_1": None, "lead_2": None}
+
+        text = '```json\n{"lead_1": " Hi Ann ", "lead_2": "", "lead_3": "Hi Bo", "lead_4": 5}\n```'
+        assert parse_batch_response(text, keys) == {"lead_1": "Hi Ann"}
+        assert parse_batch_response('["Hi Ann"]', keys) == {}
+        assert parse_batch_response("Sorry, I cannot help", keys) == {}
+
+    def test_failed_leads_are_retried(self, sample_campaign, sample_leads, use_provider):
+        """Test that one request covers the batch and only missing leads are asked for again."""
+        import json
+        import re
+        from agent_app.models import FollowUpMessage
+
+        def answer(parts, generation_config):
+            assert generation_config == {"response_mime_type": "application/json"}
+            keys = re.findall(r"\[(lead_\d+)\]", parts[0])
+            names = re.findall(r"- Name: (.+)", parts[0])
+            # The first request leaves out its second lead
+            return json.dumps({key: f"Hi {name}" for key, name in zip(keys, names)
+                               if len(prompts) > 1 or key != "lead_2"})
+
+        provider = FakeProvider(answer)
+        use_provider(provider)
+        prompts = provider.calls
+
+        leads = sample_leads[:3]
+        bodies = message_service.generate_messages_batch(leads, sample_campaign, context="Sobha Crest amenities")
+
+        assert bodies == [f"Hi {lead.lead_name}" for lead in leads]
+        assert len(prompts) == 2
+        assert "Sobha Crest amenities" in prompts[0][1]
+        assert all(lead.lead_name in prompts[0][0] for lead in leads)
+        # The retry asks only for the missing lead
+        assert leads[1].lead_name in prompts[1][0] and leads[0].lead_name not in prompts[1][0]
+        assert FollowUpMessage.objects.filter(campaign=sample_campaign).count() == 3
+
+    def test_failed_requests_give_none(self, sample_campaign, sample_leads, use_provider):
+        """Test that leads still missing after the retries get None, for the template fallback."""
+        def answer(parts, generation_config):
+            raise RuntimeError("quota exceeded")
+
+        provider = FakeProvider(answer)
+        use_provider(provider)
+
+        bodies = message_service.generate_messages_batch(sample_leads[:2], sample_campaign, retries=2, save=False)
+        assert bodies == [None, None]
+        assert len(provider.calls) == 3
+
+    def test_engine_batches_leads_sharing_context(self, sample_campaign, sample_leads):
+        """Test that batches never mix project contexts and respect the batch size."""
+        from agent_app.services.campaign_engine import generate_campaign_messages
+
+        batches = []
+
+        def fake_generate_batch(leads, campaign, context=None, save=True):
+            batches.append((context, [lead.project_name for lead in leads]))
+            return [f"Hi {lead.lead_name}" if lead is not sample_leads[0] else None for lead in leads]
+
+        leads = sample_leads * 3
+        contexts = {(lead.project_name, "Sobha Crest"): f"ctx {lead.project_name}" for lead in sample_leads}
+        messages, stats = generate_campaign_messages(sample_campaign, leads, contexts, workers=2, save=False,
+                                                     batch_size=4, generate_batch=fake_generate_batch)
+
+        assert all(len(projects) <= 4 and {f"ctx {p}" for p in projects} == {context}
+                   for context, projects in batches)
+        # 6, 6 and 3 leads per project
+        assert stats["requests"] == len(batches) == 5
+        assert [m["lead"] for m in messages] == leads
+        assert [m["source"] for m in messages].count("template") == 3
+
+
+@pytest.mark.django_db
+class TestLLMResponseCache:
+    """Test the persistent, content-addressed LLM response cache."""
+
+    @pytest.fixture
+    def model_calls(self, use_provider):
+        """LLM provider stand-in answering with a numbered reply, recording its prompts."""
+        def answer(parts, generation_config):
+            return "auto_reply" if "classifies customer responses" in str(parts) else f"Reply {len(provider.calls)}"
+
+        from agent_app.services import llm_cache
+        provider = FakeProvider(answer)
+        use_provider(provider)
+        llm_cache.clear_llm_cache_stats()
+        yield provider.calls
+        llm_cache.clear_llm_cache_stats()
+
+    def call(self, calls, parts, **kwargs):
+        from agent_app.services.llm_cache import cached_generate
+
+        def request():
+            calls.append(parts)
+            return type("Response", (), {"text": f"Reply {len(calls)}", "usage_metadata": "usage"})()
+        return cached_generate("gemini-2.5-flash", parts, request, **kwargs)
+
+    def test_identical_request_is_cached(self, model_calls):
+        """Test that only the same model, prompt and context hit the cache."""
+        from agent_app.services.llm_cache import get_llm_cache_stats
+
+        first = self.call(model_calls, ["prompt", "context A"], scope=7)
+        second = self.call(model_calls, ["prompt", "context A"], scope=7)
+        other = self.call(model_calls, ["prompt", "context B"], scope=7)
+
+        assert (first["text"], first["cached"], first["usage"]) == ("Reply 1", False, "usage")
+        assert (second["text"], second["cached"], second["usage"]) == ("Reply 1", True, None)
+        assert other["text"] == "Reply 2"
+        stats = get_llm_cache_stats(7)
+        assert (stats["hits"], stats["misses"], stats["requests"]) == (1, 2, 3)
+        assert stats["hit_rate"] == pytest.approx(0.333)
+        assert get_llm_cache_stats()["hits"] == 1 and get_llm_cache_stats(8)["requests"] == 0
+
+    def test_bypass_and_validation(self, model_calls):
+        """Test that use_cache=False and invalid responses store nothing."""
+        from agent_app.models import LLMResponseCache
+
+        self.call(model_calls, ["prompt"], use_cache=False)
+        self.call(model_calls, ["prompt"], validate=lambda text: text == "never")
+        assert LLMResponseCache.objects.count() == 0
+        self.call(model_calls, ["prompt"])
+        assert self.call(model_calls, ["prompt"], use_cache=False)["cached"] is False
+        assert len(model_calls) == 4
+
+    def test_ttl_and_size_eviction(self, model_calls, monkeypatch):
+        """Test that expired entries miss and the least recently used entries are evicted."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from agent_app.models import LLMResponseCache
+        from agent_app.services import llm_cache
+
+        self.call(model_calls, ["old"])
+        LLMResponseCache.objects.update(created_at=timezone.now() - timedelta(seconds=llm_cache.LLM_CACHE_TTL_SECONDS + 1))
+        assert self.call(model_calls, ["old"])["cached"] is False
+
+        monkeypatch.setattr(llm_cache, "LLM_CACHE_MAX_ENTRIES", 2)
+        self.call(model_calls, ["a"])
+        LLMResponseCache.objects.update(last_used_at=timezone.now() - timedelta(minutes=5))
+        self.call(model_calls, ["old"])  # hit: now the most recently used
+        self.call(model_calls, ["b"])
+        assert LLMResponseCache.objects.count() == 2
+        assert self.call(model_calls, ["a"])["cached"] is False
+
+    def test_generate_message_and_intent_use_cache(self, model_calls, sample_campaign, sample_lead):
+        """Test that re-drafting a lead and re-classifying a reply do not call Gemini again."""
+        from agent_app.ai_agent.intent_service import detect_intent_gemini
+
+        first = message_service.generate_message(sample_lead, sample_campaign, context="ctx", save=False)
+        again = message_service.generate_message(sample_lead, sample_campaign, context="ctx", save=False)
+        fresh = message_service.generate_message(sample_lead, sample_campaign, context="ctx", save=False,
+                                                 use_cache=False)
+        assert first == again == "Reply 1" and fresh == "Reply 2"
+
+        assert detect_intent_gemini("Any price list?") == detect_intent_gemini("Any price list?") == "auto_reply"
+        assert len(model_calls) == 3
+
+
+@pytest.mark.django_db
+class TestLLMClient:
+    """Test the process-wide LLM client and its providers."""
+
+    def test_client_is_shared_and_provider_selected_by_setting(self, use_provider, monkeypatch):
+        """Test that every call site gets the same client, built from LLM_PROVIDER."""
+        from agent_app.services import llm_client
+
+        llm_client.reset_llm_client()
+        monkeypatch.setattr(llm_client, "LLM_PROVIDER", "stub")
+        client = llm_client.get_llm_client()
+        assert client is llm_client.get_llm_client()
+        assert isinstance(client.provider, llm_client.StubProvider)
+        assert client.cache_name == f"stub/{llm_client.LLM_MODEL}"
+
+        with pytest.raises(ValueError):
+            use_provider("no-such-provider")
+
+    def test_provider_must_implement_generate(self):
+        """Test that a provider without generate cannot be created."""
+        class NoGenerate(LLMProvider):
+            name = "test"
+
+        with pytest.raises(TypeError):
+            LLMProvider()
+        with pytest.raises(TypeError):
+            NoGenerate()
+
+    def test_gemini_provider_reuses_model(self, monkeypatch):
+        """Test that one GenerativeModel per model name serves every request, with the configured timeout."""
+        from agent_app.services.llm_client import GeminiProvider, LLMClient
+
+        created, requests = [], []
+
+        class FakeModel:
+            def __init__(self, name):
+                created.append(name)
+
+            def generate_content(self, parts, **kwargs):
+                requests.append(kwargs)
+                return LLMResponse("ok")
+
+        from types import SimpleNamespace
+        from agent_app.services import llm_client
+        monkeypatch.setattr(llm_client, "genai", SimpleNamespace(GenerativeModel=FakeModel))
+
+        client = LLMClient(GeminiProvider(), model="gemini-test", timeout=12)
+        for _ in range(3):
+            client.generate(["prompt"])
+        client.generate(["prompt"], generation_config={"response_mime_type": "application/json"})
+
+        assert created == ["gemini-test"]
+        assert requests[0] == {"request_options": {"timeout": 12}}
+        assert requests[-1]["generation_config"] == {"response_mime_type": "application/json"}
+
+    def test_stub_provider_is_deterministic(self, sample_campaign, sample_leads, use_provider):
+        """Test that drafts, batches and intents need no network and repeat exactly."""
+        from agent_app.ai_agent.intent_service import detect_intent_gemini
+
+        use_provider("stub")
+        lead = sample_leads[0]
+        first = message_service.generate_message(lead, sample_campaign, context="ctx", save=False, use_cache=False)
+        again = message_service.generate_message(lead, sample_campaign, context="ctx", save=False, use_cache=False)
+        assert first == again and lead.lead_name in first
+
+        bodies = message_service.generate_messages_batch(sample_leads, sample_campaign, context="ctx",
+                                                         save=False, retries=0, use_cache=False)
+        assert all(lead.lead_name in body for lead, body in zip(sample_leads, bodies))
+
+        assert detect_intent_gemini("Can we schedule a viewing?", use_cache=False) == "notify_agent"
+        assert detect_intent_gemini("What is the payment plan?", use_cache=False) == "auto_reply"
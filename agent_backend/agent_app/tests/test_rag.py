@@ -223,3 +223,427 @@ class TestDocumentRAG:
         data = json.loads(response.content)
         assert "query" in data
 
+
+class TestEmbeddingRegistry:
+    """Test the process-wide embedding model registry."""
+
+    def test_model_loaded_once(self, fake_embeddings):
+        """Test that repeated lookups return the same resident model."""
+        import rag_main
+        first = rag_main.get_embedding_model()
+        second = rag_main.get_embedding_model()
+
+        assert first is second
+        assert fake_embeddings.instances == 1
+
+    def test_model_loaded_once_across_threads(self, fake_embeddings):
+        """Test that concurrent first use still loads a single model."""
+        import rag_main
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            models = list(pool.map(lambda _: rag_main.get_embedding_model(), range(32)))
+
+        assert all(m is models[0] for m in models)
+        assert fake_embeddings.instances == 1
+
+    def test_generate_embeddings_uses_registry(self, fake_embeddings):
+        """Test that ingestion reuses the resident model."""
+        import rag_main
+        chunks = [{"file_name": "a.pdf", "chunk_id": 1, "chunk_text": "hello"}]
+
+        rag_main.generate_embeddings(chunks)
+        rag_main.generate_embeddings(chunks)
+
+        assert fake_embeddings.instances == 1
+
+
+class TestOnnxEmbeddings:
+    """Test the ONNX Runtime embedding backend against the torch backend."""
+
+    TEXTS = [
+        "lumina grand payment plan",
+        "sobha crest golf villas with a private pool and a very long description of the amenities",
+        "possession",
+    ]
+
+    @pytest.fixture(scope="class")
+    def tiny_model(self, tmp_path_factory):
+        """A small random sentence-transformers model saved locally (no download)."""
+        pytest.importorskip("onnx")
+        import torch
+        from sentence_transformers import SentenceTransformer, models
+        from transformers import BertConfig, BertModel, BertTokenizerFast
+
+        base = tmp_path_factory.mktemp("tiny_model")
+        words = sorted({w for text in self.TEXTS for w in text.split()})
+        vocab_file = base / "vocab.txt"
+        vocab_file.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words))
+
+        torch.manual_seed(0)
+        BertTokenizerFast(vocab_file=str(vocab_file)).save_pretrained(base / "bert")
+        BertModel(BertConfig(
+            vocab_size=len(words) + 5, hidden_size=32, num_hidden_layers=2,
+            num_attention_heads=2, intermediate_size=64, max_position_embeddings=64
+        )).save_pretrained(base / "bert")
+        SentenceTransformer(modules=[
+            models.Transformer(str(base / "bert"), max_seq_length=16),
+            models.Pooling(32, "mean"),
+            models.Normalize(),
+        ]).save(str(base / "sentence"))
+        return str(base / "sentence")
+
+    def test_vectors_match_torch_within_tolerance(self, tiny_model, tmp_path):
+        import rag_main
+        from onnx_embeddings import MIN_COSINE, OnnxEmbeddings, export_onnx_model, min_cosine_similarity
+
+        torch_vectors = rag_main.HuggingFaceEmbeddings(model_name=tiny_model).embed_documents(self.TEXTS)
+        export_onnx_model(tiny_model, str(tmp_path), quantize=True)
+        onnx_model = OnnxEmbeddings(str(tmp_path), batch_size=2)
+
+        assert min_cosine_similarity(torch_vectors, onnx_model.embed_documents(self.TEXTS)) >= MIN_COSINE["fp32"]
+        assert min_cosine_similarity([torch_vectors[0]], [onnx_model.embed_query(self.TEXTS[0])]) >= MIN_COSINE["fp32"]
+
+        quantized = OnnxEmbeddings(str(tmp_path), quantized=True).embed_documents(self.TEXTS)
+        assert [len(v) for v in quantized] == [32, 32, 32]
+
+    def test_registry_exports_once(self, tiny_model, tmp_path, monkeypatch):
+        import rag_main
+        from onnx_embeddings import OnnxEmbeddings
+
+        monkeypatch.setattr(rag_main, "ONNX_MODEL_DIR", str(tmp_path))
+        rag_main.clear_embedding_models()
+        try:
+            model = rag_main.get_embedding_model(tiny_model, backend="onnx")
+            assert isinstance(model, OnnxEmbeddings)
+            assert rag_main.get_embedding_model(tiny_model, backend="onnx") is model
+            assert len(model.embed_query("possession")) == 32
+        finally:
+            rag_main.clear_embedding_models()
+
+    def test_unknown_backend_rejected(self):
+        import rag_main
+        with pytest.raises(ValueError):
+            rag_main.get_embedding_model("any-model", backend="tensorrt")
+
+
+class TestQueryCache:
+    """Test the versioned LRU/TTL retrieval cache."""
+
+    CHUNKS = [
+        {"file_name": "lumina.pdf", "chunk_id": 1, "chunk_text": "Lumina Grand payment plan 60/40"},
+        {"file_name": "sobha.pdf", "chunk_id": 1, "chunk_text": "Sobha Waves sea facing apartments"},
+    ]
+
+    def test_repeated_query_hits_cache(self, chroma_dir):
+        """Test that the same normalized query is only searched once."""
+        import rag_main
+        first = rag_main.query_brochures("Compare Lumina Grand and Sobha Waves", top_k=2)
+        second = rag_main.query_brochures("  compare lumina grand   AND sobha waves ", top_k=2)
+
+        stats = rag_main.get_query_cache_stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 1
+        assert [d.page_content for d in second] == [d.page_content for d in first]
+
+    def test_top_k_is_part_of_key(self, chroma_dir):
+        """Test that different top_k values are cached separately."""
+        import rag_main
+        rag_main.query_brochures("payment plan", top_k=1)
+        rag_main.query_brochures("payment plan", top_k=2)
+
+        assert rag_main.get_query_cache_stats()["misses"] == 2
+
+    def test_ingestion_invalidates_cache(self, chroma_dir):
+        """Test that storing new chunks bumps the version and drops cached results."""
+        import rag_main
+        rag_main.query_brochures("golf villas", top_k=3)
+        rag_main.store_in_chromadb(
+            [{"file_name": "golf.pdf", "chunk_id": 1, "chunk_text": "Golf villas with private pool"}],
+            persist_directory=chroma_dir
+        )
+
+        results = rag_main.query_brochures("golf villas", top_k=3)
+
+        stats = rag_main.get_query_cache_stats()
+        assert stats["hits"] == 0
+        assert stats["invalidations"] == 1
+        assert any(d.metadata["file_name"] == "golf.pdf" for d in results)
+
+    def test_lru_and_ttl_bounds(self):
+        """Test LRU eviction and TTL expiry of the cache itself."""
+        import rag_main
+        cache = rag_main.QueryCache(max_size=2, ttl=60)
+        cache.put(("db", "a", 3), "v1", ["A"])
+        cache.put(("db", "b", 3), "v1", ["B"])
+        cache.get(("db", "a", 3), "v1")
+        cache.put(("db", "c", 3), "v1", ["C"])
+
+        assert cache.get(("db", "b", 3), "v1") is None
+        assert cache.get(("db", "a", 3), "v1") == ["A"]
+        assert cache.stats()["evictions"] == 1
+
+        cache.ttl = 0
+        assert cache.get(("db", "a", 3), "v1") is None
+
+
+class TestVectorstorePool:
+    """Test the pooled per-process Chroma handle."""
+
+    CHUNKS = [{"file_name": "lumina.pdf", "chunk_id": 1, "chunk_text": "Lumina Grand payment plan 60/40"}]
+
+    def test_handle_reused_across_queries(self, chroma_dir, monkeypatch):
+        import rag_main
+        opened = []
+        original_open = rag_main._open_vectorstore
+        monkeypatch.setattr(rag_main, "_open_vectorstore", lambda d: opened.append(d) or original_open(d))
+
+        for _ in range(3):
+            rag_main.query_brochures("payment plan", use_cache=False)
+        assert rag_main.get_vectorstore(chroma_dir) is rag_main.get_vectorstore(chroma_dir)
+        assert len(opened) <= 1
+
+    def test_handle_shared_across_threads(self, chroma_dir):
+        import rag_main
+        from concurrent.futures import ThreadPoolExecutor
+
+        rag_main.refresh_vectorstore(chroma_dir)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            handles = list(pool.map(lambda _: rag_main.get_vectorstore(chroma_dir), range(8)))
+        assert len({id(h) for h in handles}) == 1
+
+    def test_ingestion_refreshes_handle(self, chroma_dir):
+        import rag_main
+        before = rag_main.get_vectorstore(chroma_dir)
+        rag_main.store_in_chromadb(
+            [{"file_name": "sobha.pdf", "chunk_id": 1, "chunk_text": "Sobha Waves sea facing apartments"}],
+            persist_directory=chroma_dir
+        )
+        after = rag_main.get_vectorstore(chroma_dir)
+        assert after is not before
+        results = rag_main.query_brochures("Sobha Waves", top_k=2, use_cache=False)
+        assert any(r.metadata["file_name"] == "sobha.pdf" for r in results)
+
+    def test_unhealthy_handle_is_reopened(self, chroma_dir, monkeypatch):
+        import rag_main
+        before = rag_main.get_vectorstore(chroma_dir)
+        monkeypatch.setattr(rag_main, "VECTORSTORE_HEALTH_INTERVAL", 0)
+
+        def broken_count():
+            raise RuntimeError("connection lost")
+        monkeypatch.setattr(before._collection, "count", broken_count)
+        assert rag_main.get_vectorstore(chroma_dir) is not before
+
+
+class TestHybridSearch:
+    """Test the BM25 lexical index and the hybrid retrieval mode."""
+
+    CHUNKS = [
+        {"file_name": "lumina.pdf", "chunk_id": 1, "chunk_text": "Lumina Grand payment plan 60/40 on handover"},
+        {"file_name": "sobha.pdf", "chunk_id": 1, "chunk_text": "Sobha Waves 2 bed sea facing apartments"},
+        {"file_name": "sobha.pdf", "chunk_id": 2, "chunk_text": "Sobha Crest clubhouse and amenities"},
+    ]
+
+    def test_bm25_ranks_exact_terms(self):
+        from lexical_index import BM25Index
+        index = BM25Index()
+        index.add_chunks(self.CHUNKS)
+        assert index.search("payment plan 60/40", top_k=1)[0][0] == "lumina.pdf_chunk1"
+        assert index.search("Sobha Waves 2 bed", top_k=1)[0][0] == "sobha.pdf_chunk1"
+        index.remove_file("sobha.pdf")
+        assert len(index) == 1
+        assert index.search("Sobha", top_k=3) == []
+
+    def test_lexical_index_persisted_and_incremental(self, chroma_dir):
+        import rag_main
+        from lexical_index import BM25Index
+        assert len(BM25Index.load(chroma_dir)) == 3
+
+        rag_main.delete_file_chunks("sobha.pdf", chroma_dir)
+        assert set(BM25Index.load(chroma_dir).docs) == {"lumina.pdf_chunk1"}
+        assert rag_main.query_brochures("Sobha Waves", mode="lexical", use_cache=False) == []
+
+    def test_lexical_index_rebuilt_from_collection(self, chroma_dir):
+        import rag_main
+        from lexical_index import LEXICAL_INDEX_FILE_NAME
+        os.remove(os.path.join(chroma_dir, LEXICAL_INDEX_FILE_NAME))
+        rag_main.bump_collection_version(chroma_dir)
+
+        results = rag_main.query_brochures("60/40", top_k=1, mode="lexical", use_cache=False)
+        assert results[0].metadata["file_name"] == "lumina.pdf"
+        assert os.path.exists(os.path.join(chroma_dir, LEXICAL_INDEX_FILE_NAME))
+
+    def test_hybrid_mode_fuses_rankings(self, chroma_dir):
+        import rag_main
+        results = rag_main.query("Sobha Waves 2 bed", mode="hybrid")
+        assert len(results) == 3
+        assert results[0].metadata["file_name"] == "sobha.pdf"
+        assert results[0].metadata["chunk_id"] == 1
+
+    def test_unknown_mode_rejected(self, chroma_dir):
+        import rag_main
+        with pytest.raises(ValueError):
+            rag_main.query_brochures("Sobha", mode="fuzzy")
+
+
+class TestProjectFilter:
+    """Test project metadata and project-scoped search."""
+
+    CHUNKS = [
+        {"file_name": "Lumina Grand brochure.pdf", "chunk_id": 1, "chunk_text": "Lumina Grand payment plan 60/40"},
+        {"file_name": "Sobha Waves.pdf", "chunk_id": 1, "chunk_text": "Sobha Waves payment plan 80/20"},
+        {"file_name": "Sobha Crest.pdf", "chunk_id": 1, "chunk_text": "Sobha Crest payment plan 70/30"},
+    ]
+
+    def test_project_key_normalization(self):
+        from rag_main import project_key
+        assert project_key("DLF West Park details.pdf") == "dlf-west-park"
+        assert project_key("DLF  West-Park") == "dlf-west-park"
+        assert project_key("Lumina Grand brochure.PDF") == "lumina-grand"
+        assert project_key(None) == ""
+
+    @pytest.mark.parametrize("mode", ["vector", "lexical", "hybrid"])
+    def test_search_restricted_to_projects(self, chroma_dir, mode):
+        import rag_main
+        results = rag_main.query_brochures("payment plan", top_k=3, mode=mode, projects=["Sobha Waves", "Sobha Crest"])
+        assert {r.metadata["project"] for r in results} == {"sobha-waves", "sobha-crest"}
+
+        results = rag_main.query_brochures("payment plan", top_k=3, mode=mode, projects=["lumina grand"])
+        assert [r.metadata["file_name"] for r in results] == ["Lumina Grand brochure.pdf"]
+
+    def test_projects_are_part_of_cache_key(self, chroma_dir):
+        import rag_main
+        rag_main.clear_query_cache()
+        everything = rag_main.query_brochures("payment plan", top_k=3)
+        scoped = rag_main.query_brochures("payment plan", top_k=3, projects=["Sobha Waves"])
+        assert len(everything) == 3
+        assert len(scoped) == 1
+        rag_main.clear_query_cache()
+
+    def test_backfill_project_metadata(self, chroma_dir):
+        import rag_main
+        collection = rag_main.get_vectorstore(chroma_dir)._collection
+        collection.update(
+            ids=["Sobha Waves.pdf_chunk1"],
+            metadatas=[{"file_name": "Sobha Waves.pdf", "chunk_id": 1}]
+        )
+        rag_main.save_manifest({"files": {"Sobha Waves.pdf": {"source": "/elsewhere"}}}, chroma_dir)
+
+        rag_main.ingest_pdfs([], persist_directory=chroma_dir)
+
+        stored = collection.get(ids=["Sobha Waves.pdf_chunk1"], include=["metadatas"])
+        assert stored["metadatas"][0]["project"] == "sobha-waves"
+        assert rag_main.load_manifest(chroma_dir)["metadata_version"] == rag_main.PROJECT_METADATA_VERSION
+
+
+class TestNumpyVectorBackend:
+    """Test the memory-mapped NumPy vector snapshot backend."""
+
+    CHUNKS = TestProjectFilter.CHUNKS
+
+    def test_snapshot_is_memory_mapped(self, chroma_dir):
+        import numpy as np
+        import rag_main
+        from vector_index import VectorIndex
+
+        assert rag_main.export_vector_index(chroma_dir) == 3
+        index = VectorIndex.load(chroma_dir)
+        assert isinstance(index.matrix, np.memmap)
+        assert index.matrix.dtype == np.float32
+        assert index.version == rag_main.get_collection_version(chroma_dir)
+
+    @pytest.mark.parametrize("projects", [None, ["Sobha Waves", "Sobha Crest"]])
+    def test_matches_chroma_results(self, chroma_dir, projects):
+        import rag_main
+        chroma = rag_main.query_brochures("Sobha payment plan", top_k=2, use_cache=False, projects=projects, backend="chroma")
+        numpy = rag_main.query_brochures("Sobha payment plan", top_k=2, use_cache=False, projects=projects, backend="numpy")
+        assert [r.metadata["file_name"] for r in numpy] == [r.metadata["file_name"] for r in chroma]
+        assert numpy[0].page_content == chroma[0].page_content
+
+    def test_stale_snapshot_is_reexported(self, chroma_dir):
+        import rag_main
+        rag_main.query_brochures("golf", use_cache=False, backend="numpy")
+        rag_main.store_in_chromadb(
+            [{"file_name": "Golf Villas.pdf", "chunk_id": 1, "chunk_text": "golf villas golf course"}],
+            persist_directory=chroma_dir
+        )
+
+        results = rag_main.query_brochures("golf", top_k=1, use_cache=False, backend="numpy")
+        assert results[0].metadata["file_name"] == "Golf Villas.pdf"
+        assert len(rag_main.get_vector_index(chroma_dir)) == 4
+
+    def test_unknown_backend_rejected(self, chroma_dir):
+        import rag_main
+        with pytest.raises(ValueError):
+            rag_main.query_brochures("Sobha", backend="faiss")
+
+
+class TestBatchSearch:
+    """Test batched searches with a single query-embedding call."""
+
+    CHUNKS = TestProjectFilter.CHUNKS
+    QUERIES = [
+        {"query": "Sobha payment plan", "top_k": 2},
+        {"query": "Lumina Grand", "top_k": 1},
+        {"query": "payment plan 70/30", "projects": ["Sobha Crest", "Lumina Grand"]},
+    ]
+
+    @pytest.fixture
+    def chroma_dir(self, chroma_dir):
+        import rag_main
+        rag_main.export_vector_index(chroma_dir)
+        return chroma_dir
+
+    @pytest.mark.parametrize("mode,backend", [
+        ("vector", "chroma"), ("vector", "numpy"), ("hybrid", "chroma"), ("lexical", "chroma"),
+    ])
+    def test_matches_sequential_queries(self, chroma_dir, mode, backend):
+        import rag_main
+        batch = rag_main.query_brochures_batch(self.QUERIES, use_cache=False, mode=mode, backend=backend)
+        for item, found in zip(self.QUERIES, batch):
+            single = rag_main.query_brochures(
+                item["query"], top_k=item.get("top_k", 3), use_cache=False, mode=mode, backend=backend,
+                projects=item.get("projects")
+            )
+            assert [(r.metadata["file_name"], r.page_content) for r in found] == \
+                [(r.metadata["file_name"], r.page_content) for r in single]
+
+    def test_queries_embedded_in_one_call(self, chroma_dir, monkeypatch):
+        import rag_main
+        model = rag_main.get_embedding_model()
+        calls = []
+        embed_documents = model.embed_documents
+        monkeypatch.setattr(model, "embed_documents", lambda texts: calls.append(list(texts)) or embed_documents(texts))
+        monkeypatch.setattr(model, "embed_query", lambda text: pytest.fail("queries must be embedded in a batch"))
+
+        rag_main.query_brochures_batch(self.QUERIES + [self.QUERIES[0]], use_cache=False)
+        # One call, and the repeated query is embedded once
+        assert calls == [[item["query"] for item in self.QUERIES]]
+
+    def test_batch_fills_cache(self, chroma_dir, fake_embeddings):
+        import rag_main
+        rag_main.clear_query_cache()
+        first = rag_main.query_brochures_batch(self.QUERIES)
+        embedded = fake_embeddings.texts_embedded
+        again = rag_main.query_brochures_batch(self.QUERIES)
+        assert fake_embeddings.texts_embedded == embedded
+        assert again == first
+        assert rag_main.query_brochures("Lumina Grand", top_k=1) == first[1]
+        rag_main.clear_query_cache()
+
+    def test_search_many_matches_search(self):
+        import numpy as np
+        from vector_index import VectorIndex
+
+        rng = np.random.default_rng(3)
+        matrix = rng.normal(size=(20, 8)).astype(np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        index = VectorIndex(matrix, "v1", [f"id{i}" for i in range(20)], [f"text {i}" for i in range(20)],
+                            [{"project": "a" if i % 2 else "b"} for i in range(20)])
+        queries = rng.normal(size=(4, 8)).astype(np.float32)
+        for projects in [(), ("a",)]:
+            many = index.search_many(queries, top_k=3, project_keys=projects)
+            single = [index.search(q, top_k=3, project_keys=projects) for q in queries]
+            assert [[row for row, _ in hits] for hits in many] == [[row for row, _ in hits] for hits in single]
+            assert [score for hits in many for _, score in hits] == \
+                pytest.approx([score for hits in single for _, score in hits])
@@ -0,0 +1,63 @@
+"""
+Startup Import Tests
+Tests that booting Django does not import the heavy RAG, LLM and text-to-SQL
+integrations, and that they load on first use.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HEAVY_MODULES = ["rag_main", "langchain_community", "chromadb", "torch", "google.generativeai", "vanna"]
+
+
+class TestLazyIntegrations:
+    """Test the lazy integrations facade."""
+
+    def test_boot_does_not_import_integrations(self):
+        """Test that django.setup plus the URL conf leaves the integrations unloaded."""
+        code = (
+            "import json, os, sys\n"
+            "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'agent_backend.settings')\n"
+            "import django\n"
+            "django.setup()\n"
+            "import agent_backend.urls, agent_app.t2sql\n"
+            f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+        )
+        result = subprocess.run([sys.executable, "-c", code], cwd=BASE_DIR, capture_output=True, text=True, timeout=120)
+
+        assert result.returncode == 0, result.stderr
+        assert json.loads(result.stdout.strip().splitlines()[-1]) == []
+
+    def test_module_loaded_and_set_up_on_first_use(self):
+        """Test that LazyModule imports once, runs its setup once and forwards attributes."""
+        from agent_app.integrations import LazyModule
+
+        setups = []
+        lazy = LazyModule("json", setup=setups.append)
+        assert not lazy.loaded
+
+        assert lazy.dumps([1]) == "[1]"
+        assert lazy.loads("2") == 2
+        assert lazy.loaded
+        assert len(setups) == 1
+
+    def test_gemini_requires_api_key(self, monkeypatch):
+        """Test that Gemini setup fails with a clear error when GEMINI_API_KEY is missing."""
+        from types import SimpleNamespace
+        from agent_app import integrations
+
+        configured = []
+        module = SimpleNamespace(configure=lambda api_key: configured.append(api_key))
+        monkeypatch.setattr(integrations, "GEMINI_API_KEY", "")
+        with pytest.raises(RuntimeError, match="GEMINI_API_KEY"):
+            integrations._configure_genai(module)
+        assert configured == []
+
+        monkeypatch.setattr(integrations, "GEMINI_API_KEY", "test-key")
+        integrations._configure_genai(module)
+        assert configured == ["test-key"]
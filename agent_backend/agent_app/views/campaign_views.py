@@ -1,11 +1,12 @@
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from agent_app.models import Lead, Campaign, CampaignLead, MessageLog  # Make sure models are imported
-from agent_app.services.personalization import render_personalized_message
+from agent_app.services.campaign_sends import send_progress, start_campaign_send
 from django.utils import timezone
 from django.conf import settings
 from django.core.mail import send_mail
 from agent_app.import_leads import filter_leads
-from agent_app.message_service import generate_message, send_campaign_message, send_followup_email
+from agent_app.message_service import send_followup_email
 
 def shortlist_leads_view(request):
     print(f"[REQUEST] {request.method} /campaigns/shortlist_leads/")
@@ -210,84 +211,12 @@ def create_campaign_view(request):
 
 
 def send_campaign_view(request, campaign_id: int):
-    print(f"[REQUEST] POST /campaigns/{campaign_id}/send/ → Sending campaign messages")
+    print(f"[REQUEST] POST /campaigns/{campaign_id}/send/ → Queueing campaign send")
     campaign = Campaign.objects.get(id=campaign_id)
-    # Fetch pending campaign leads
-    cl_qs = CampaignLead.objects.filter(campaign=campaign, send_status__in=["pending", "failed"])
-    sent_count = 0
-
-    for cl in cl_qs:
-        # Use AI+RAG generator for hyper-personalization
-        try:
-            print(f"[DEBUG] Attempting to generate AI message for {cl.lead.lead_name}...")
-            body = generate_message(cl.lead, campaign)
-            print(f"[DEBUG] AI message generation result: {body[:100] if body else 'None'}...")
-        except Exception as e:
-            print(f"[ERROR] Failed to generate AI message for {cl.lead.lead_name}: {e}")
-            import traceback
-            traceback.print_exc()
-            body = None
-
-        # Fallback to lightweight template if AI fails
-        if not body:
-            print(f"[FALLBACK] Using template for {cl.lead.lead_name} (AI message was None/empty)")
-            subj_fallback, body_fallback = render_personalized_message(
-                lead=cl.lead,
-                target_project=campaign.project_name,
-                offer_text=campaign.sales_offer or "",
-            )
-            body = body_fallback
-            subject = subj_fallback
-        else:
-            subject = f"{cl.lead.lead_name}, an update on {campaign.project_name}"
-
-        cl.personalized_subject = subject
-        cl.personalized_body = body or ""
-        # Send (Email only for now)
-        try:
-            if campaign.message_channel == "Email" and cl.lead.email:
-                # Use send_campaign_message for initial campaign messages
-                sent_ok = send_campaign_message(cl.lead, body or "", subject)
-                if sent_ok is False:
-                    raise Exception("Email service returned False")
-                cl.send_status = "sent"
-                cl.sent_at = timezone.now()
-                sent_count += 1
-                # update lead status to reflect outbound follow-up
-                try:
-                    cl.lead.lead_status = "Follow-up sent"
-                    cl.lead.save()
-                except Exception:
-                    pass
-                print(f"[SENT] Email to {cl.lead.lead_name} ({cl.lead.email})")
-                MessageLog.objects.create(
-                    campaign=campaign,
-                    lead=cl.lead,
-                    direction="outbound",
-                    subject=subject,
-                    body=body,
-                )
-            else:
-                cl.send_status = "failed"
-        except Exception as e:
-            print(f"[ERROR] Failed sending to {cl.lead.email}: {e}")
-            cl.send_status = "failed"
-        cl.save()
-
-    return render(
-        request,
-        "campaign/create_campaign.html",
-        {
-            "projects": [
-                "Altura", "Beachgate by Address", "Damac Bay by Cavalli", "DLF West Park",
-                "Godrej Vistas", "Lumina Grand", "Sobha Crest", "Sobha Waves"
-            ],
-            "shortlisted_count": CampaignLead.objects.filter(campaign=campaign).count(),
-            "success_message": f"Messages sent: {sent_count}",
-            "active_page": "create_campaign",
-        },
-    )
-    print(f"[COMPLETE] Campaign send finished: {sent_count} messages sent")
+    # Messages are generated, emailed and logged in the background;
+    # the dashboard polls /api/campaigns/<id>/send_progress
+    start_campaign_send(campaign)
+    return redirect(f"{reverse('campaign_dashboard')}?campaign_id={campaign.id}")
 
 
 from django.views.decorators.csrf import csrf_exempt
@@ -380,6 +309,7 @@ def campaign_dashboard_view(request):
             "followups": followups,
             "followup_threads": followup_threads if selected_campaign else [],
             "goals_list": goals_list,
+            "send_progress": send_progress(selected_campaign) if selected_campaign else None,
             "active_page": "dashboard",
         },
     )
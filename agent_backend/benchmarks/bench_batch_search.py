@@ -0,0 +1,88 @@
+"""
+/api/search/batch benchmark.
+
+Times N sequential /api/search requests against one /api/search/batch
+request carrying the same N queries, for a few batch sizes. The query cache
+is disabled so every query reaches the vector store, and queries are made
+unique so the batch embeds and searches all of them.
+
+Usage (from agent_backend directory):
+    python benchmarks/bench_batch_search.py --sizes 1 8 32 --repeats 5 --mode vector
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+sys.path.append(os.path.abspath(os.path.join(BASE_DIR, "../ragImplementation")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "agent_backend.settings")
+
+import django
+
+django.setup()
+
+from django.test import Client
+from django.test.utils import setup_test_environment
+
+import rag_main
+
+QUERIES = [
+    "Tell me about payment plans for Lumina Grand",
+    "What amenities does DLF West Park offer?",
+    "Compare Sobha Waves and Sobha Crest",
+    "2 bed units with sea view",
+]
+
+
+def batch_queries(size, repeat):
+    return [f"{QUERIES[i % len(QUERIES)]} ({repeat}.{i})" for i in range(size)]
+
+
+def sequential(client, queries, mode):
+    start = time.perf_counter()
+    for q in queries:
+        response = client.get("/api/search", {"q": q, "mode": mode})
+        if response.status_code != 200:
+            print(f"[WARNING] /api/search returned {response.status_code}")
+    return (time.perf_counter() - start) * 1000
+
+
+def batched(client, queries, mode):
+    payload = {"queries": [{"q": q} for q in queries], "mode": mode}
+    start = time.perf_counter()
+    response = client.post("/api/search/batch", data=json.dumps(payload), content_type="application/json")
+    elapsed = (time.perf_counter() - start) * 1000
+    if response.status_code != 200:
+        print(f"[WARNING] /api/search/batch returned {response.status_code}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 8, 32], help="queries per batch")
+    parser.add_argument("--repeats", type=int, default=5, help="timed rounds per batch size")
+    parser.add_argument("--mode", choices=rag_main.SEARCH_MODES, default="vector")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    # Measure retrieval itself, not cache hits
+    rag_main._query_cache.max_size = 0
+    rag_main.warm_up_embedding_model()
+    client = Client()
+    # One untimed round opens the Chroma handle
+    batched(client, batch_queries(2, "warmup"), args.mode)
+
+    print(f"{'queries':>8}{'sequential (ms)':>18}{'batch (ms)':>14}{'speedup':>10}   mode={args.mode}")
+    for size in args.sizes:
+        sequential_ms = [sequential(client, batch_queries(size, f"s{r}"), args.mode) for r in range(args.repeats)]
+        batch_ms = [batched(client, batch_queries(size, f"b{r}"), args.mode) for r in range(args.repeats)]
+        seq, batch = statistics.median(sequential_ms), statistics.median(batch_ms)
+        print(f"{size:>8}{seq:>18.1f}{batch:>14.1f}{seq / batch if batch else 0:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Campaign message generation throughput benchmark.
+
+Runs generate_campaign_messages over a synthetic campaign against a local
+stand-in LLM provider (installed with configure_llm_client) whose response
+times follow a log-normal distribution around --latency-ms, plus --per-lead-ms of output time for every lead a
+request asks for. A fraction --failure-rate of calls raise, and batched
+responses leave out a fraction --drop-rate of their leads, exercising the
+batch retries and the template fallback.
+
+For each pool width and batch size it reports the model calls made
+(retries included), wall time, leads/min and per-lead p50/p95/p99 latency.
+Width 1 with batch size 1 is the old serial send loop. Nothing is written to
+the database and no RAG lookups are made.
+
+Usage (from agent_backend directory):
+    python benchmarks/bench_campaign_generation.py --leads 200 --workers 1 8 --batch-sizes 1 5 10 --latency-ms 1500
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "agent_backend.settings")
+
+import django
+
+django.setup()
+
+from agent_app import message_service
+from agent_app.models import Campaign, Lead
+from agent_app.services.campaign_engine import generate_campaign_messages
+from agent_app.services.llm_client import LLMProvider, LLMResponse, configure_llm_client
+
+PROJECTS = ["Lumina Grand", "Sobha Crest", "DLF West Park", "Sobha Waves"]
+
+
+MESSAGE = "Hi, here is an update on a project that matches your preferences."
+LEAD_KEY_RE = re.compile(r"^\s*\[(lead_\d+)\]", re.MULTILINE)
+
+
+class StandInProvider(LLMProvider):
+    """An LLM provider that sleeps for a sampled response time; counts its calls."""
+
+    name = "stand-in"
+
+    def __init__(self, latency_ms, per_lead_ms, sigma, failure_rate, drop_rate, seed):
+        self.latency_ms = latency_ms
+        self.per_lead_ms = per_lead_ms
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def generate(self, model, parts, generation_config=None, timeout=None):
+        prompt = parts[0] if isinstance(parts, list) else parts
+        keys = LEAD_KEY_RE.findall(prompt)
+        with self.lock:
+            self.calls.append(len(keys) or 1)
+            delay = (self.rng.lognormvariate(0, self.sigma) * self.latency_ms
+                     + self.per_lead_ms * max(len(keys), 1)) / 1000
+            fail = self.rng.random() < self.failure_rate
+            kept = [key for key in keys if self.rng.random() >= self.drop_rate]
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError("stand-in model error")
+        if not keys:
+            return LLMResponse(MESSAGE)
+        return LLMResponse(json.dumps({key: MESSAGE for key in kept}))
+
+
+def synthetic_leads(count):
+    return [
+        Lead(lead_id=f"L{i}", lead_name=f"Lead {i}", email=f"lead{i}@example.com",
+             project_name=PROJECTS[i % len(PROJECTS)], unit_type="2 bed",
+             min_budget=500000.0, max_budget=800000.0, last_conversation_summary="Asked about payment plans.")
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leads", type=int, default=100, help="leads in the campaign")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16], help="pool widths to compare")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 5, 10], help="leads per model request")
+    parser.add_argument("--latency-ms", type=float, default=500, help="median stand-in response time")
+    parser.add_argument("--per-lead-ms", type=float, default=100, help="extra response time per lead asked for")
+    parser.add_argument("--sigma", type=float, default=0.5, help="log-normal spread of response times")
+    parser.add_argument("--failure-rate", type=float, default=0.02, help="fraction of calls that raise")
+    parser.add_argument("--drop-rate", type=float, default=0.02, help="fraction of leads left out of a batched response")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    campaign = Campaign(project_name="Sobha Crest", message_channel="Email", sales_offer="10% off for early buyers")
+    leads = synthetic_leads(args.leads)
+    contexts = {(project, campaign.project_name): f"{project} brochure highlights" for project in PROJECTS}
+
+    # Load the prompt token counter outside the timed runs
+    message_service.count_tokens("warm up")
+
+    results = []
+    for workers in args.workers:
+        for batch_size in args.batch_sizes:
+            provider = StandInProvider(
+                args.latency_ms, args.per_lead_ms, args.sigma, args.failure_rate, args.drop_rate, args.seed
+            )
+            configure_llm_client(provider)
+            # Measure model calls, not LLM response cache hits
+            _, stats = generate_campaign_messages(
+                campaign, leads, contexts, workers=workers, save=False, batch_size=batch_size, use_cache=False
+            )
+            results.append(dict(stats, calls=len(provider.calls)))
+
+    print(f"{'workers':>8}{'batch':>7}{'calls':>7}{'seconds':>10}{'leads/min':>12}{'p50 (ms)':>10}{'p95 (ms)':>10}"
+          f"{'p99 (ms)':>10}{'fallback':>10}   leads={args.leads} latency={args.latency_ms:.0f}ms")
+    for stats in results:
+        print(f"{stats['workers']:>8}{stats['batch_size']:>7}{stats['calls']:>7}{stats['seconds']:>10.1f}"
+              f"{stats['leads_per_minute']:>12.1f}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+              f"{stats['p99_ms']:>10.1f}{stats['fallback']:>10}")
+
+
+if __name__ == "__main__":
+    main()
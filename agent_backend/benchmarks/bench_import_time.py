@@ -0,0 +1,120 @@
+"""
+Startup import-time benchmark.
+
+Boots Django and imports the URL conf (everything a worker, `manage.py
+migrate` or pytest collection loads) in a fresh interpreter under
+`python -X importtime`, then reports wall time, peak RSS, the packages with
+the largest import cost and any heavy integration (RAG, Gemini, Vanna,
+torch, ...) that got imported eagerly. The heavy integrations are meant to be
+loaded on first use through agent_app.integrations.
+
+Usage (from agent_backend directory):
+    python benchmarks/bench_import_time.py --repeat 3 --top 15
+    python benchmarks/bench_import_time.py --max-seconds 2.0 --json import_time.json
+
+Exits with status 1 if a heavy module is imported at startup or the median
+wall time exceeds --max-seconds.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must not be imported while booting (see agent_app/integrations.py)
+HEAVY_MODULES = [
+    "rag_main",
+    "langchain_community",
+    "chromadb",
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "onnxruntime",
+    "google.generativeai",
+    "vanna",
+]
+
+STARTUP_CODE = """
+import json, os, resource, sys, time
+start = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "agent_backend.settings")
+import django
+django.setup()
+import agent_backend.urls
+print(json.dumps({
+    "seconds": time.perf_counter() - start,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def parse_importtime(stderr):
+    """Self import time in microseconds per top-level package."""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:  <self us> | <cumulative us> | <indented module name>"
+        parts = [part.strip() for part in line.split(":", 1)[1].split("|")]
+        if len(parts) != 3 or not parts[0].isdigit():
+            continue
+        package = parts[2].split(".")[0]
+        totals[package] = totals.get(package, 0) + int(parts[0])
+    return totals
+
+
+def run_once():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_CODE],
+        cwd=BASE_DIR, capture_output=True, text=True, env=dict(os.environ, HF_HUB_OFFLINE="1")
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup failed:\n{result.stderr[-2000:]}")
+    summary = json.loads(result.stdout.strip().splitlines()[-1])
+    summary["packages_us"] = parse_importtime(result.stderr)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters to start")
+    parser.add_argument("--top", type=int, default=15, help="packages to list")
+    parser.add_argument("--max-seconds", type=float, default=None, help="fail above this median wall time")
+    parser.add_argument("--json", default=None, help="also write the report to this file")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.repeat)]
+    seconds = statistics.median(run["seconds"] for run in runs)
+    max_rss_mb = statistics.median(run["max_rss_mb"] for run in runs)
+    packages = {}
+    for run in runs:
+        for package, us in run["packages_us"].items():
+            packages.setdefault(package, []).append(us)
+    packages = {package: statistics.median(values) / 1000 for package, values in packages.items()}
+    heavy = sorted({name for run in runs for name in run["heavy"]})
+
+    print(f"Startup (django.setup + URL conf), median of {args.repeat}: {seconds:.2f}s, peak RSS {max_rss_mb:.0f} MB")
+    print(f"{'package':<32}{'import ms':>12}")
+    for package, ms in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<32}{ms:>12.1f}")
+    print(f"Heavy modules imported at startup: {', '.join(heavy) if heavy else 'none'}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "seconds": seconds,
+                "max_rss_mb": max_rss_mb,
+                "heavy_modules": heavy,
+                "packages_ms": dict(sorted(packages.items(), key=lambda item: -item[1])),
+            }, f, indent=2)
+
+    failed = bool(heavy) or (args.max_seconds is not None and seconds > args.max_seconds)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+/api/search latency benchmark.
+
+Compares p50/p99 latency of the RAG search endpoint with a cold embedding
+model on every request (the old behaviour, where each query built its own
+HuggingFaceEmbeddings), with a fresh Chroma connection on every request, and
+with the resident model registry plus the pooled Chroma handle. The query
+cache is disabled so every request reaches the vector store.
+
+Usage (from agent_backend directory):
+    python benchmarks/bench_search_latency.py --requests 50 --concurrency 4
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+sys.path.append(os.path.abspath(os.path.join(BASE_DIR, "../ragImplementation")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "agent_backend.settings")
+
+import django
+
+django.setup()
+
+from django.test import Client
+from django.test.utils import setup_test_environment
+
+import rag_main
+from latency_stats import percentile
+
+QUERIES = [
+    "Tell me about payment plans for Lumina Grand",
+    "What amenities does DLF West Park offer?",
+    "Compare Sobha Waves and Sobha Crest",
+    "2 bed units with sea view",
+]
+
+
+def run(requests, concurrency, mode):
+    def one(i):
+        if mode == "cold":
+            # Simulate the old per-request model construction
+            rag_main.clear_embedding_models()
+        if mode in ("cold", "reconnect"):
+            # Simulate the old per-request Chroma connection
+            rag_main.refresh_vectorstore()
+        start = time.perf_counter()
+        response = Client().get("/api/search", {"q": QUERIES[i % len(QUERIES)]})
+        elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            print(f"[WARNING] /api/search returned {response.status_code}")
+        return elapsed
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(requests)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20, help="requests per mode")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent request threads")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    # Measure retrieval itself, not cache hits
+    rag_main._query_cache.max_size = 0
+
+    results = [("before (cold model)", run(args.requests, args.concurrency, "cold"))]
+    rag_main.warm_up_embedding_model()
+    results.append(("reconnect per query", run(args.requests, args.concurrency, "reconnect")))
+    results.append(("after (pooled)", run(args.requests, args.concurrency, "pooled")))
+
+    print(f"{'mode':<22}{'p50 (ms)':>12}{'p99 (ms)':>12}   concurrency={args.concurrency}")
+    for name, latencies in results:
+        print(f"{name:<22}{percentile(latencies, 50):>12.1f}{percentile(latencies, 99):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -71,12 +71,10 @@ echo "Creating directories for ChromaDB and PDFs..."
 CHROMA_DIR="/opt/render/project/src/ragImplementation"
 mkdir -p "$CHROMA_DIR/chroma_db"
 mkdir -p "$CHROMA_DIR/pdfs"
-mkdir -p "$CHROMA_DIR/temp_uploads"
 
 # Also create locally for fallback (in case persistent disk is not mounted)
 mkdir -p ../ragImplementation/chroma_db || true
 mkdir -p ../ragImplementation/pdfs || true
-mkdir -p ../ragImplementation/temp_uploads || true
 
 # Verify critical packages are installed
 echo "Verifying critical installations..."
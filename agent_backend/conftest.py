@@ -15,19 +15,22 @@ import shutil
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, BASE_DIR)
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "agent_backend.settings")
+# Model calls go to the deterministic local provider unless a run asks for Gemini
+os.environ.setdefault("LLM_PROVIDER", "stub")
 django.setup()
 
 from agent_app.models import Lead, Campaign, CampaignLead, MessageLog, LeadReply, FollowUpMessage
 
 
 @pytest.fixture(scope="session")
-def django_db_setup():
-    """Configure test database."""
+def django_db_modify_db_settings():
+    """Configure test database: in-memory SQLite, created and migrated by pytest-django."""
     from django.conf import settings
-    settings.DATABASES['default'] = {
+    # Update in place: the connection shares this dict, with Django's defaults (ATOMIC_REQUESTS, ...) filled in
+    settings.DATABASES['default'].update({
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:'
-    }
+    })
 
 
 @pytest.fixture
@@ -107,6 +110,65 @@ def temp_pdf_directory():
     shutil.rmtree(temp_dir)
 
 
+class FakeEmbeddings:
+    """Deterministic stand-in for HuggingFaceEmbeddings that avoids a model download."""
+
+    instances = 0
+    texts_embedded = 0
+
+    def __init__(self, model_name=None, **kwargs):
+        FakeEmbeddings.instances += 1
+        self.model_name = model_name
+
+    def _vector(self, text):
+        # Bag-of-characters vector: similar texts get similar vectors
+        vector = [0.0] * 26
+        for ch in text.lower():
+            if "a" <= ch <= "z":
+                vector[ord(ch) - ord("a")] += 1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def embed_query(self, text):
+        FakeEmbeddings.texts_embedded += 1
+        return self._vector(text)
+
+    def embed_documents(self, texts):
+        FakeEmbeddings.texts_embedded += len(texts)
+        return [self._vector(t) for t in texts]
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    """Swap the RAG embedding model for FakeEmbeddings and reset the registry."""
+    sys.path.append(os.path.abspath(os.path.join(BASE_DIR, "../ragImplementation")))
+    import rag_main
+
+    FakeEmbeddings.instances = 0
+    FakeEmbeddings.texts_embedded = 0
+    monkeypatch.setattr(rag_main, "HuggingFaceEmbeddings", FakeEmbeddings)
+    monkeypatch.setattr(rag_main, "EMBEDDING_BACKEND", "torch")
+    rag_main.clear_embedding_models()
+    yield FakeEmbeddings
+    rag_main.clear_embedding_models()
+
+
+@pytest.fixture
+def chroma_dir(request, fake_embeddings, temp_pdf_directory, monkeypatch):
+    """
+    Chroma store in a temporary CHROMA_DB_PATH holding the test class's CHUNKS
+    (fake embeddings), with an empty query cache and the pooled handle dropped afterwards.
+    """
+    import rag_main
+
+    monkeypatch.setenv("CHROMA_DB_PATH", temp_pdf_directory)
+    rag_main.clear_query_cache()
+    rag_main.store_in_chromadb([dict(c) for c in request.cls.CHUNKS], persist_directory=temp_pdf_directory)
+    yield temp_pdf_directory
+    rag_main.clear_query_cache()
+    rag_main.refresh_vectorstore(temp_pdf_directory)
+
+
 @pytest.fixture
 def mock_chroma_db_path():
     """Return path to mock ChromaDB for testing."""
@@ -0,0 +1,93 @@
+"""
+Chunk dedup benchmark.
+
+Ingests every PDF in the `--sources` folders (by default pdfs/ and
+"pdfs copy/", which hold the same brochure) into two temporary stores, one
+with RAG_DEDUP off and one with it on, and reports stored chunks, on-disk
+index size and query p50/p99 latency for each.
+
+Usage (from ragImplementation directory):
+    python benchmarks/bench_dedup.py --queries 50
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import rag_main
+from latency_stats import percentile
+
+QUERIES = [
+    "payment plan",
+    "DLF West Park amenities",
+    "possession date and handover",
+    "legal disclaimer",
+    "unit sizes and floor plans",
+]
+
+
+def folder_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def build_corpus(sources, target):
+    # Prefix copies with their folder index so identical names do not collide
+    file_paths = []
+    for i, source in enumerate(sources):
+        for file_name in sorted(os.listdir(source)):
+            if file_name.lower().endswith(".pdf"):
+                path = os.path.join(target, f"{i}_{file_name}")
+                shutil.copy(os.path.join(source, file_name), path)
+                file_paths.append(path)
+    return file_paths
+
+
+def run(file_paths, persist_directory, dedup, queries):
+    rag_main.DEDUP_ENABLED = dedup
+    rag_main.ingest_pdfs(file_paths, persist_directory=persist_directory)
+    os.environ["CHROMA_DB_PATH"] = persist_directory
+
+    latencies = []
+    for i in range(queries):
+        start = time.perf_counter()
+        rag_main.query_brochures(QUERIES[i % len(QUERIES)], use_cache=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+    chunks = rag_main.get_vectorstore(persist_directory)._collection.count()
+    return chunks, folder_size(persist_directory), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--sources", nargs="+",
+        default=[os.path.join(BASE_DIR, "pdfs"), os.path.join(BASE_DIR, "pdfs copy")],
+        help="folders with PDFs"
+    )
+    parser.add_argument("--queries", type=int, default=30, help="queries per mode")
+    args = parser.parse_args()
+
+    rag_main.warm_up_embedding_model()
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = os.path.join(workdir, "corpus")
+        os.makedirs(corpus)
+        file_paths = build_corpus(args.sources, corpus)
+        print(f"Corpus: {len(file_paths)} files")
+
+        print(f"{'mode':<12}{'chunks':>10}{'index MB':>12}{'p50 (ms)':>12}{'p99 (ms)':>12}")
+        for name, dedup in (("no dedup", False), ("dedup", True)):
+            chunks, size, latencies = run(file_paths, os.path.join(workdir, name), dedup, args.queries)
+            print(f"{name:<12}{chunks:>10}{size / 1e6:>12.2f}"
+                  f"{percentile(latencies, 50):>12.1f}{percentile(latencies, 99):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
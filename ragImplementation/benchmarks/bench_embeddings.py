@@ -0,0 +1,61 @@
+"""
+Embedding throughput benchmark: torch (sentence-transformers) vs ONNX Runtime
+(float32 and int8 dynamically quantized).
+
+Embeds the chunks of the brochures in `--source` with each backend and
+reports chunks/second per batch size, plus the lowest cosine similarity of
+each ONNX variant to the torch vectors against the tolerance in
+onnx_embeddings.MIN_COSINE.
+
+Usage (from ragImplementation directory):
+    python benchmarks/bench_embeddings.py --batch-sizes 16 64 --threads 4
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rag_main
+from onnx_embeddings import MIN_COSINE, OnnxEmbeddings, export_onnx_model, min_cosine_similarity, onnx_model_dir
+
+
+def throughput(model, texts, repeats):
+    model.embed_documents(texts[:8])
+    start = time.perf_counter()
+    for _ in range(repeats):
+        vectors = model.embed_documents(texts)
+    return len(texts) * repeats / (time.perf_counter() - start), vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=rag_main.RAG_PDFS_PATH, help="folder with sample PDFs")
+    parser.add_argument("--model", default=rag_main.EMBEDDING_MODEL_NAME)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 64])
+    parser.add_argument("--threads", type=int, default=None, help="ONNX Runtime intra-op threads")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = [chunk["chunk_text"] for chunk in rag_main.split_into_chunks(rag_main.load_documents(args.source))]
+    model_dir = export_onnx_model(args.model, onnx_model_dir(rag_main.ONNX_MODEL_DIR, args.model), quantize=True)
+    print(f"{len(texts)} chunks, {args.repeats} repeats")
+
+    print(f"{'backend':<12}{'batch':>8}{'chunks/s':>12}{'min cosine':>14}{'tolerance':>12}")
+    for batch_size in args.batch_sizes:
+        torch_model = rag_main.HuggingFaceEmbeddings(model_name=args.model, encode_kwargs={"batch_size": batch_size})
+        rate, reference = throughput(torch_model, texts, args.repeats)
+        print(f"{'torch':<12}{batch_size:>8}{rate:>12.1f}{'-':>14}{'-':>12}")
+
+        for variant, quantized in (("fp32", False), ("int8", True)):
+            model = OnnxEmbeddings(model_dir, quantized=quantized, batch_size=batch_size, threads=args.threads)
+            rate, vectors = throughput(model, texts, args.repeats)
+            cosine = min_cosine_similarity(reference, vectors)
+            status = "ok" if cosine >= MIN_COSINE[variant] else "FAIL"
+            print(f"{'onnx-' + variant:<12}{batch_size:>8}{rate:>12.1f}{cosine:>14.5f}"
+                  f"{f'>={MIN_COSINE[variant]} {status}':>12}")
+
+
+if __name__ == "__main__":
+    main()
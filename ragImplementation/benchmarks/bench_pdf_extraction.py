@@ -0,0 +1,65 @@
+"""
+PDF extraction throughput benchmark.
+
+Builds a corpus by copying the brochures in RAG_PDFS_PATH `--copies` times,
+then reports pages/sec for the serial load_documents loop and for the
+process-pool mode.
+
+Usage (from ragImplementation directory):
+    python benchmarks/bench_pdf_extraction.py --copies 50 --workers 16
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_main import RAG_PDFS_PATH, load_documents
+from pdf_extraction import count_pages
+
+
+def build_corpus(source_folder, copies, target_folder):
+    pages = 0
+    for file_name in sorted(os.listdir(source_folder)):
+        if not file_name.lower().endswith(".pdf"):
+            continue
+        source = os.path.join(source_folder, file_name)
+        file_pages = count_pages(source)
+        for i in range(copies):
+            shutil.copy(source, os.path.join(target_folder, f"{i:04d}_{file_name}"))
+            pages += file_pages
+    return pages
+
+
+def time_load(folder, workers):
+    start = time.perf_counter()
+    docs = load_documents(folder, workers=workers)
+    return time.perf_counter() - start, docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=RAG_PDFS_PATH, help="folder with sample PDFs")
+    parser.add_argument("--copies", type=int, default=20, help="copies of each sample PDF")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="process pool size")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as corpus:
+        pages = build_corpus(args.source, args.copies, corpus)
+        print(f"Corpus: {len(os.listdir(corpus))} files, {pages} pages")
+
+        serial_time, serial_docs = time_load(corpus, workers=1)
+        parallel_time, parallel_docs = time_load(corpus, workers=args.workers)
+
+        same = [d["text"] for d in serial_docs] == [d["text"] for d in parallel_docs]
+        print(f"{'mode':<22}{'seconds':>10}{'pages/sec':>12}")
+        print(f"{'serial':<22}{serial_time:>10.2f}{pages / serial_time:>12.1f}")
+        print(f"{f'parallel ({args.workers} workers)':<22}{parallel_time:>10.2f}{pages / parallel_time:>12.1f}")
+        print(f"Identical output: {same}")
+
+
+if __name__ == "__main__":
+    main()
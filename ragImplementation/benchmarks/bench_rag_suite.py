@@ -0,0 +1,226 @@
+"""
+RAG retrieval quality and latency benchmark suite.
+
+For every corpus (synthetic and/or fixture, see corpus.py), chunker and
+(chunk size, overlap) pair, the corpus is ingested into a fresh store with
+rag_main.ingest_pdf_stream; ingestion throughput and on-disk index size are
+recorded. The labeled questions are then asked for every search mode,
+vector backend and top_k, reporting recall@k, MRR and p50/p95/p99 latency.
+The query cache is disabled throughout.
+
+Results go to a JSON file (keys sorted, so two runs diff cleanly) and a
+summary table is printed. With --baseline, the summary also shows the change
+in recall, MRR and p95 against an earlier results file.
+
+Usage (from ragImplementation directory):
+    python benchmarks/bench_rag_suite.py --corpora synthetic fixture --synthetic-projects 50 \\
+        --chunkers tokens --chunk-sizes 128 256 --overlaps 16 32 --top-k 1 3 5 --output rag_suite.json
+    python benchmarks/bench_rag_suite.py --chunkers chars --chunk-sizes 500 1000 --overlaps 50 100
+
+Chunk sizes and overlaps are in tokens for the 'tokens' chunker and in
+characters for 'chars'; they default to the chunker's defaults.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import rag_main
+from latency_stats import percentile
+from corpus import fixture_corpus, is_relevant, synthetic_corpus
+
+
+def folder_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ingest(documents, persist_directory, chunker, chunk_size, chunk_overlap, export_snapshot=False):
+    pages = sum(len(document["pages"]) for document in documents)
+    start = time.perf_counter()
+    stored = sum(
+        rag_main.ingest_pdf_stream(
+            document["file_name"], iter(document["pages"]), persist_directory=persist_directory,
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, chunker=chunker
+        )
+        for document in documents
+    )
+    seconds = time.perf_counter() - start
+    if export_snapshot:
+        rag_main.export_vector_index(persist_directory)
+    return {
+        "documents": len(documents),
+        "pages": pages,
+        "chunks_stored": stored,
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(pages / seconds, 2) if seconds else None,
+        "chunks_per_second": round(stored / seconds, 2) if seconds else None,
+        "index_bytes": folder_size(persist_directory),
+    }
+
+
+def evaluate(questions, mode, vector_backend, top_k):
+    hits = 0
+    reciprocal_ranks = []
+    latencies = []
+    for question in questions:
+        start = time.perf_counter()
+        results = rag_main.query_brochures(
+            question["question"], top_k=top_k, use_cache=False, mode=mode, backend=vector_backend
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        rank = next(
+            (i for i, r in enumerate(results, start=1) if is_relevant(r.page_content, question["answer"])), None
+        )
+        hits += rank is not None
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    return {
+        "mode": mode,
+        "vector_backend": vector_backend if mode != "lexical" else None,
+        "top_k": top_k,
+        "queries": len(questions),
+        "recall_at_k": round(hits / len(questions), 4) if questions else None,
+        "mrr": round(statistics.mean(reciprocal_ranks), 4) if questions else None,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def run_key(run, result):
+    # Results written before the chunker option were all 'chars'
+    return (run["corpus"], run.get("chunker", "chars"), run["chunk_size"], run["chunk_overlap"], result["mode"],
+            result["vector_backend"], result["top_k"])
+
+
+def load_baseline(path):
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return {run_key(run, result): result for run in report["runs"] for result in run["results"]}
+
+
+def print_summary(report, baseline=None):
+    header = (f"{'corpus':<10}{'chunker':>8}{'chunk':>7}{'overlap':>9}{'mode':>8}{'backend':>9}{'k':>4}"
+              f"{'recall':>9}{'MRR':>8}{'p50':>8}{'p95':>8}{'p99':>8}")
+    if baseline:
+        header += f"{'Δrecall':>9}{'ΔMRR':>8}{'Δp95':>8}"
+    print(header)
+    for run in report["runs"]:
+        for result in run["results"]:
+            line = (f"{run['corpus']:<10}{run.get('chunker', 'chars'):>8}{run['chunk_size']:>7}"
+                    f"{run['chunk_overlap']:>9}{result['mode']:>8}"
+                    f"{result['vector_backend'] or '-':>9}{result['top_k']:>4}{result['recall_at_k']:>9.3f}"
+                    f"{result['mrr']:>8.3f}{result['p50_ms']:>8.1f}{result['p95_ms']:>8.1f}{result['p99_ms']:>8.1f}")
+            previous = (baseline or {}).get(run_key(run, result))
+            if previous:
+                line += (f"{result['recall_at_k'] - previous['recall_at_k']:>+9.3f}"
+                         f"{result['mrr'] - previous['mrr']:>+8.3f}"
+                         f"{result['p95_ms'] - previous['p95_ms']:>+8.1f}")
+            print(line)
+    for run in report["runs"]:
+        ingestion = run["ingestion"]
+        print(f"[INGEST] {run['corpus']} {run.get('chunker', 'chars')} chunk={run['chunk_size']} "
+              f"overlap={run['chunk_overlap']}: "
+              f"{ingestion['chunks_stored']} chunks, {ingestion['chunks_per_second']} chunks/s, "
+              f"{ingestion['index_bytes'] / 1e6:.2f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpora", nargs="+", choices=["synthetic", "fixture"], default=["synthetic", "fixture"])
+    parser.add_argument("--synthetic-projects", type=int, default=20, help="brochures in the synthetic corpus")
+    parser.add_argument("--synthetic-filler-pages", type=int, default=2, help="extra pages per synthetic brochure")
+    parser.add_argument("--fixture-source", default=rag_main.RAG_PDFS_PATH, help="folder with fixture PDFs")
+    parser.add_argument("--fixture-copies", type=int, default=1, help="times the fixture PDFs are repeated")
+    parser.add_argument("--chunkers", nargs="+", choices=rag_main.CHUNKERS, default=[rag_main.CHUNKER])
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=None, help="default: the chunker's default")
+    parser.add_argument("--overlaps", type=int, nargs="+", default=None, help="default: the chunker's default")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--modes", nargs="+", choices=rag_main.SEARCH_MODES, default=list(rag_main.SEARCH_MODES))
+    parser.add_argument("--vector-backends", nargs="+", choices=rag_main.VECTOR_BACKENDS, default=["chroma"])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default="rag_suite.json", help="JSON results file")
+    parser.add_argument("--baseline", default=None, help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    corpora = {}
+    if "synthetic" in args.corpora:
+        corpora["synthetic"] = synthetic_corpus(args.synthetic_projects, args.synthetic_filler_pages, args.seed)
+    if "fixture" in args.corpora:
+        corpora["fixture"] = fixture_corpus(args.fixture_source, args.fixture_copies)
+
+    rag_main.warm_up_embedding_model()
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "embedding_model": rag_main.EMBEDDING_MODEL_NAME,
+            "embedding_backend": rag_main.EMBEDDING_BACKEND,
+            "dedup": rag_main.DEDUP_ENABLED,
+            "args": vars(args),
+        },
+        "runs": [],
+    }
+
+    configurations = []
+    for chunker in args.chunkers:
+        default_size, default_overlap = rag_main.CHUNK_DEFAULTS[chunker]
+        for chunk_size in args.chunk_sizes or [default_size]:
+            for chunk_overlap in args.overlaps or [default_overlap]:
+                if chunk_overlap < chunk_size:
+                    configurations.append((chunker, chunk_size, chunk_overlap))
+
+    for corpus_name, (documents, questions) in corpora.items():
+        for chunker, chunk_size, chunk_overlap in configurations:
+            with tempfile.TemporaryDirectory() as persist_directory:
+                os.environ["CHROMA_DB_PATH"] = persist_directory
+                run = {
+                    "corpus": corpus_name,
+                    "chunker": chunker,
+                    "chunk_size": chunk_size,
+                    "chunk_overlap": chunk_overlap,
+                    "questions": len(questions),
+                    "ingestion": ingest(
+                        documents, persist_directory, chunker, chunk_size, chunk_overlap,
+                        export_snapshot="numpy" in args.vector_backends
+                    ),
+                    "results": [],
+                }
+                for mode in args.modes:
+                    backends = args.vector_backends if mode != "lexical" else [args.vector_backends[0]]
+                    for vector_backend in backends:
+                        for top_k in args.top_k:
+                            run["results"].append(evaluate(questions, mode, vector_backend, top_k))
+                report["runs"].append(run)
+                rag_main.refresh_vectorstore(persist_directory)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print_summary(report, load_baseline(args.baseline) if args.baseline else None)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Retrieval quality and latency benchmark for the vector, lexical and hybrid
+search modes.
+
+Ingests the brochures in RAG_PDFS_PATH into a temporary Chroma store, then
+asks one query per sampled chunk: a run of `--words` consecutive words taken
+from that chunk. recall@k is the share of queries whose source chunk is in
+the top k results.
+
+Usage (from ragImplementation directory):
+    python benchmarks/bench_retrieval.py --samples 100 --top-k 3
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rag_main
+from latency_stats import percentile
+from lexical_index import chunk_key
+
+
+def sample_queries(persist_directory, samples, words, seed):
+    rng = random.Random(seed)
+    index = rag_main.get_lexical_index(persist_directory)
+    doc_ids = sorted(d for d, doc in index.docs.items() if len(doc["text"].split()) >= words)
+    queries = []
+    for doc_id in rng.sample(doc_ids, min(samples, len(doc_ids))):
+        tokens = index.docs[doc_id]["text"].split()
+        start = rng.randrange(len(tokens) - words + 1)
+        queries.append((" ".join(tokens[start:start + words]), doc_id))
+    return queries
+
+
+def run(queries, top_k, mode):
+    hits = 0
+    latencies = []
+    for query_text, expected in queries:
+        start = time.perf_counter()
+        results = rag_main.query_brochures(query_text, top_k=top_k, use_cache=False, mode=mode)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {chunk_key(r.metadata["file_name"], r.metadata["chunk_id"]) for r in results}
+        hits += expected in found
+    return hits / len(queries), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=rag_main.RAG_PDFS_PATH, help="folder with sample PDFs")
+    parser.add_argument("--samples", type=int, default=50, help="number of queries")
+    parser.add_argument("--words", type=int, default=6, help="words per query")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        os.environ["CHROMA_DB_PATH"] = persist_directory
+        file_paths = [
+            os.path.join(args.source, f) for f in sorted(os.listdir(args.source)) if f.lower().endswith(".pdf")
+        ]
+        rag_main.ingest_pdfs(file_paths, persist_directory=persist_directory)
+        rag_main.warm_up_embedding_model()
+
+        queries = sample_queries(persist_directory, args.samples, args.words, args.seed)
+        print(f"{len(queries)} queries, top_k={args.top_k}")
+        print(f"{'mode':<10}{f'recall@{args.top_k}':>12}{'p50 (ms)':>12}{'p99 (ms)':>12}")
+        for mode in rag_main.SEARCH_MODES:
+            recall, latencies = run(queries, args.top_k, mode)
+            print(f"{mode:<10}{recall:>12.3f}{percentile(latencies, 50):>12.1f}{percentile(latencies, 99):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
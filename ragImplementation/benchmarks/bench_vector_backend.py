@@ -0,0 +1,133 @@
+"""
+Vector backend benchmark: Chroma vs the memory-mapped NumPy snapshot.
+
+Ingests the brochures in `--source` into a temporary store (optionally padded
+with `--synthetic` random chunks to reach a realistic corpus size), exports
+the NumPy snapshot, then runs each backend in a fresh process so startup and
+memory are measured in isolation. Reported per backend: time to the first
+answered query (opening the store included), query p50/p99, and the worker's
+RSS split into anonymous (private) and file-backed (shareable page cache)
+memory, read from /proc/self/status.
+
+Usage (from ragImplementation directory):
+    python benchmarks/bench_vector_backend.py --synthetic 30000 --queries 200
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import numpy as np
+
+import rag_main
+from latency_stats import percentile
+
+QUERIES = [
+    "payment plan",
+    "DLF West Park amenities",
+    "possession date and handover",
+    "legal disclaimer",
+    "unit sizes and floor plans",
+]
+
+
+def memory_kb():
+    fields = {}
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("VmRSS", "RssAnon", "RssFile"):
+                    fields[name] = int(value.split()[0])
+    except OSError:
+        pass
+    return fields
+
+
+def add_synthetic_chunks(persist_directory, count, seed=7):
+    # Random unit vectors with the model's dimension, stored without embedding
+    collection = rag_main.get_vectorstore(persist_directory)._collection
+    dim = len(collection.get(limit=1, include=["embeddings"])["embeddings"][0])
+    rng = np.random.default_rng(seed)
+    for start in range(0, count, 1000):
+        size = min(1000, count - start)
+        vectors = rng.standard_normal((size, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        collection.upsert(
+            ids=[f"synthetic_{start + i}" for i in range(size)],
+            embeddings=vectors.tolist(),
+            documents=[f"synthetic chunk {start + i}" for i in range(size)],
+            metadatas=[rag_main.chunk_metadata("synthetic.pdf", start + i) for i in range(size)],
+        )
+    rag_main.bump_collection_version(persist_directory)
+
+
+def worker(backend, queries):
+    # Runs in a fresh process: the first query opens the store from disk
+    rag_main.warm_up_embedding_model()
+    baseline = memory_kb()
+
+    start = time.perf_counter()
+    rag_main.query_brochures(QUERIES[0], use_cache=False, backend=backend)
+    first_query_ms = (time.perf_counter() - start) * 1000
+
+    latencies = []
+    for i in range(queries):
+        start = time.perf_counter()
+        rag_main.query_brochures(QUERIES[i % len(QUERIES)], use_cache=False, backend=backend)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    memory = memory_kb()
+    print(json.dumps({
+        "first_query_ms": first_query_ms,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "rss_mb": (memory.get("VmRSS", 0) - baseline.get("VmRSS", 0)) / 1024,
+        "anon_mb": (memory.get("RssAnon", 0) - baseline.get("RssAnon", 0)) / 1024,
+        "file_mb": (memory.get("RssFile", 0) - baseline.get("RssFile", 0)) / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=rag_main.RAG_PDFS_PATH, help="folder with sample PDFs")
+    parser.add_argument("--synthetic", type=int, default=0, help="random chunks added to the store")
+    parser.add_argument("--queries", type=int, default=100, help="queries per backend")
+    parser.add_argument("--worker", choices=rag_main.VECTOR_BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.queries)
+        return
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        file_paths = [
+            os.path.join(args.source, f) for f in sorted(os.listdir(args.source)) if f.lower().endswith(".pdf")
+        ]
+        rag_main.ingest_pdfs(file_paths, persist_directory=persist_directory)
+        if args.synthetic:
+            add_synthetic_chunks(persist_directory, args.synthetic)
+        vectors = rag_main.export_vector_index(persist_directory)
+        print(f"{vectors} vectors, {args.queries} queries per backend")
+
+        env = dict(os.environ, CHROMA_DB_PATH=persist_directory)
+        print(f"{'backend':<10}{'first (ms)':>12}{'p50 (ms)':>10}{'p99 (ms)':>10}"
+              f"{'RSS MB':>10}{'anon MB':>10}{'file MB':>10}")
+        for backend in rag_main.VECTOR_BACKENDS:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", backend, "--queries", str(args.queries)],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout
+            row = json.loads(output.strip().splitlines()[-1])
+            print(f"{backend:<10}{row['first_query_ms']:>12.1f}{row['p50']:>10.2f}{row['p99']:>10.2f}"
+                  f"{row['rss_mb']:>10.1f}{row['anon_mb']:>10.1f}{row['file_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
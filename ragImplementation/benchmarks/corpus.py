@@ -0,0 +1,111 @@
+"""
+Benchmark corpora with labeled questions for bench_rag_suite.py.
+
+A corpus is a list of documents ({'file_name', 'pages'}) plus questions
+({'question', 'answer', 'file_name'}). A retrieved chunk is relevant to a
+question when its normalized text contains the normalized answer, so labels
+stay valid for any chunk size or overlap.
+
+- synthetic: generated brochures for `projects` made-up projects. Every fact
+  sentence names its project, so answers are unique across the corpus.
+- fixture: the PDFs of a folder (pdfs/ by default), repeated `copies` times
+  under different names, with the questions of fixture_questions.json.
+"""
+import json
+import os
+import random
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_extraction import iter_pdf_pages
+
+FIXTURE_QUESTIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixture_questions.json")
+
+_NAME_PARTS = (
+    ["Azure", "Crescent", "Emerald", "Golden", "Harbor", "Ivory", "Jade", "Lumen", "Marina", "Onyx",
+     "Pearl", "Royal", "Saffron", "Silver", "Solace", "Summit", "Verde", "Willow"],
+    ["Heights", "Residences", "Gardens", "Towers", "Bay", "Park", "Court", "Vista", "Terraces", "Grove"],
+)
+_LOCATIONS = ["Dubai Marina", "Business Bay", "Jumeirah Village Circle", "Dubai Hills", "Palm Jumeirah",
+              "Downtown Dubai", "Dubai Creek Harbour", "Arjan", "Al Furjan", "Meydan"]
+_AMENITIES = ["infinity pool", "padel court", "cinema room", "rooftop garden", "kids play area", "co-working lounge",
+              "spa and sauna", "jogging track", "yoga deck", "BBQ terrace", "squash court", "climbing wall"]
+_FILLER = ("Residents enjoy a calm, landscaped setting with shaded walkways, generous natural light and "
+           "carefully planned communal spaces that encourage neighbours to meet and unwind. ")
+_DISCLAIMER = ("Disclaimer: all images are artist impressions. Specifications, areas and prices are indicative "
+               "and subject to change without notice. This brochure does not constitute an offer or contract. ")
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+def is_relevant(chunk_text, answer):
+    return normalize(answer) in normalize(chunk_text)
+
+
+def synthetic_corpus(projects=20, filler_pages=2, seed=7):
+    """
+    Generates `projects` brochures of 5 + `filler_pages` pages, with five
+    labeled questions each.
+    """
+    rng = random.Random(seed)
+    documents, questions = [], []
+    names = set()
+    while len(names) < projects:
+        names.add(f"{rng.choice(_NAME_PARTS[0])} {rng.choice(_NAME_PARTS[1])} {rng.randint(1, 99)}")
+
+    for name in sorted(names):
+        file_name = f"{name} brochure.pdf"
+        location = rng.choice(_LOCATIONS)
+        down = rng.choice([10, 20, 30, 40, 50, 60])
+        price = rng.randrange(700, 9000, 50) * 1000
+        handover = f"Q{rng.randint(1, 4)} {rng.randint(2026, 2031)}"
+        amenities = rng.sample(_AMENITIES, 3)
+        towers = rng.randint(1, 6)
+        floors = rng.randint(8, 70)
+
+        facts = {
+            "location": f"{name} is located in {location}",
+            "payment": f"The {name} payment plan is {down}/{100 - down}",
+            "price": f"Prices at {name} start from AED {price:,}",
+            "handover": f"Handover of {name} is expected in {handover}",
+            "amenities": f"{name} amenities include a {amenities[0]}, a {amenities[1]} and a {amenities[2]}",
+        }
+        pages = [
+            f"{name}. {facts['location']}, with {towers} towers of {floors} floors each. " + _FILLER * 3,
+            f"Unit types and pricing. {facts['price']} for studios up to four bedroom apartments. " + _FILLER * 3,
+            f"Payment plan. {facts['payment']}, with {down}% paid during construction. " + _FILLER * 3,
+            f"Lifestyle. {facts['amenities']}. " + _FILLER * 3,
+            f"Delivery. {facts['handover']}. " + _FILLER * 2 + _DISCLAIMER * 2,
+        ]
+        pages += [_FILLER * 6 for _ in range(filler_pages)]
+        documents.append({"file_name": file_name, "pages": pages})
+
+        questions += [
+            {"question": f"Which area of Dubai is {name} in?", "answer": facts["location"], "file_name": file_name},
+            {"question": f"What payment plan does {name} offer?", "answer": facts["payment"], "file_name": file_name},
+            {"question": f"What is the starting price of {name}?", "answer": facts["price"], "file_name": file_name},
+            {"question": f"When will {name} be handed over?", "answer": facts["handover"], "file_name": file_name},
+            {"question": f"What facilities are there at {name}?", "answer": facts["amenities"], "file_name": file_name},
+        ]
+    return documents, questions
+
+
+def fixture_corpus(folder, copies=1, questions_path=FIXTURE_QUESTIONS):
+    """
+    Reads the PDFs in `folder`, repeated `copies` times (copy n is stored as
+    'copy<n> <file name>'). Questions are only asked about the first copy.
+    """
+    with open(questions_path, "r", encoding="utf-8") as f:
+        labeled = json.load(f)
+
+    documents, questions = [], []
+    for file_name in sorted(f for f in os.listdir(folder) if f.lower().endswith(".pdf")):
+        pages = [text for _, text in iter_pdf_pages(os.path.join(folder, file_name))]
+        for copy in range(copies):
+            documents.append({"file_name": file_name if copy == 0 else f"copy{copy} {file_name}", "pages": pages})
+        questions += [dict(q, file_name=file_name) for q in labeled.get(file_name, [])]
+    return documents, questions
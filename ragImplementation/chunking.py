@@ -0,0 +1,197 @@
+"""
+Token-aware, page-anchored chunking of brochure text.
+
+Chunks are sized in tokens of the embedding model's tokenizer, so every
+chunk fits the model's input window (254 word pieces for all-MiniLM-L6-v2:
+its max_seq_length of 256 less [CLS] and [SEP]) and the prompt context built
+from the top chunks has a known size.
+
+Each page is chunked on its own, so a chunk never straddles two pages and
+carries the number of the page it came from. Within a page the text is cut
+into sections at blank lines and heading-like lines; small sections are
+packed together, while a section that does not fit the current chunk starts
+a new one. Sections are cut into sentences, and a sentence longer than a
+chunk is cut at token boundaries. Overlap between consecutive chunks is only
+carried within a section.
+"""
+import bisect
+import re
+
+# Stand-in for word pieces when the model's tokenizer is not available
+_APPROX_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END_RE = re.compile(r"[.!?…][\"'”’)]*\s+")
+HEADING_MAX_WORDS = 8
+HEADING_MAX_CHARS = 60
+
+
+class TokenCounter:
+    """
+    Token spans of a text under a `tokenizers.Tokenizer`, or under a regex
+    approximation (words and punctuation marks) when `tokenizer` is None.
+    """
+
+    def __init__(self, tokenizer=None):
+        if tokenizer is not None:
+            from tokenizers import Tokenizer
+            # A copy, so the embedding model keeps its truncation and padding
+            tokenizer = Tokenizer.from_str(tokenizer.to_str())
+            tokenizer.no_truncation()
+            tokenizer.no_padding()
+        self.tokenizer = tokenizer
+
+    @property
+    def exact(self):
+        return self.tokenizer is not None
+
+    def spans(self, text):
+        """(start, end) character offsets of the tokens of `text`."""
+        if self.tokenizer is None:
+            return [match.span() for match in _APPROX_TOKEN_RE.finditer(text)]
+        encoding = self.tokenizer.encode(text, add_special_tokens=False)
+        return [(start, end) for start, end in encoding.offsets if end > start]
+
+    def count(self, text):
+        return len(self.spans(text))
+
+    def truncate(self, text, max_tokens):
+        """`text` cut after its first `max_tokens` tokens."""
+        spans = self.spans(text)
+        if len(spans) <= max_tokens:
+            return text
+        return text[:spans[max_tokens - 1][1]] if max_tokens > 0 else ""
+
+
+def _is_heading(line, previous):
+    words = line.split()
+    return (
+        0 < len(words) <= HEADING_MAX_WORDS
+        and len(line) <= HEADING_MAX_CHARS
+        and (line[0].isupper() or line[0].isdigit())
+        and not line.endswith((".", ",", ";", "-", "—", "–"))
+        # A short line that continues a wrapped sentence is not a heading
+        and (previous is None or previous.endswith((".", "!", "?", ":", "…")) or _is_heading(previous, None))
+    )
+
+
+def split_sections(text):
+    """(start, end) character ranges of the sections of a page."""
+    starts = [0]
+    previous = None
+    offset = 0
+    for raw_line in text.splitlines(keepends=True):
+        line = raw_line.strip()
+        if not line:
+            previous = None
+            starts.append(offset + len(raw_line))
+        elif _is_heading(line, previous) and offset > starts[-1]:
+            starts.append(offset)
+            previous = line
+        else:
+            previous = line
+        offset += len(raw_line)
+
+    sections = []
+    for start, end in zip(starts, starts[1:] + [len(text)]):
+        if text[start:end].strip():
+            sections.append((start, end))
+    return sections
+
+
+def _sentences(text, start, end):
+    """(start, end) ranges of the sentences in text[start:end]."""
+    ranges = []
+    for match in _SENTENCE_END_RE.finditer(text, start, end):
+        # The sentence keeps its closing punctuation, quotes and brackets
+        ranges.append((start, match.start() + len(match.group().rstrip())))
+        start = match.end()
+    if text[start:end].strip():
+        ranges.append((start, end))
+    return ranges
+
+
+def _page_units(text, token_starts, max_tokens):
+    """
+    Sections of a page as lists of (start, end, tokens) units: sentences, or
+    token windows of sentences longer than `max_tokens`.
+    """
+    def tokens_in(start, end):
+        return bisect.bisect_left(token_starts, end) - bisect.bisect_left(token_starts, start)
+
+    sections = []
+    for section_start, section_end in split_sections(text):
+        units = []
+        for start, end in _sentences(text, section_start, section_end):
+            tokens = tokens_in(start, end)
+            if tokens <= max_tokens:
+                units.append((start, end, tokens))
+                continue
+            first = bisect.bisect_left(token_starts, start)
+            last = bisect.bisect_left(token_starts, end)
+            for window in range(first, last, max_tokens):
+                piece_start = start if window == first else token_starts[window]
+                piece_end = token_starts[window + max_tokens] if window + max_tokens < last else end
+                units.append((piece_start, piece_end, min(max_tokens, last - window)))
+        if units:
+            sections.append(units)
+    return sections
+
+
+def chunk_page(text, counter, max_tokens=254, overlap_tokens=32):
+    """
+    Splits one page into chunks of at most `max_tokens` tokens.
+
+    Returns:
+        list[str]: Chunk texts, in page order.
+    """
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be positive")
+    if not text or not text.strip():
+        return []
+    token_starts = [start for start, _ in counter.spans(text)]
+
+    chunks = []
+    current = []
+
+    def flush():
+        if current:
+            chunk = text[current[0][0]:current[-1][1]].strip()
+            if chunk:
+                chunks.append(chunk)
+
+    for units in _page_units(text, token_starts, max_tokens):
+        # Small sections share a chunk; a section that does not fit starts a new one
+        if current and sum(u[2] for u in current) + sum(u[2] for u in units) > max_tokens:
+            flush()
+            current = []
+        for unit in units:
+            total = sum(u[2] for u in current)
+            if current and total + unit[2] > max_tokens:
+                flush()
+                # Carry the trailing sentences of this section into the next chunk
+                carry = []
+                for previous in reversed(current[1:]):
+                    if previous[0] < units[0][0] or sum(u[2] for u in carry) + previous[2] > overlap_tokens:
+                        break
+                    carry.insert(0, previous)
+                if sum(u[2] for u in carry) + unit[2] > max_tokens:
+                    carry = []
+                current = carry
+            current.append(unit)
+    flush()
+    return chunks
+
+
+def iter_token_chunks(file_name, pages, counter, max_tokens=254, overlap_tokens=32):
+    """
+    Streams the chunks of one document from an iterable of page texts, one
+    page at a time.
+
+    Yields:
+        dict: {'file_name', 'chunk_id', 'chunk_text', 'page'}, with 1-based
+        page numbers.
+    """
+    chunk_id = 0
+    for page, text in enumerate(pages, start=1):
+        for chunk in chunk_page(text, counter, max_tokens, overlap_tokens):
+            chunk_id += 1
+            yield {"file_name": file_name, "chunk_id": chunk_id, "chunk_text": chunk, "page": page}
@@ -0,0 +1,122 @@
+"""
+Token-budgeted packing of retrieved chunks into LLM prompt context.
+
+Chunks are taken in the rank order retrieval returned them in. A chunk whose
+text is already contained in a packed chunk is dropped, and text a chunk
+shares with a packed chunk at its start or end (the overlap between
+neighbouring chunks of a document) is trimmed. Chunks are then added
+while they fit `max_tokens`; the first chunk that does not fit is cut if at
+least `min_partial_tokens` are left, and smaller lower-ranked chunks can
+still fill the rest of the budget.
+
+Each packed chunk is preceded by a '[file name, page N]' line when the chunk
+carries that metadata, so the model can tell projects apart.
+"""
+import re
+
+from dedup import normalize_text
+
+_WORD_RE = re.compile(r"\S+")
+
+
+def citation(doc):
+    """'[file name, page N]' for a chunk with file metadata, else ''."""
+    metadata = getattr(doc, "metadata", None) or {}
+    if not metadata.get("file_name"):
+        return ""
+    page = metadata.get("page")
+    return f"[{metadata['file_name']}, page {page}]" if page is not None else f"[{metadata['file_name']}]"
+
+
+def _words(text):
+    return [(match.start(), match.end(), match.group().lower()) for match in _WORD_RE.finditer(text)]
+
+
+def _shared_words(left, right, min_words):
+    """Number of words at the end of `left` that also start `right` (0 if fewer than `min_words`)."""
+    left_words = [w for _, _, w in left]
+    right_words = [w for _, _, w in right]
+    for size in range(min(len(left_words), len(right_words)), min_words - 1, -1):
+        if left_words[-size:] == right_words[:size]:
+            return size
+    return 0
+
+
+def trim_overlap(text, packed_texts, min_words=5):
+    """
+    Removes the words `text` shares with any of `packed_texts` at its start
+    (their end) or at its end (their start).
+    """
+    words = _words(text)
+    start, end = 0, len(words)
+    for packed in packed_texts:
+        packed_words = _words(packed)
+        head = _shared_words(packed_words, words[start:end], min_words)
+        start += head
+        tail = _shared_words(words[start:end], packed_words, min_words)
+        end -= tail
+    if start >= end:
+        return ""
+    return text[words[start][0]:words[end - 1][1]]
+
+
+def pack_context(documents, counter, max_tokens, min_partial_tokens=32, min_overlap_words=5):
+    """
+    Packs ranked chunks into at most `max_tokens` tokens of context.
+
+    Args:
+        documents (list): Ranked langchain Documents (anything with
+                          'page_content' and optionally 'metadata').
+        counter (chunking.TokenCounter): Counts and cuts tokens.
+        max_tokens (int): Token budget of the packed context.
+        min_partial_tokens (int): Smallest remainder worth a cut chunk.
+        min_overlap_words (int): Shortest shared run of words that is trimmed.
+
+    Returns:
+        tuple[str, dict]: The context, and stats with the number of
+        'candidates', 'packed' chunks, 'duplicates' dropped, chunks 'trimmed'
+        of overlap, chunks 'truncated' at the budget, chunks 'skipped' for
+        lack of room, and the 'tokens' used of the 'budget'.
+    """
+    stats = {"candidates": 0, "packed": 0, "duplicates": 0, "trimmed": 0, "truncated": 0, "skipped": 0,
+             "tokens": 0, "budget": max_tokens}
+    parts = []
+    packed_texts = []
+    packed_normalized = []
+    remaining = max_tokens
+
+    for doc in documents:
+        stats["candidates"] += 1
+        text = (doc.page_content or "").strip()
+        normalized = normalize_text(text)
+        if not normalized or any(normalized in other for other in packed_normalized):
+            stats["duplicates"] += 1
+            continue
+
+        trimmed = trim_overlap(text, packed_texts, min_overlap_words)
+        if not trimmed.strip():
+            stats["duplicates"] += 1
+            continue
+        if trimmed != text:
+            stats["trimmed"] += 1
+
+        header = citation(doc)
+        # Parts are separated by a blank line, which adds no tokens
+        header_tokens = counter.count(header)
+        tokens = counter.count(trimmed)
+        if header_tokens + tokens > remaining:
+            if remaining - header_tokens < min_partial_tokens:
+                stats["skipped"] += 1
+                continue
+            trimmed = counter.truncate(trimmed, remaining - header_tokens)
+            tokens = counter.count(trimmed)
+            stats["truncated"] += 1
+
+        parts.append(f"{header}\n{trimmed}" if header else trimmed)
+        packed_texts.append(text)
+        packed_normalized.append(normalized)
+        remaining -= header_tokens + tokens
+        stats["packed"] += 1
+
+    stats["tokens"] = max_tokens - remaining
+    return "\n\n".join(parts), stats
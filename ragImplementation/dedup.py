@@ -0,0 +1,245 @@
+"""
+Exact and near-duplicate chunk detection for ingestion.
+
+Each distinct chunk is stored in Chroma once (the canonical chunk); chunks
+whose normalized text hashes the same, or whose 64-bit SimHash is within
+`max_distance` bits of a canonical chunk, are recorded as extra sources of
+that chunk instead of being embedded and stored again.
+
+Chunks are only compared within a scope (the project of their file), so a
+canonical chunk never stands for a file of another project and searches
+restricted to a project still find its shared text.
+"""
+import hashlib
+import json
+import os
+import re
+
+from lexical_index import chunk_key, tokenize
+
+DEDUP_INDEX_FILE_NAME = "dedup_index.json"
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+
+
+def normalize_text(text):
+    """Lowercases and collapses whitespace so formatting-only differences hash the same."""
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+def content_digest(text):
+    """SHA-1 of the normalized text, used for exact duplicate detection."""
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def simhash(text, bits=SIMHASH_BITS, shingle_size=SHINGLE_SIZE):
+    """
+    64-bit SimHash over word shingles of `text`. Similar texts get
+    fingerprints with a small Hamming distance.
+    """
+    tokens = tokenize(text)
+    if len(tokens) < shingle_size:
+        shingles = [" ".join(tokens)] if tokens else []
+    else:
+        shingles = [" ".join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)]
+
+    weights = [0] * bits
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=bits // 8).digest(), "big")
+        for bit in range(bits):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class DedupIndex:
+    """
+    Canonical chunks keyed by their Chroma id, each with its scope, content
+    digest, SimHash and the (file_name, chunk_id) of every chunk it stands
+    for (the canonical chunk itself first).
+    """
+
+    def __init__(self, max_distance=3):
+        self.max_distance = max_distance
+        self.entries = {}
+        self._by_digest = {}
+        # Fingerprints within `max_distance` bits agree exactly on at least one
+        # of max_distance + 1 bands (pigeonhole), so only band collisions are compared
+        self._band_count = max(max_distance, 0) + 1
+        self._bands = [{} for _ in range(self._band_count)]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def duplicate_count(self):
+        """Number of chunks that are represented by another chunk."""
+        return sum(len(entry["sources"]) - 1 for entry in self.entries.values())
+
+    def find(self, text, scope=""):
+        """Returns the key of the canonical chunk in `scope` that `text` duplicates, or None."""
+        key = self._by_digest.get((scope, content_digest(text)))
+        if key is not None or self.max_distance < 0:
+            return key
+
+        fingerprint = simhash(text)
+        candidates = set()
+        for band, value in enumerate(self._band_values(fingerprint)):
+            candidates.update(self._bands[band].get((scope, value), ()))
+        best = None
+        for candidate in sorted(candidates):
+            distance = hamming_distance(fingerprint, self.entries[candidate]["simhash"])
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, candidate)
+        return best[1] if best else None
+
+    def add_canonical(self, file_name, chunk_id, text, scope=""):
+        """Registers a chunk that is stored in Chroma and returns its key."""
+        key = chunk_key(file_name, chunk_id)
+        self._add_entry(key, {
+            "file_name": file_name,
+            "chunk_id": chunk_id,
+            "scope": scope,
+            "digest": content_digest(text),
+            "simhash": simhash(text),
+            "sources": [[file_name, chunk_id]],
+        })
+        return key
+
+    def add_source(self, key, file_name, chunk_id):
+        """Records (file_name, chunk_id) as another source of canonical chunk `key`."""
+        sources = self.entries[key]["sources"]
+        if [file_name, chunk_id] not in sources:
+            sources.append([file_name, chunk_id])
+
+    def sources(self, key):
+        """All (file_name, chunk_id) pairs canonical chunk `key` stands for."""
+        entry = self.entries.get(key)
+        return [tuple(source) for source in entry["sources"]] if entry else []
+
+    def discard(self, key):
+        """Forgets canonical chunk `key` and its sources."""
+        if key in self.entries:
+            self._remove_entry(key)
+
+    def remove_file(self, file_name):
+        """
+        Drops `file_name` from every entry. Canonical chunks of that file which
+        still have other sources are handed to the next source.
+
+        Returns:
+            list[tuple[str, str, int]]: (old key, new file_name, new chunk_id)
+            for each canonical chunk that has to be moved in the store.
+        """
+        moves = []
+        for key in list(self.entries):
+            entry = self.entries[key]
+            remaining = [source for source in entry["sources"] if source[0] != file_name]
+            if len(remaining) == len(entry["sources"]):
+                continue
+            if not remaining:
+                self._remove_entry(key)
+            elif entry["file_name"] == file_name:
+                self._remove_entry(key)
+                new_file, new_chunk_id = remaining[0]
+                entry.update(file_name=new_file, chunk_id=new_chunk_id, sources=remaining)
+                self._add_entry(chunk_key(new_file, new_chunk_id), entry)
+                moves.append((key, new_file, new_chunk_id))
+            else:
+                entry["sources"] = remaining
+        return moves
+
+    def split_scopes(self, scope_of):
+        """
+        Assigns a scope to entries written before scopes existed, which could
+        stand for files of several projects. Within each further scope the
+        first source becomes a canonical chunk of its own with the remaining
+        sources of that scope.
+
+        Args:
+            scope_of (callable): Returns the scope of a file name.
+
+        Returns:
+            list[tuple[str, str, int]]: (key of the stored copy, new file_name,
+            new chunk_id) for each chunk that has to be copied in the store.
+        """
+        copies = []
+        for key in [key for key, entry in self.entries.items() if "scope" not in entry]:
+            entry = self.entries[key]
+            self._remove_entry(key)
+            by_scope = {}
+            for source in entry["sources"]:
+                by_scope.setdefault(scope_of(source[0]), []).append(source)
+            own_scope = scope_of(entry["file_name"])
+            self._add_entry(key, dict(entry, scope=own_scope, sources=by_scope.pop(own_scope, [[entry["file_name"], entry["chunk_id"]]])))
+            for scope, sources in by_scope.items():
+                new_file, new_chunk_id = sources[0]
+                self._add_entry(chunk_key(new_file, new_chunk_id), dict(
+                    entry, file_name=new_file, chunk_id=new_chunk_id, scope=scope, sources=sources
+                ))
+                copies.append((key, new_file, new_chunk_id))
+        return copies
+
+    def _band_values(self, fingerprint):
+        width = SIMHASH_BITS // self._band_count
+        mask = (1 << width) - 1
+        return [(fingerprint >> (band * width)) & mask for band in range(self._band_count)]
+
+    def _add_entry(self, key, entry):
+        self.entries[key] = entry
+        scope = entry.get("scope")
+        self._by_digest.setdefault((scope, entry["digest"]), key)
+        for band, value in enumerate(self._band_values(entry["simhash"])):
+            self._bands[band].setdefault((scope, value), set()).add(key)
+
+    def _remove_entry(self, key):
+        entry = self.entries.pop(key)
+        scope = entry.get("scope")
+        if self._by_digest.get((scope, entry["digest"])) == key:
+            del self._by_digest[(scope, entry["digest"])]
+        for band, value in enumerate(self._band_values(entry["simhash"])):
+            keys = self._bands[band].get((scope, value))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[band][(scope, value)]
+
+    def save(self, persist_directory):
+        """Atomically writes the index to `persist_directory`."""
+        os.makedirs(persist_directory, exist_ok=True)
+        index_path = os.path.join(persist_directory, DEDUP_INDEX_FILE_NAME)
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"max_distance": self.max_distance, "entries": self.entries}, f)
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def load(cls, persist_directory, max_distance=3):
+        """
+        Loads the index stored in `persist_directory`.
+
+        Returns:
+            DedupIndex | None: None if no readable index exists yet.
+        """
+        index_path = os.path.join(persist_directory, DEDUP_INDEX_FILE_NAME)
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Ignoring unreadable dedup index {index_path}: {e}")
+            return None
+
+        index = cls(max_distance=max_distance)
+        for key, entry in data.get("entries", {}).items():
+            index._add_entry(key, entry)
+        return index
@@ -0,0 +1,24 @@
+"""
+Latency summaries shared by the benchmarks and the campaign generation stats.
+
+Kept free of heavy imports so callers outside the RAG pipeline (e.g.
+agent_app.services.campaign_engine) can use it without loading rag_main.
+"""
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of `values`.
+
+    Args:
+        values (iterable[float]): Samples, in any order.
+        pct (float): Percentile between 0 and 100.
+
+    Returns:
+        float: The sample at that rank, or 0.0 when there are no samples.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
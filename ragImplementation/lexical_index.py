@@ -0,0 +1,146 @@
+"""
+BM25 inverted index over brochure chunks, persisted next to the Chroma
+database so exact project names and numbers can be matched lexically.
+"""
+import json
+import math
+import os
+import re
+from collections import Counter
+
+LEXICAL_INDEX_FILE_NAME = "lexical_index.json"
+
+# Keep figures like 60/40 or 2.5 together with their separators
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[./][0-9]+)*")
+
+
+def tokenize(text):
+    """Lowercases `text` and splits it into alphanumeric terms."""
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def chunk_key(file_name, chunk_id):
+    """Returns the id a chunk is stored under, matching the Chroma ids."""
+    return f"{file_name}_chunk{chunk_id}"
+
+
+class BM25Index:
+    """
+    Okapi BM25 index of chunks keyed by their Chroma id.
+
+    Chunks can be added and whole files removed incrementally; postings are
+    kept as {term: {chunk id: term frequency}}.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = {}
+        self.postings = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add_chunks(self, chunks):
+        """Adds or replaces chunks (dicts with 'file_name', 'chunk_id', 'chunk_text' and optionally 'page')."""
+        for chunk in chunks:
+            doc_id = chunk_key(chunk["file_name"], chunk["chunk_id"])
+            self._remove(doc_id)
+            terms = Counter(tokenize(chunk["chunk_text"]))
+            length = sum(terms.values())
+            self.docs[doc_id] = {
+                "file_name": chunk["file_name"],
+                "chunk_id": chunk["chunk_id"],
+                "text": chunk["chunk_text"],
+                "length": length,
+            }
+            if chunk.get("page") is not None:
+                self.docs[doc_id]["page"] = chunk["page"]
+            self.total_length += length
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+
+    def remove_file(self, file_name):
+        """Removes every chunk of `file_name`."""
+        for doc_id in [d for d, doc in self.docs.items() if doc["file_name"] == file_name]:
+            self._remove(doc_id)
+
+    def remove_chunks(self, doc_ids):
+        """Removes the chunks with the given ids."""
+        for doc_id in doc_ids:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        self.total_length -= doc["length"]
+        for term in set(tokenize(doc["text"])):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+
+    def search(self, query_text, top_k=3, file_filter=None):
+        """
+        Scores chunks against `query_text` with BM25. If `file_filter` is given,
+        only chunks whose file name it accepts are scored.
+
+        Returns:
+            list[tuple[str, float]]: (chunk id, score) pairs, best first.
+        """
+        if not self.docs:
+            return []
+        n_docs = len(self.docs)
+        avg_length = self.total_length / n_docs or 1.0
+        scores = Counter()
+        for term in set(tokenize(query_text)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                if file_filter is not None and not file_filter(self.docs[doc_id]["file_name"]):
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.docs[doc_id]["length"] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+
+    def save(self, persist_directory):
+        """Atomically writes the index to `persist_directory`."""
+        os.makedirs(persist_directory, exist_ok=True)
+        index_path = os.path.join(persist_directory, LEXICAL_INDEX_FILE_NAME)
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "docs": self.docs}, f)
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def load(cls, persist_directory):
+        """
+        Loads the index stored in `persist_directory`.
+
+        Returns:
+            BM25Index | None: None if no readable index exists yet.
+        """
+        index_path = os.path.join(persist_directory, LEXICAL_INDEX_FILE_NAME)
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Ignoring unreadable lexical index {index_path}: {e}")
+            return None
+
+        index = cls(k1=data.get("k1", 1.5), b=data.get("b", 0.75))
+        # Postings are derived from the stored texts rather than persisted
+        index.add_chunks(
+            {"file_name": doc["file_name"], "chunk_id": doc["chunk_id"], "chunk_text": doc["text"],
+             "page": doc.get("page")}
+            for doc in data.get("docs", {}).values()
+        )
+        return index
@@ -0,0 +1,180 @@
+"""
+ONNX Runtime embedding backend.
+
+The sentence-transformers model is exported once to ONNX (optionally with
+int8 dynamic quantization) and then served with onnxruntime and the Rust
+`tokenizers` library, so inference never imports torch. The pipeline mirrors
+sentence-transformers: tokenize (truncated at max_seq_length) -> transformer
+-> attention-masked mean pooling -> L2 normalization when the model has a
+Normalize module.
+"""
+import json
+import os
+
+import numpy as np
+
+ONNX_MODEL_FILE_NAME = "model.onnx"
+ONNX_QUANTIZED_FILE_NAME = "model_int8.onnx"
+ONNX_CONFIG_FILE_NAME = "onnx_config.json"
+TOKENIZER_FILE_NAME = "tokenizer.json"
+
+# Minimum cosine similarity to the torch vectors of the same text. Vectors
+# within this tolerance can be mixed with an existing collection.
+MIN_COSINE = {"fp32": 0.999, "int8": 0.98}
+
+
+def onnx_model_dir(base_dir, model_name):
+    """Folder holding the exported files of `model_name` under `base_dir`."""
+    return os.path.join(base_dir, model_name.replace("/", "__"))
+
+
+def export_onnx_model(model_name, output_dir, quantize=False, opset=14):
+    """
+    Exports a sentence-transformers model to ONNX. Needs torch, transformers
+    and onnx; files that already exist are kept.
+
+    Args:
+        model_name (str): HuggingFace model name or local path.
+        output_dir (str): Folder for model.onnx, tokenizer.json and onnx_config.json.
+        quantize (bool): Also write the int8 dynamically quantized model.
+        opset (int): ONNX opset version.
+
+    Returns:
+        str: `output_dir`.
+    """
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE_NAME)
+    if not os.path.exists(model_path):
+        _export_float_model(model_name, output_dir, opset)
+
+    quantized_path = os.path.join(output_dir, ONNX_QUANTIZED_FILE_NAME)
+    if quantize and not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        print(f"[RAG] Quantizing {model_path} to int8")
+        tmp_path = f"{quantized_path}.{os.getpid()}.tmp"
+        quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, quantized_path)
+    return output_dir
+
+
+def _export_float_model(model_name, output_dir, opset):
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    print(f"[RAG] Exporting {model_name} to ONNX in {output_dir}")
+    sentence_model = SentenceTransformer(model_name, device="cpu")
+    transformer = sentence_model[0]
+    modules = list(sentence_model)
+    pooling = next((m for m in modules if isinstance(m, Pooling)), None)
+    if pooling is None or pooling.get_pooling_mode_str() != "mean":
+        raise ValueError(f"{model_name} does not use mean pooling, which the ONNX backend implements")
+
+    tokenizer = transformer.tokenizer
+    auto_model = transformer.auto_model.eval()
+    sample = tokenizer(["warm up", "a longer warm up sentence"], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    os.makedirs(output_dir, exist_ok=True)
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE_NAME)
+    tmp_path = f"{model_path}.{os.getpid()}.tmp"
+    axes = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(auto_model),
+            tuple(sample[name] for name in input_names),
+            tmp_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={**{name: axes for name in input_names}, "last_hidden_state": axes},
+            opset_version=opset,
+            dynamo=False,
+        )
+
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE_NAME), "w", encoding="utf-8") as f:
+        json.dump({
+            "model_name": model_name,
+            "max_seq_length": sentence_model.max_seq_length,
+            "normalize": any(isinstance(m, Normalize) for m in modules),
+            "input_names": input_names,
+            "pad_token": tokenizer.pad_token,
+            "pad_token_id": tokenizer.pad_token_id,
+        }, f)
+    # The model file goes last: its presence marks a complete export
+    os.replace(tmp_path, model_path)
+
+
+class OnnxEmbeddings:
+    """
+    Embeds texts with an exported ONNX model. Implements the embed_documents
+    and embed_query methods langchain expects from an embedding model.
+    """
+
+    def __init__(self, model_dir, quantized=False, batch_size=64, threads=None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILE_NAME), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.batch_size = batch_size
+        self.quantized = quantized
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE_NAME))
+        self.tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        file_name = ONNX_QUANTIZED_FILE_NAME if quantized else ONNX_MODEL_FILE_NAME
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, file_name), options, providers=["CPUExecutionProvider"]
+        )
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        vectors = [None] * len(texts)
+        # Batch texts of similar length together to keep padding short
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def _embed_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        arrays = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: arrays[name] for name in self.config["input_names"]})[0]
+
+        mask = arrays["attention_mask"][:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.config["normalize"]:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled
+
+
+def min_cosine_similarity(reference, candidate):
+    """Lowest cosine similarity between paired rows of two embedding lists."""
+    reference = np.asarray(reference, dtype=np.float64)
+    candidate = np.asarray(candidate, dtype=np.float64)
+    dots = (reference * candidate).sum(axis=1)
+    norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    return float(np.min(dots / np.clip(norms, 1e-12, None)))
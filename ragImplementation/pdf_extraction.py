@@ -0,0 +1,111 @@
+"""
+PDF text extraction helpers used by rag_main.load_documents.
+
+Kept free of langchain/torch imports so process-pool workers start quickly.
+"""
+import hashlib
+
+import pdfplumber
+from PyPDF2 import PdfReader
+
+
+def count_pages(file_path):
+    """Returns the number of pages pdfplumber sees in a PDF."""
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_with_pdfplumber(file_path, start=0, end=None):
+    """
+    Extracts the text of pages [start, end) with pdfplumber.
+
+    Returns:
+        list[str]: One string per page ('' for pages without text).
+    """
+    with pdfplumber.open(file_path) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages[start:end]]
+
+
+def extract_pages_with_pypdf2(file_path):
+    """
+    Extracts the text of every page of a PDF with PyPDF2.
+
+    Returns:
+        list[str]: One string per page ('' for pages without text).
+    """
+    with open(file_path, 'rb') as f:
+        reader = PdfReader(f)
+        return [page.extract_text() or "" for page in reader.pages]
+
+
+def extract_with_pypdf2(file_path):
+    """Extracts the whole text of a PDF with PyPDF2."""
+    return "".join(extract_pages_with_pypdf2(file_path))
+
+
+def join_pdfplumber_pages(page_texts):
+    """Joins pdfplumber page texts the way load_documents always has."""
+    return "".join(page_text + "\n" for page_text in page_texts)
+
+
+def extract_pdf_text(file_path):
+    """
+    Extracts the text of a PDF with pdfplumber, falling back to PyPDF2 if
+    pdfplumber fails. Raises if both fail.
+    """
+    try:
+        # First try with pdfplumber
+        return join_pdfplumber_pages(extract_with_pdfplumber(file_path))
+    except Exception:
+        # Fallback to PyPDF2 if pdfplumber fails
+        return extract_with_pypdf2(file_path)
+
+
+def iter_pdf_pages(source):
+    """
+    Yields (page_number, text) for every page of a PDF, one page at a time.
+
+    `source` is a file path or a seekable binary file-like object (e.g. an
+    in-memory upload buffer), which is read in place and not closed.
+
+    pdfplumber is tried first and each page's parse cache is released as soon
+    as its text is extracted. If pdfplumber fails, the remaining pages are read
+    with PyPDF2. Raises if neither library can read the file.
+    """
+    pages_read = 0
+    try:
+        if hasattr(source, "seek"):
+            source.seek(0)
+        with pdfplumber.open(source) as pdf:
+            for page in pdf.pages:
+                text = page.extract_text() or ""
+                page.close()
+                pages_read += 1
+                yield pages_read, text
+        return
+    except Exception:
+        pass
+
+    # Fallback to PyPDF2 for the pages pdfplumber could not read
+    if hasattr(source, "seek"):
+        source.seek(0)
+        yield from _iter_pypdf2_pages(source, pages_read)
+        return
+    with open(source, 'rb') as f:
+        yield from _iter_pypdf2_pages(f, pages_read)
+
+
+def _iter_pypdf2_pages(stream, start):
+    reader = PdfReader(stream)
+    for index in range(start, len(reader.pages)):
+        yield index + 1, reader.pages[index].extract_text() or ""
+
+
+def stream_content_hash(stream, block_size=1024 * 1024):
+    """Returns the SHA-256 hex digest of a seekable binary stream, read in blocks from the start."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for block in iter(lambda: stream.read(block_size), b""):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
@@ -1,15 +1,83 @@
 import os
 import re
-import pdfplumber
-from PyPDF2 import PdfReader
+import json
+import time
+import threading
+import multiprocessing
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from datetime import datetime, timezone
+from pdf_extraction import (
+    count_pages,
+    extract_pdf_text,
+    extract_with_pdfplumber,
+    extract_pages_with_pypdf2,
+    iter_pdf_pages,
+    join_pdfplumber_pages,
+    stream_content_hash,
+)
+from lexical_index import BM25Index, chunk_key
+from dedup import DEDUP_INDEX_FILE_NAME, DedupIndex
+from vector_index import VectorIndex, write_vector_index
+from chunking import TokenCounter, iter_token_chunks
+import context_packing
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Use environment variable if set (for Render), otherwise use local path
 CHROMA_DB_PATH = os.environ.get('CHROMA_DB_PATH', os.path.join(BASE_DIR, "chroma_db"))
 RAG_PDFS_PATH = os.environ.get('RAG_PDFS_PATH', os.path.join(BASE_DIR, "pdfs"))
-
-
-def load_documents(folder_path):
+EMBEDDING_MODEL_NAME = os.environ.get('RAG_EMBEDDING_MODEL', "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_BATCH_SIZE = int(os.environ.get('RAG_EMBEDDING_BATCH_SIZE', '64'))
+COLLECTION_NAME = "brochure_vectors"
+# Embedding inference: 'torch' (sentence-transformers) or 'onnx' (see onnx_embeddings.py)
+EMBEDDING_BACKENDS = ("torch", "onnx")
+EMBEDDING_BACKEND = os.environ.get('RAG_EMBEDDING_BACKEND', 'torch')
+ONNX_MODEL_DIR = os.environ.get('RAG_ONNX_MODEL_DIR', os.path.join(BASE_DIR, "onnx_models"))
+# Serve the int8 dynamically quantized ONNX model
+ONNX_QUANTIZE = os.environ.get('RAG_ONNX_QUANTIZE', 'False') == 'True'
+# Chunking: 'tokens' (page-anchored, sized in embedding model tokens, see chunking.py)
+# or 'chars' (RecursiveCharacterTextSplitter over the whole document)
+CHUNKERS = ("chars", "tokens")
+CHUNKER = os.environ.get('RAG_CHUNKER', 'tokens')
+# all-MiniLM-L6-v2 reads at most 256 word pieces (max_seq_length), [CLS] and
+# [SEP] included, so a chunk may hold 254 tokens before its tail is truncated
+CHUNK_TOKENS = int(os.environ.get('RAG_CHUNK_TOKENS', '254'))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get('RAG_CHUNK_OVERLAP_TOKENS', '32'))
+# Default (chunk_size, chunk_overlap) per chunker, in characters or tokens
+CHUNK_DEFAULTS = {"chars": (1000, 100), "tokens": (CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)}
+# Token budget for the brochure context passed to the LLM (see pack_context)
+CONTEXT_TOKENS = int(os.environ.get('RAG_CONTEXT_TOKENS', '768'))
+# Smallest piece of a chunk worth packing when the budget is nearly spent
+CONTEXT_MIN_PARTIAL_TOKENS = int(os.environ.get('RAG_CONTEXT_MIN_PARTIAL_TOKENS', '32'))
+# Parallel PDF extraction (1 worker = the serial loop)
+PDF_EXTRACT_WORKERS = int(os.environ.get('RAG_PDF_WORKERS', '1'))
+PDF_EXTRACT_TIMEOUT = float(os.environ.get('RAG_PDF_TIMEOUT', '300'))
+PDF_PAGES_PER_TASK = int(os.environ.get('RAG_PDF_PAGES_PER_TASK', '8'))
+# Retrieval result cache
+QUERY_CACHE_SIZE = int(os.environ.get('RAG_QUERY_CACHE_SIZE', '512'))
+QUERY_CACHE_TTL = float(os.environ.get('RAG_QUERY_CACHE_TTL', '600'))
+# Seconds between health checks of the pooled Chroma handle
+VECTORSTORE_HEALTH_INTERVAL = float(os.environ.get('RAG_VECTORSTORE_HEALTH_INTERVAL', '30'))
+
+# Retrieval modes: 'vector' (Chroma only), 'lexical' (BM25 only) or 'hybrid'
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+SEARCH_MODE = os.environ.get('RAG_SEARCH_MODE', 'vector')
+# Candidates taken from each retriever before reciprocal rank fusion
+HYBRID_CANDIDATES = int(os.environ.get('RAG_HYBRID_CANDIDATES', '20'))
+HYBRID_RRF_K = 60
+
+# Vector search backend: 'chroma' or 'numpy' (memory-mapped snapshot, see vector_index.py)
+VECTOR_BACKENDS = ("chroma", "numpy")
+VECTOR_BACKEND = os.environ.get('RAG_VECTOR_BACKEND', 'chroma')
+
+# Store exact and near-duplicate chunks once (see dedup.py)
+DEDUP_ENABLED = os.environ.get('RAG_DEDUP', 'True') == 'True'
+# Max SimHash bit distance (of 64) for two chunks to count as near-duplicates
+DEDUP_MAX_DISTANCE = int(os.environ.get('RAG_DEDUP_MAX_DISTANCE', '3'))
+
+
+def load_documents(folder_path, file_names=None, workers=None, timeout=None):
     print("----------------------------------step1: pdf to text----------------------------------")
 
     """
@@ -17,9 +85,14 @@ def load_documents(folder_path):
 
     Args:
         folder_path (str): Path to the folder containing PDF files.
+        file_names (list[str], optional): Only load these files from the folder.
+        workers (int, optional): Process pool size; 1 runs the serial loop.
+                                 Defaults to RAG_PDF_WORKERS.
+        timeout (float, optional): Per-file timeout in seconds for the parallel
+                                   mode. Defaults to RAG_PDF_TIMEOUT.
 
     Returns:
-        list[dict]: A list of dictionaries, each containing:
+        list[dict]: A list of dictionaries (sorted by file name), each containing:
             - 'file_name': name of the PDF file
             - 'text': extracted text content
     """
@@ -30,37 +103,139 @@ def load_documents(folder_path):
         print(f"Warning: Folder not found: {folder_path}")
         return documents
 
-    for file_name in os.listdir(folder_path):
-        if file_name.lower().endswith('.pdf'):
-            file_path = os.path.join(folder_path, file_name)
-            text = ""
+    pdf_names = sorted(
+        file_name for file_name in os.listdir(folder_path)
+        if file_name.lower().endswith('.pdf') and (file_names is None or file_name in file_names)
+    )
+
+    workers = PDF_EXTRACT_WORKERS if workers is None else workers
+    if workers > 1 and pdf_names:
+        return _load_documents_parallel(
+            [os.path.join(folder_path, file_name) for file_name in pdf_names],
+            workers=workers,
+            timeout=PDF_EXTRACT_TIMEOUT if timeout is None else timeout
+        )
+
+    for file_name in pdf_names:
+        file_path = os.path.join(folder_path, file_name)
+
+        try:
+            # pdfplumber first, PyPDF2 as fallback
+            text = extract_pdf_text(file_path)
+        except Exception as e:
+            print(f"Failed to read {file_name}: {e}")
+            continue
+
+        documents.append({
+            "file_name": file_name,
+            "text": text.strip()
+        })
+
+    return documents
+
 
+def _load_documents_parallel(file_paths, workers, timeout, pages_per_task=PDF_PAGES_PER_TASK, with_pages=False):
+    """
+    Parallel variant of load_documents. Every file is split into page ranges
+    that are extracted by a process pool; a file whose pdfplumber extraction
+    fails anywhere is re-read whole with PyPDF2. A file whose results are not
+    back within `timeout` seconds is skipped, and the workers still busy with
+    it are terminated. Results keep the order of `file_paths`. With
+    `with_pages`, documents also carry their page texts under 'pages'.
+    """
+    documents = []
+    # spawn: workers only import pdf_extraction, and we never fork a process
+    # that holds torch/chroma threads
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    timed_out = set()
+
+    try:
+        # Fan out: count pages, then queue one pdfplumber task per page range
+        page_counts = {file_path: pool.submit(count_pages, file_path) for file_path in file_paths}
+        page_tasks = {}
+        for file_path in file_paths:
             try:
-                # First try with pdfplumber
-                with pdfplumber.open(file_path) as pdf:
-                    for page in pdf.pages:
-                        page_text = page.extract_text() or ""
-                        text += page_text + "\n"
-
-            except Exception as e:
-                # Fallback to PyPDF2 if pdfplumber fails
-                try:
-                    with open(file_path, 'rb') as f:
-                        reader = PdfReader(f)
-                        for page in reader.pages:
-                            text += page.extract_text() or ""
-                except Exception as inner_e:
-                    print(f"Failed to read {file_name}: {inner_e}")
-                    continue
+                pages = page_counts[file_path].result(timeout=timeout)
+            except FuturesTimeoutError:
+                timed_out.add(file_path)
+                continue
+            except Exception:
+                # pdfplumber cannot open it; the PyPDF2 fallback runs below
+                page_tasks[file_path] = None
+                continue
+            page_tasks[file_path] = [
+                pool.submit(extract_with_pdfplumber, file_path, start, min(start + pages_per_task, pages))
+                for start in range(0, pages, pages_per_task)
+            ]
+
+        # Fan in, in the original file order
+        for file_path in file_paths:
+            file_name = os.path.basename(file_path)
 
-            documents.append({
+            try:
+                if file_path in timed_out:
+                    raise FuturesTimeoutError()
+                pages = _collect_parallel_pages(pool, file_path, page_tasks[file_path], time.monotonic() + timeout)
+            except FuturesTimeoutError:
+                print(f"[WARNING] Timed out after {timeout}s reading {file_name}, skipping")
+                timed_out.add(file_path)
+                continue
+            except Exception as inner_e:
+                print(f"Failed to read {file_name}: {inner_e}")
+                continue
+
+            document = {
                 "file_name": file_name,
-                "text": text.strip()
-            })
+                "text": join_pdfplumber_pages(pages).strip()
+            }
+            if with_pages:
+                document["pages"] = pages
+            documents.append(document)
+    finally:
+        _shutdown_pool(pool, terminate=bool(timed_out))
 
     return documents
 
 
+def _shutdown_pool(pool, terminate=False):
+    """
+    Shuts an extraction pool down. With `terminate`, workers still stuck on a
+    timed-out file are killed instead of waited for, so they neither hold a
+    CPU nor block interpreter exit.
+    """
+    if not terminate:
+        pool.shutdown(wait=True)
+        return
+    # Snapshot before shutdown, which forgets the processes
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(timeout=5)
+
+
+
+def _collect_parallel_pages(pool, file_path, tasks, deadline):
+    """
+    Collects the pdfplumber page texts of one file, or re-reads its pages with
+    PyPDF2 if any range failed. Timeouts are raised to the caller.
+    """
+    def remaining():
+        return max(0, deadline - time.monotonic())
+
+    if tasks is not None:
+        try:
+            return [page_text for task in tasks for page_text in task.result(timeout=remaining())]
+        except FuturesTimeoutError:
+            raise
+        except Exception:
+            pass
+
+    # Fallback to PyPDF2 if pdfplumber fails
+    return pool.submit(extract_pages_with_pypdf2, file_path).result(timeout=remaining())
+
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
@@ -94,14 +269,227 @@ def split_into_chunks(documents, chunk_size=1000, chunk_overlap=100):
     return chunks
 
 
+def iter_chunks(file_name, pages, chunk_size=1000, chunk_overlap=100, window_chunks=8):
+    """
+    Streams the chunks of one document from an iterable of page texts.
+
+    Pages are buffered until about `window_chunks` chunks worth of text is
+    available, the buffer is split, and every chunk but the last is yielded.
+    The last chunk is carried into the next window, so memory stays bounded by
+    one window no matter how many pages the document has.
+
+    Yields:
+        dict: {'file_name', 'chunk_id', 'chunk_text'}, like split_into_chunks.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    window = chunk_size * window_chunks
+
+    parts = []
+    size = 0
+    chunk_id = 0
+
+    for page_text in pages:
+        parts.append(page_text + "\n")
+        size += len(page_text) + 1
+        if size < window:
+            continue
+
+        split_texts = text_splitter.split_text("".join(parts))
+        for chunk in split_texts[:-1]:
+            chunk_id += 1
+            yield {"file_name": file_name, "chunk_id": chunk_id, "chunk_text": chunk}
+
+        # The buffer always ends on a page break, and so does its last chunk
+        parts = [split_texts[-1] + "\n"] if split_texts else []
+        size = len(parts[0]) if parts else 0
+
+    tail = "".join(parts)
+    if tail.strip():
+        for chunk in text_splitter.split_text(tail):
+            chunk_id += 1
+            yield {"file_name": file_name, "chunk_id": chunk_id, "chunk_text": chunk}
+
+
+# Token counters per embedding model, built once per process
+_token_counters = {}
+_token_counters_lock = threading.Lock()
+
+
+def get_token_counter(model_name=EMBEDDING_MODEL_NAME, load_model=True):
+    """
+    Returns a chunking.TokenCounter using the tokenizer of the resident
+    embedding model, so chunks are measured exactly as the model reads them.
+    Models without a `tokenizers` tokenizer get the approximate counter, as
+    do callers passing `load_model=False` while the model is not loaded yet.
+    """
+    counter = _token_counters.get(model_name)
+    if counter is None and not load_model:
+        with _embedding_models_lock:
+            resident = any(name == model_name for _, name in _embedding_models)
+        if not resident:
+            return TokenCounter()
+    if counter is None:
+        with _token_counters_lock:
+            counter = _token_counters.get(model_name)
+            if counter is None:
+                model = get_embedding_model(model_name)
+                tokenizer = _model_tokenizer(model)
+                if tokenizer is None:
+                    print(f"[WARNING] No tokenizer available for {model_name}; chunk sizes are approximate")
+                counter = TokenCounter(tokenizer)
+                _token_counters[model_name] = counter
+    return counter
+
+
+def _model_tokenizer(model):
+    # OnnxEmbeddings holds a tokenizers.Tokenizer; sentence-transformers a fast HF tokenizer
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        tokenizer = getattr(getattr(model, "client", None), "tokenizer", None)
+    tokenizer = getattr(tokenizer, "backend_tokenizer", tokenizer)
+    return tokenizer if hasattr(tokenizer, "to_str") else None
+
+
+def resolve_chunking(chunker=None, chunk_size=None, chunk_overlap=None):
+    """
+    Fills in the defaults of a chunking configuration.
+
+    Returns:
+        tuple: (chunker, chunk_size, chunk_overlap), sizes in characters for
+        'chars' and in tokens for 'tokens'.
+    """
+    chunker = chunker or CHUNKER
+    if chunker not in CHUNKERS:
+        raise ValueError(f"Unknown chunker '{chunker}', expected one of {', '.join(CHUNKERS)}")
+    default_size, default_overlap = CHUNK_DEFAULTS[chunker]
+    return (
+        chunker,
+        default_size if chunk_size is None else chunk_size,
+        default_overlap if chunk_overlap is None else chunk_overlap,
+    )
+
+
+def iter_document_chunks(file_name, pages, chunker=None, chunk_size=None, chunk_overlap=None):
+    """
+    Streams the chunks of one document with the configured chunker. Chunks
+    from the 'tokens' chunker also carry their 'page' number.
+    """
+    chunker, chunk_size, chunk_overlap = resolve_chunking(chunker, chunk_size, chunk_overlap)
+    if chunker == "tokens":
+        return iter_token_chunks(file_name, pages, get_token_counter(), chunk_size, chunk_overlap)
+    return iter_chunks(file_name, pages, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def count_tokens(text):
+    """Tokens in `text` under the embedding model's tokenizer (approximate if it is not loaded)."""
+    return get_token_counter(load_model=False).count(text or "")
+
+
+def pack_context(documents, max_tokens=None):
+    """
+    Packs ranked retrieved chunks into the context passed to the LLM: chunks
+    already covered by a better-ranked chunk are dropped, overlapping text is
+    trimmed and the rest fills at most `max_tokens` tokens (default
+    RAG_CONTEXT_TOKENS). See context_packing.py.
+
+    Returns:
+        tuple[str, dict]: The context and the packing stats.
+    """
+    return context_packing.pack_context(
+        documents,
+        get_token_counter(load_model=False),
+        CONTEXT_TOKENS if max_tokens is None else max_tokens,
+        min_partial_tokens=CONTEXT_MIN_PARTIAL_TOKENS,
+    )
+
 
 from langchain_community.embeddings import HuggingFaceEmbeddings
 
-def generate_embeddings(chunks):
+# Process-wide embedding model registry: each worker loads a model once and
+# shares it between ingestion and every query thread.
+_embedding_models = {}
+_embedding_models_lock = threading.Lock()
+
+
+def get_embedding_model(model_name=EMBEDDING_MODEL_NAME, backend=None):
+    """
+    Returns the resident embedding model for `model_name`, loading it on first use.
+
+    Args:
+        model_name (str): HuggingFace model name.
+        backend (str, optional): 'torch' (sentence-transformers) or 'onnx'
+                                 (ONNX Runtime). Defaults to RAG_EMBEDDING_BACKEND.
+
+    Returns:
+        HuggingFaceEmbeddings | OnnxEmbeddings: The shared embedding model instance.
+    """
+    backend = backend or EMBEDDING_BACKEND
+    model = _embedding_models.get((backend, model_name))
+    if model is not None:
+        return model
+
+    with _embedding_models_lock:
+        # Another thread may have finished loading while we waited for the lock
+        model = _embedding_models.get((backend, model_name))
+        if model is None:
+            print(f"[RAG] Loading embedding model {model_name} ({backend})")
+            model = _load_embedding_model(model_name, backend)
+            _embedding_models[(backend, model_name)] = model
+    return model
+
+
+def _load_embedding_model(model_name, backend):
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {', '.join(EMBEDDING_BACKENDS)}")
+    if backend == "torch":
+        return HuggingFaceEmbeddings(
+            model_name=model_name,
+            encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE}
+        )
+
+    # Imported here so the torch backend does not need onnxruntime
+    from onnx_embeddings import (
+        ONNX_MODEL_FILE_NAME,
+        ONNX_QUANTIZED_FILE_NAME,
+        OnnxEmbeddings,
+        export_onnx_model,
+        onnx_model_dir,
+    )
+
+    model_dir = onnx_model_dir(ONNX_MODEL_DIR, model_name)
+    file_name = ONNX_QUANTIZED_FILE_NAME if ONNX_QUANTIZE else ONNX_MODEL_FILE_NAME
+    if not os.path.exists(os.path.join(model_dir, file_name)):
+        # One-off export; needs torch and onnx, serving afterwards does not
+        export_onnx_model(model_name, model_dir, quantize=ONNX_QUANTIZE)
+    return OnnxEmbeddings(model_dir, quantized=ONNX_QUANTIZE, batch_size=EMBEDDING_BATCH_SIZE)
+
+
+def warm_up_embedding_model(model_name=EMBEDDING_MODEL_NAME):
+    """
+    Loads the embedding model and runs one dummy embedding so the first real
+    request does not pay the model load.
+    """
+    model = get_embedding_model(model_name)
+    model.embed_query("warm up")
+    return model
+
+
+def clear_embedding_models():
+    """Drops all resident embedding models (used by tests and benchmarks)."""
+    with _embedding_models_lock:
+        _embedding_models.clear()
+    with _token_counters_lock:
+        _token_counters.clear()
+
+
+def generate_embeddings(chunks, batch_size=EMBEDDING_BATCH_SIZE):
     print("----------------------------------step3: generating embeddings----------------------------------")
 
     """
-    Generates embeddings for each text chunk using a local model
+    Generates embeddings for the text chunks in batches using a local model
     (sentence-transformers/all-MiniLM-L6-v2).
 
     Args:
@@ -109,6 +497,7 @@ def generate_embeddings(chunks):
                              - 'file_name'
                              - 'chunk_id'
                              - 'chunk_text'
+        batch_size (int): Number of chunks sent to the model per call.
 
     Returns:
         list[dict]: Each dict contains:
@@ -117,36 +506,55 @@ def generate_embeddings(chunks):
                     - 'chunk_text'
                     - 'embedding' (list of floats)
     """
-    # Initialize the local embedding model
-    embeddings_model = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
+    return [chunk for batch in iter_embedded_batches(chunks, batch_size) for chunk in batch]
 
-    embedded_chunks = []
 
-    for chunk in chunks:
-        text = chunk["chunk_text"]
-        vector = embeddings_model.embed_query(text)
+def iter_embedded_batches(chunks, batch_size=EMBEDDING_BATCH_SIZE):
+    """
+    Embeds an iterable of chunks `batch_size` at a time with one
+    embed_documents call per batch.
 
-        embedded_chunks.append({
+    Yields:
+        list[dict]: The batch's chunks, each with an added 'embedding'.
+    """
+    # Reuse the resident embedding model
+    embeddings_model = get_embedding_model()
+
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            yield _embed_batch(embeddings_model, batch)
+            batch = []
+    if batch:
+        yield _embed_batch(embeddings_model, batch)
+
+
+def _embed_batch(embeddings_model, batch):
+    vectors = embeddings_model.embed_documents([chunk["chunk_text"] for chunk in batch])
+    return [
+        {
             "file_name": chunk["file_name"],
             "chunk_id": chunk["chunk_id"],
-            "chunk_text": text,
-            "embedding": vector
-        })
-
-    return embedded_chunks
+            "chunk_text": chunk["chunk_text"],
+            "page": chunk.get("page"),
+            "embedding": list(vector)
+        }
+        for chunk, vector in zip(batch, vectors)
+    ]
 
 
 
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.documents import Document
 
-def store_in_chromadb(chunks, persist_directory=CHROMA_DB_PATH):
+def store_in_chromadb(chunks, persist_directory=CHROMA_DB_PATH, batch_size=EMBEDDING_BATCH_SIZE):
     print("----------------------------------step4: storing in chromadb----------------------------------")
 
     """
-    Stores all chunks and their embeddings into a persistent ChromaDB collection.
+    Stores all chunks and their precomputed embeddings into a persistent
+    ChromaDB collection. Chunks are not embedded again; only chunks that
+    arrive without an 'embedding' are sent to the model.
 
     Args:
         chunks (list[dict]): Each dict must contain:
@@ -155,77 +563,1193 @@ def store_in_chromadb(chunks, persist_directory=CHROMA_DB_PATH):
                              - 'chunk_text'
                              - 'embedding'
         persist_directory (str): Folder path to persist the Chroma database.
+        batch_size (int): Number of chunks written to Chroma per upsert.
 
     Returns:
         Chroma: A Chroma vector store instance.
     """
-    # Initialize the same embeddings model used earlier
-    embedding_model = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
+    # Embed only the chunks that were not embedded upstream
+    missing = [chunk for chunk in chunks if not chunk.get("embedding")]
+    if missing:
+        vectors = {
+            (c["file_name"], c["chunk_id"]): c["embedding"]
+            for c in generate_embeddings(missing, batch_size=batch_size)
+        }
+        chunks = [
+            dict(chunk, embedding=vectors[(chunk["file_name"], chunk["chunk_id"])])
+            if not chunk.get("embedding") else chunk
+            for chunk in chunks
+        ]
+
+    # Create or load Chroma collection
+    vectorstore = get_vectorstore(persist_directory)
+
+    # Write the precomputed vectors straight into the collection
+    for start in range(0, len(chunks), batch_size):
+        _upsert_chunks(vectorstore, chunks[start:start + batch_size])
+
+    update_lexical_index(persist_directory, chunks=chunks)
+    bump_collection_version(persist_directory)
+    return vectorstore
+
+
+def _open_vectorstore(persist_directory=CHROMA_DB_PATH):
+    os.makedirs(persist_directory, exist_ok=True)
+    return Chroma(
+        persist_directory=persist_directory,
+        collection_name=COLLECTION_NAME,
+        embedding_function=get_embedding_model()
     )
 
-    # Ensure directory exists
+
+# Long-lived, per-process Chroma handles keyed by persist directory
+_vectorstores = {}
+_vectorstores_lock = threading.Lock()
+
+
+def get_vectorstore(persist_directory=None):
+    """
+    Returns this process's shared Chroma handle for `persist_directory`.
+
+    The handle is opened lazily, re-checked with a cheap count() every
+    RAG_VECTORSTORE_HEALTH_INTERVAL seconds and reopened if that fails or if
+    the collection version changed since it was opened. Safe to call from
+    concurrent request threads.
+    """
+    persist_directory = persist_directory or os.environ.get('CHROMA_DB_PATH', CHROMA_DB_PATH)
+    version = get_collection_version(persist_directory)
+
+    handle = _vectorstores.get(persist_directory)
+    if handle is not None and _handle_is_usable(handle, version):
+        return handle["store"]
+
+    with _vectorstores_lock:
+        # Another thread may have reopened it while we waited for the lock
+        handle = _vectorstores.get(persist_directory)
+        if handle is not None and _handle_is_usable(handle, version):
+            return handle["store"]
+
+        store = _open_vectorstore(persist_directory)
+        _vectorstores[persist_directory] = {
+            "store": store,
+            "version": version,
+            "checked_at": time.monotonic(),
+        }
+        return store
+
+
+def _handle_is_usable(handle, version):
+    if handle["version"] != version:
+        return False
+    if time.monotonic() - handle["checked_at"] < VECTORSTORE_HEALTH_INTERVAL:
+        return True
+    try:
+        handle["store"]._collection.count()
+    except Exception as e:
+        print(f"[WARNING] Chroma handle failed health check, reopening: {e}")
+        return False
+    handle["checked_at"] = time.monotonic()
+    return True
+
+
+def refresh_vectorstore(persist_directory=None):
+    """Drops the pooled handle so the next get_vectorstore call reopens it."""
+    persist_directory = persist_directory or os.environ.get('CHROMA_DB_PATH', CHROMA_DB_PATH)
+    with _vectorstores_lock:
+        _vectorstores.pop(persist_directory, None)
+
+
+def _upsert_chunks(vectorstore, chunks):
+    """Writes embedded chunks into the collection without re-embedding them."""
+    vectorstore._collection.upsert(
+        ids=[chunk_key(chunk["file_name"], chunk["chunk_id"]) for chunk in chunks],
+        embeddings=[chunk["embedding"] for chunk in chunks],
+        documents=[chunk["chunk_text"] for chunk in chunks],
+        metadatas=[chunk_metadata(chunk["file_name"], chunk["chunk_id"], chunk.get("page")) for chunk in chunks]
+    )
+
+
+# Trailing words in brochure file names that are not part of the project name
+PROJECT_NAME_NOISE = {"brochure", "brochures", "details", "detail", "factsheet", "pricelist", "copy", "final"}
+
+
+def project_key(name):
+    """
+    Normalizes a project name or brochure file name to the key stored in chunk
+    metadata, e.g. 'DLF West Park details.pdf' and 'DLF West Park' both give
+    'dlf-west-park'.
+    """
+    name = re.sub(r"\.pdf$", "", (name or "").strip(), flags=re.IGNORECASE)
+    tokens = re.findall(r"[a-z0-9]+", name.lower())
+    while len(tokens) > 1 and tokens[-1] in PROJECT_NAME_NOISE:
+        tokens.pop()
+    return "-".join(tokens)
+
+
+def chunk_metadata(file_name, chunk_id, page=None):
+    """Metadata stored with every chunk in Chroma; 'page' only for page-anchored chunks."""
+    metadata = {"file_name": file_name, "chunk_id": chunk_id, "project": project_key(file_name)}
+    if page is not None:
+        metadata["page"] = page
+    return metadata
+
+
+def project_filter(projects):
+    """
+    Builds the Chroma `where` clause restricting a search to `projects`.
+
+    Returns:
+        tuple[tuple[str], dict | None]: The sorted, de-duplicated project keys
+        and the clause (None when no projects are given).
+    """
+    keys = tuple(sorted({project_key(p) for p in projects or [] if project_key(p)}))
+    if not keys:
+        return keys, None
+    if len(keys) == 1:
+        return keys, {"project": keys[0]}
+    return keys, {"project": {"$in": list(keys)}}
+
+
+PROJECT_METADATA_VERSION = 2
+
+
+def backfill_project_metadata(persist_directory=CHROMA_DB_PATH):
+    """
+    Adds the 'project' key to chunks stored before project metadata existed.
+
+    Returns:
+        int: Number of chunks updated.
+    """
+    collection = get_vectorstore(persist_directory)._collection
+    stored = collection.get(include=["metadatas"])
+    ids, metadatas = [], []
+    for chunk_id, metadata in zip(stored["ids"], stored["metadatas"]):
+        if metadata and "project" not in metadata:
+            ids.append(chunk_id)
+            metadatas.append(dict(metadata, project=project_key(metadata["file_name"])))
+    for start in range(0, len(ids), EMBEDDING_BATCH_SIZE):
+        collection.update(ids=ids[start:start + EMBEDDING_BATCH_SIZE], metadatas=metadatas[start:start + EMBEDDING_BATCH_SIZE])
+    if ids:
+        print(f"[RAG] Added project metadata to {len(ids)} chunks")
+        bump_collection_version(persist_directory)
+    return len(ids)
+
+
+VERSION_FILE_NAME = "collection_version"
+
+
+def get_collection_version(persist_directory=CHROMA_DB_PATH):
+    """
+    Returns the collection version token written by the last ingestion into
+    `persist_directory` ('' if nothing was ever ingested there).
+    """
+    try:
+        with open(os.path.join(persist_directory, VERSION_FILE_NAME), "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def bump_collection_version(persist_directory=CHROMA_DB_PATH):
+    """
+    Marks the collection as changed. Every worker process sees the new token on
+    its next lookup and drops its cached query results. Inside an
+    ingestion_batch the bump happens once, when the batch ends.
+    """
+    with _lexical_lock:
+        batch = _current_batch(persist_directory)
+        if batch is not None:
+            batch["bump"] = True
+            return
+    _write_collection_version(persist_directory)
+
+
+def _write_collection_version(persist_directory):
     os.makedirs(persist_directory, exist_ok=True)
+    version_path = os.path.join(persist_directory, VERSION_FILE_NAME)
+    tmp_path = f"{version_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(f"{time.time_ns()}-{os.getpid()}")
+    os.replace(tmp_path, version_path)
+    refresh_vectorstore(persist_directory)
 
-    # Prepare data for Chroma
-    ids = [f"{chunk['file_name']}_chunk{chunk['chunk_id']}" for chunk in chunks]
-    texts = [chunk["chunk_text"] for chunk in chunks]
-    metadatas = [{"file_name": chunk["file_name"], "chunk_id": chunk["chunk_id"]} for chunk in chunks]
 
-    # Create or load Chroma collection
-    vectorstore = Chroma.from_texts(
-        texts=texts,
-        embedding=embedding_model,
-        metadatas=metadatas,
-        ids=ids,
-        persist_directory=persist_directory,
-        collection_name="brochure_vectors"
+# Read-only BM25 indexes per persist directory, reloaded when the version moves
+_lexical_indexes = {}
+_lexical_lock = threading.RLock()
+# Open ingestion batches per (persist directory, thread): nesting depth, the
+# BM25 changes and dedup index waiting to be saved and whether the collection
+# version must be bumped at the end. Keyed by thread so concurrent ingestions
+# (e.g. two upload jobs) each save their own changes when they finish.
+_ingestion_batches = {}
+
+
+def _current_batch(persist_directory):
+    # Caller holds _lexical_lock
+    return _ingestion_batches.get((persist_directory, threading.get_ident()))
+
+
+@contextmanager
+def ingestion_batch(persist_directory=CHROMA_DB_PATH):
+    """
+    Groups the index writes of several ingestions into `persist_directory`
+    made by the calling thread.
+
+    Inside the block BM25 changes are collected and the dedup index is kept
+    in memory; the BM25 index is loaded, updated and saved, the dedup index
+    saved and the collection version bumped once, when the outermost block
+    exits. Without a batch each ingested file rewrites both index files in
+    full.
+    """
+    key = (persist_directory, threading.get_ident())
+    with _lexical_lock:
+        batch = _ingestion_batches.setdefault(key, {"depth": 0, "lexical": [], "dedup": None, "bump": False})
+        batch["depth"] += 1
+    try:
+        yield
+    finally:
+        with _lexical_lock:
+            batch["depth"] -= 1
+            done = not batch["depth"]
+            if done:
+                del _ingestion_batches[key]
+                # Applied to the index on disk, which may hold other threads' changes by now
+                if batch["lexical"]:
+                    index = _apply_lexical_changes(load_lexical_index(persist_directory), batch["lexical"])
+                    index.save(persist_directory)
+                dedup = batch["dedup"]
+        # _dedup_lock is never taken while holding _lexical_lock
+        if done and dedup is not None:
+            with _dedup_lock:
+                _save_dedup_index(dedup, persist_directory)
+        if done and batch["bump"]:
+            _write_collection_version(persist_directory)
+
+
+def load_lexical_index(persist_directory=CHROMA_DB_PATH):
+    """
+    Loads the BM25 index persisted next to the Chroma database. If there is
+    none yet (e.g. a store built before hybrid search existed) it is rebuilt
+    from the chunks already in the collection and saved.
+    """
+    with _lexical_lock:
+        index = BM25Index.load(persist_directory)
+        if index is not None:
+            return index
+
+        print(f"[RAG] Building lexical index from Chroma collection in {persist_directory}")
+        stored = get_vectorstore(persist_directory)._collection.get(include=["documents", "metadatas"])
+        index = BM25Index()
+        index.add_chunks(
+            {"file_name": metadata["file_name"], "chunk_id": metadata["chunk_id"], "chunk_text": text or "",
+             "page": metadata.get("page")}
+            for text, metadata in zip(stored["documents"], stored["metadatas"])
+        )
+        index.save(persist_directory)
+        return index
+
+
+def update_lexical_index(persist_directory=CHROMA_DB_PATH, chunks=(), remove_files=(), remove_chunk_ids=()):
+    """
+    Applies an ingestion to the persisted BM25 index: drops every chunk of
+    `remove_files` and the chunks in `remove_chunk_ids`, then adds or
+    replaces `chunks`. Call before bump_collection_version so readers pick
+    the change up. Inside an ingestion_batch the index is saved when the
+    batch ends.
+    """
+    change = (list(chunks), list(remove_files), list(remove_chunk_ids))
+    with _lexical_lock:
+        batch = _current_batch(persist_directory)
+        if batch is not None:
+            batch["lexical"].append(change)
+            return
+        _apply_lexical_changes(load_lexical_index(persist_directory), [change]).save(persist_directory)
+
+
+def _apply_lexical_changes(index, changes):
+    for chunks, remove_files, remove_chunk_ids in changes:
+        for file_name in remove_files:
+            index.remove_file(file_name)
+        index.remove_chunks(remove_chunk_ids)
+        index.add_chunks(chunks)
+    return index
+
+
+def get_lexical_index(persist_directory=CHROMA_DB_PATH):
+    """Returns this process's BM25 index for the current collection version."""
+    version = get_collection_version(persist_directory)
+    cached = _lexical_indexes.get(persist_directory)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _lexical_lock:
+        index = load_lexical_index(persist_directory)
+        _lexical_indexes[persist_directory] = (version, index)
+        return index
+
+
+def lexical_search(query_text, top_k=3, persist_directory=CHROMA_DB_PATH, project_keys=()):
+    """
+    BM25 search over the stored chunks, returned as langchain Documents.
+    With `project_keys` only chunks of those projects are considered.
+    """
+    index = get_lexical_index(persist_directory)
+    file_filter = (lambda file_name: project_key(file_name) in project_keys) if project_keys else None
+    results = []
+    for doc_id, score in index.search(query_text, top_k, file_filter=file_filter):
+        doc = index.docs[doc_id]
+        metadata = chunk_metadata(doc["file_name"], doc["chunk_id"], doc.get("page"))
+        metadata["bm25_score"] = score
+        results.append(Document(page_content=doc["text"], metadata=metadata))
+    return results
+
+
+def fuse_rankings(rankings, top_k=3, k=HYBRID_RRF_K):
+    """
+    Reciprocal rank fusion: each chunk scores sum(1 / (k + rank)) over the
+    rankings it appears in. The first Document seen for a chunk is kept.
+    """
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = chunk_key(doc.metadata["file_name"], doc.metadata["chunk_id"])
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    ordered = sorted(scores, key=lambda key: -scores[key])
+    return [docs[key] for key in ordered[:top_k]]
+
+
+# Memory-mapped vector snapshots per persist directory, keyed by collection version
+_vector_indexes = {}
+_vector_index_lock = threading.Lock()
+
+
+def export_vector_index(persist_directory=CHROMA_DB_PATH):
+    """
+    Writes the collection's embeddings to the memory-mapped snapshot used by
+    the 'numpy' vector backend.
+
+    Returns:
+        int: Number of vectors exported.
+    """
+    version = get_collection_version(persist_directory)
+    stored = get_vectorstore(persist_directory)._collection.get(include=["embeddings", "documents", "metadatas"])
+    count = write_vector_index(
+        persist_directory, version, stored["ids"], stored["embeddings"], stored["documents"], stored["metadatas"]
     )
+    print(f"[RAG] Exported {count} vectors to the NumPy snapshot in {persist_directory}")
+    return count
 
-    # Save to disk
-    vectorstore.persist()
 
-    return vectorstore
+def get_vector_index(persist_directory=CHROMA_DB_PATH):
+    """
+    Returns this process's memory-mapped snapshot for the current collection
+    version. A missing or stale snapshot (e.g. after an upload) is re-exported
+    from Chroma first.
+    """
+    version = get_collection_version(persist_directory)
+    cached = _vector_indexes.get(persist_directory)
+    if cached is not None and cached.version == version:
+        return cached
+
+    with _vector_index_lock:
+        cached = _vector_indexes.get(persist_directory)
+        if cached is not None and cached.version == version:
+            return cached
+        index = VectorIndex.load(persist_directory)
+        if index is None or index.version != version:
+            export_vector_index(persist_directory)
+            index = VectorIndex.load(persist_directory)
+        _vector_indexes[persist_directory] = index
+        return index
+
+
+def numpy_vector_search(query_text, top_k=3, persist_directory=CHROMA_DB_PATH, project_keys=()):
+    """
+    Cosine similarity search over the memory-mapped snapshot, returned as
+    langchain Documents like Chroma's similarity_search.
+    """
+    index = get_vector_index(persist_directory)
+    query_vector = get_embedding_model().embed_query(query_text)
+    return [
+        Document(page_content=index.texts[row], metadata=dict(index.metadatas[row]))
+        for row, _ in index.search(query_vector, top_k, project_keys)
+    ]
 
 
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+def normalize_query(query_text):
+    """Lowercases and collapses whitespace so trivially different queries share a cache entry."""
+    return re.sub(r"\s+", " ", query_text or "").strip().lower()
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache with a TTL for retrieval results.
+
+    Each entry remembers the collection version it was computed against; a
+    lookup with a different version clears the cache.
+    """
 
-def query_brochures(query_text, top_k=3):
+    def __init__(self, max_size=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, version):
+        with self._lock:
+            self._check_version(key[0], version)
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, key, version, results):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._check_version(key[0], version)
+            self._entries[key] = (time.monotonic(), list(results))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _check_version(self, store, version):
+        # Caller holds the lock; entries are grouped by persist directory
+        if self._versions.get(store, version) != version:
+            for key in [k for k in self._entries if k[0] == store]:
+                del self._entries[key]
+            self.invalidations += 1
+        self._versions[store] = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+_query_cache = QueryCache()
+
+
+def get_query_cache_stats():
+    """Hit/miss counters of the process-wide retrieval cache."""
+    return _query_cache.stats()
+
+
+def clear_query_cache():
+    """Empties the retrieval cache and resets its counters."""
+    _query_cache.clear()
+
+
+def query_brochures(query_text, top_k=3, use_cache=True, mode=None, projects=None, backend=None):
     """
     Search the ChromaDB 'brochure_vectors' collection for the top-k
-    most relevant chunks to the given query text using cosine similarity.
+    most relevant chunks to the given query text.
+
+    `mode` selects cosine similarity ('vector'), BM25 over the lexical index
+    ('lexical') or reciprocal rank fusion of both ('hybrid'); it defaults to
+    RAG_SEARCH_MODE. `backend` picks what answers the vector part: Chroma
+    ('chroma') or the memory-mapped NumPy snapshot ('numpy'); it defaults to
+    RAG_VECTOR_BACKEND. `projects` restricts the search to chunks of those
+    projects (names are normalized with project_key) through the Chroma
+    `where` clause. Results are cached per (normalized query, top_k, mode,
+    backend, projects) until the TTL expires or an ingestion changes the
+    collection version.
     """
-    # Load the same embedding model used for indexing
-    embedding_model = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
+    return query_brochures_batch(
+        [{"query": query_text, "top_k": top_k, "projects": projects}], use_cache=use_cache, mode=mode, backend=backend
+    )[0]
+
+
+def query_brochures_batch(queries, use_cache=True, mode=None, backend=None):
+    """
+    Runs several searches at once: the queries that miss the cache are
+    embedded in one batched call, and their vector searches are sent to
+    Chroma (or the NumPy snapshot) together, one call per distinct
+    (top_k, projects) group. Each search returns what query_brochures would.
+
+    Args:
+        queries (list[dict]): Each with 'query' and optionally 'top_k'
+                              (default 3) and 'projects'.
+        use_cache (bool): Read and fill the retrieval cache.
+        mode (str): 'vector', 'lexical' or 'hybrid', for every query.
+        backend (str): 'chroma' or 'numpy', for every query.
+
+    Returns:
+        list[list[Document]]: The results of each query, in order.
+    """
+    mode = mode or SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of {', '.join(SEARCH_MODES)}")
+    backend = backend or VECTOR_BACKEND
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector backend '{backend}', expected one of {', '.join(VECTOR_BACKENDS)}")
 
     # Use environment variable if set, otherwise use default
     chroma_db_path = os.environ.get('CHROMA_DB_PATH', CHROMA_DB_PATH)
-    
-    # Ensure directory exists
-    os.makedirs(chroma_db_path, exist_ok=True)
-
-    # Reconnect to your ChromaDB collection
-    db = Chroma(
-        persist_directory=chroma_db_path,
-        collection_name="brochure_vectors",
-        embedding_function=embedding_model
+    version = get_collection_version(chroma_db_path)
+
+    searches = []
+    for item in queries:
+        query_text = item["query"]
+        top_k = item.get("top_k") or 3
+        project_keys, where = project_filter(item.get("projects"))
+        cache_key = (chroma_db_path, normalize_query(query_text), top_k, mode, backend, project_keys)
+        searches.append((query_text, top_k, project_keys, where, cache_key))
+
+    results = [None] * len(searches)
+    pending = {}
+    for i, search in enumerate(searches):
+        cache_key = search[4]
+        if use_cache:
+            cached = _query_cache.get(cache_key, version)
+            if cached is not None:
+                results[i] = cached
+                continue
+        # Repeats of a query in the batch are searched once
+        pending.setdefault(cache_key, []).append(i)
+
+    vector_results = {}
+    if mode != "lexical" and pending:
+        vector_k = {
+            cache_key: searches[rows[0]][1] if mode == "vector" else max(searches[rows[0]][1], HYBRID_CANDIDATES)
+            for cache_key, rows in pending.items()
+        }
+        vector_results = _vector_search_batch(
+            [(cache_key, searches[rows[0]][0], vector_k[cache_key], searches[rows[0]][2], searches[rows[0]][3])
+             for cache_key, rows in pending.items()],
+            backend, chroma_db_path
+        )
+
+    for cache_key, rows in pending.items():
+        query_text, top_k, project_keys, _, _ = searches[rows[0]]
+        if mode == "lexical":
+            found = lexical_search(query_text, top_k, chroma_db_path, project_keys)
+        elif mode == "vector":
+            found = vector_results[cache_key]
+        else:
+            candidates = max(top_k, HYBRID_CANDIDATES)
+            found = fuse_rankings(
+                [
+                    vector_results[cache_key],
+                    lexical_search(query_text, candidates, chroma_db_path, project_keys),
+                ],
+                top_k=top_k
+            )
+        if use_cache:
+            _query_cache.put(cache_key, version, found)
+        for i in rows:
+            results[i] = list(found)
+
+    return results
+
+
+def embed_queries(query_texts):
+    """Embeds several queries in one batched model call (the same vectors embed_query gives)."""
+    if not query_texts:
+        return []
+    return get_embedding_model().embed_documents(list(query_texts))
+
+
+def _vector_search_batch(searches, backend, persist_directory):
+    """
+    Vector searches for (key, query text, k, project keys, where) tuples,
+    with every query text embedded in one call.
+
+    Returns:
+        dict: Documents by key, best first.
+    """
+    texts = list(dict.fromkeys(text for _, text, _, _, _ in searches))
+    vectors = dict(zip(texts, embed_queries(texts)))
+
+    groups = {}
+    for key, text, k, project_keys, where in searches:
+        groups.setdefault((k, project_keys), (where, []))[1].append((key, vectors[text]))
+
+    found = {}
+    for (k, project_keys), (where, members) in groups.items():
+        keys = [key for key, _ in members]
+        query_vectors = [vector for _, vector in members]
+        if backend == "numpy":
+            index = get_vector_index(persist_directory)
+            for key, hits in zip(keys, index.search_many(query_vectors, k, project_keys)):
+                found[key] = [
+                    Document(page_content=index.texts[row], metadata=dict(index.metadatas[row])) for row, _ in hits
+                ]
+            continue
+        # One Chroma query for the whole group; cosine similarity under the hood
+        response = get_vectorstore(persist_directory)._collection.query(
+            query_embeddings=query_vectors, n_results=k, where=where, include=["documents", "metadatas"]
+        )
+        for key, texts_found, metadatas in zip(keys, response["documents"], response["metadatas"]):
+            found[key] = [
+                Document(page_content=text or "", metadata=metadata or {})
+                for text, metadata in zip(texts_found, metadatas)
+            ]
+    return found
+
+
+MANIFEST_FILE_NAME = "ingestion_manifest.json"
+
+
+def file_content_hash(file_path):
+    """Returns the SHA-256 hex digest of a file, read in 1 MB blocks."""
+    with open(file_path, 'rb') as f:
+        return stream_content_hash(f)
+
+
+def load_manifest(persist_directory=CHROMA_DB_PATH):
+    """
+    Loads the ingestion manifest stored next to the Chroma database.
+
+    Returns:
+        dict: {"metadata_version": int,
+               "files": {file_name: {"source", "sha256", "chunker", "chunk_size", "chunk_overlap", "chunks",
+                                    "ingested_at"}}}
+    """
+    manifest_path = os.path.join(persist_directory, MANIFEST_FILE_NAME)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {"files": {}}
+    except (OSError, ValueError) as e:
+        print(f"[WARNING] Ignoring unreadable ingestion manifest {manifest_path}: {e}")
+        return {"files": {}}
+    manifest.setdefault("files", {})
+    return manifest
+
+
+def save_manifest(manifest, persist_directory=CHROMA_DB_PATH):
+    """Atomically writes the ingestion manifest next to the Chroma database."""
+    os.makedirs(persist_directory, exist_ok=True)
+    manifest_path = os.path.join(persist_directory, MANIFEST_FILE_NAME)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+# Per-process (dedup index, file mtime) by persist directory; every access holds _dedup_lock
+_dedup_indexes = {}
+_dedup_lock = threading.RLock()
+
+
+def _dedup_file_mtime(persist_directory):
+    try:
+        return os.stat(os.path.join(persist_directory, DEDUP_INDEX_FILE_NAME)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _cached_dedup_index(persist_directory):
+    # Caller holds _dedup_lock; reloads when another process rewrote the file
+    mtime = _dedup_file_mtime(persist_directory)
+    cached = _dedup_indexes.get(persist_directory)
+    if cached is not None and cached[1] == mtime:
+        return cached[0]
+    index = DedupIndex.load(persist_directory, DEDUP_MAX_DISTANCE)
+    if index is None:
+        _dedup_indexes.pop(persist_directory, None)
+    else:
+        _dedup_indexes[persist_directory] = (index, mtime)
+    return index
+
+
+def _save_dedup_index(index, persist_directory):
+    # Caller holds _dedup_lock. Inside an ingestion_batch the file is written
+    # when the batch ends; until then this process keeps using `index`
+    with _lexical_lock:
+        batch = _current_batch(persist_directory)
+        if batch is not None:
+            batch["dedup"] = index
+    if batch is None:
+        index.save(persist_directory)
+    _dedup_indexes[persist_directory] = (index, _dedup_file_mtime(persist_directory))
+
+
+def get_dedup_index(persist_directory=CHROMA_DB_PATH):
+    """
+    Returns this process's dedup index for `persist_directory`. A store
+    without one (built before dedup existed, or while RAG_DEDUP was off) is
+    indexed from its collection first, and the duplicates found there are
+    removed.
+    """
+    with _dedup_lock:
+        index = _cached_dedup_index(persist_directory)
+        if index is None:
+            index = _build_dedup_index(persist_directory)
+        elif any("scope" not in entry for entry in index.entries.values()):
+            _split_dedup_scopes(index, persist_directory)
+        return index
+
+
+def _build_dedup_index(persist_directory):
+    collection = get_vectorstore(persist_directory)._collection
+    stored = collection.get(include=["documents", "metadatas"])
+    index = DedupIndex(max_distance=DEDUP_MAX_DISTANCE)
+    duplicate_ids = []
+    rows = sorted(
+        zip(stored["ids"], stored["documents"], stored["metadatas"]),
+        key=lambda row: (row[2]["file_name"], row[2]["chunk_id"])
     )
+    for chunk_id, text, metadata in rows:
+        scope = project_key(metadata["file_name"])
+        key = index.find(text or "", scope)
+        if key is None:
+            index.add_canonical(metadata["file_name"], metadata["chunk_id"], text or "", scope)
+        else:
+            index.add_source(key, metadata["file_name"], metadata["chunk_id"])
+            duplicate_ids.append(chunk_id)
+
+    if duplicate_ids:
+        collection.delete(ids=duplicate_ids)
+        update_lexical_index(persist_directory, remove_chunk_ids=duplicate_ids)
+        print(f"[DEDUP] Removed {len(duplicate_ids)} duplicate chunks from {persist_directory}")
+    _save_dedup_index(index, persist_directory)
+    if duplicate_ids:
+        bump_collection_version(persist_directory)
+    return index
+
+
+def _split_dedup_scopes(index, persist_directory):
+    # Indexes written before dedup was scoped per project can let one stored
+    # chunk stand for files of other projects, which project filters then miss
+    copies = index.split_scopes(project_key)
+    copied = _copy_stored_chunks(get_vectorstore(persist_directory), index, copies)
+    _save_dedup_index(index, persist_directory)
+    if copied:
+        update_lexical_index(persist_directory, chunks=copied)
+        bump_collection_version(persist_directory)
+        print(f"[DEDUP] Stored {len(copied)} chunks shared across projects once per project")
+
+
+def _discard_dedup_index(persist_directory):
+    # With dedup off the index would go stale; drop it so re-enabling rebuilds it
+    with _dedup_lock:
+        _dedup_indexes.pop(persist_directory, None)
+        try:
+            os.remove(os.path.join(persist_directory, DEDUP_INDEX_FILE_NAME))
+        except FileNotFoundError:
+            pass
+
+
+def chunk_sources(file_name, chunk_id, persist_directory=None):
+    """
+    File names a stored chunk stands for: its own file first, then every
+    file that contained the same or a near-duplicate chunk.
+    """
+    persist_directory = persist_directory or os.environ.get('CHROMA_DB_PATH', CHROMA_DB_PATH)
+    with _dedup_lock:
+        index = _cached_dedup_index(persist_directory)
+        if index is None:
+            return [file_name]
+        names = [source_file for source_file, _ in index.sources(chunk_key(file_name, chunk_id))]
+    return list(dict.fromkeys([file_name] + names))
 
-    # Perform semantic search (cosine similarity under the hood)
-    results = db.similarity_search(query_text, k=top_k)
 
-    # Display top results
-    for i, r in enumerate(results, 1):
-        # print(f"\n🔹 Result {i}")
-        # print(f"Source: {r.metadata['file_name']} | Chunk ID: {r.metadata['chunk_id']}")
-        # print(f"Text: {r.page_content[:300]}...")  # show first 300 chars
-        pass  # Query matched
+def _remove_file_from_store(vectorstore, file_name, persist_directory):
+    """
+    Deletes the chunks of `file_name`. Canonical chunks that other files
+    still share are first moved to the next of those files.
+
+    Returns:
+        list[dict]: The moved chunks ('file_name', 'chunk_id', 'chunk_text', 'page').
+    """
+    moved = []
+    if DEDUP_ENABLED:
+        with _dedup_lock:
+            index = get_dedup_index(persist_directory)
+            moved = _copy_stored_chunks(vectorstore, index, index.remove_file(file_name))
+            _save_dedup_index(index, persist_directory)
+    vectorstore._collection.delete(where={"file_name": file_name})
+    return moved
 
-    return results
 
+def _copy_stored_chunks(vectorstore, index, copies):
+    """
+    Stores the chunk under each (old key, new file_name, new chunk_id) of
+    `copies` again with its existing embedding, as DedupIndex.remove_file
+    and split_scopes ask for. Caller holds _dedup_lock.
+
+    Returns:
+        list[dict]: The new chunks ('file_name', 'chunk_id', 'chunk_text', 'page').
+    """
+    if not copies:
+        return []
+    stored = vectorstore._collection.get(
+        ids=[old_key for old_key, _, _ in copies], include=["embeddings", "documents", "metadatas"]
+    )
+    found = {
+        stored_id: (embedding, text, metadata or {})
+        for stored_id, embedding, text, metadata in zip(
+            stored["ids"], stored["embeddings"], stored["documents"], stored["metadatas"]
+        )
+    }
+    chunks = []
+    for old_key, new_file, new_chunk_id in copies:
+        if old_key not in found:
+            # Registered but never stored (e.g. a failed ingestion)
+            index.discard(chunk_key(new_file, new_chunk_id))
+            continue
+        embedding, text, metadata = found[old_key]
+        chunks.append({
+            "file_name": new_file,
+            "chunk_id": new_chunk_id,
+            "chunk_text": text,
+            # Page of the stored copy; the same text is normally on the same brochure page
+            "page": metadata.get("page"),
+            "embedding": [float(x) for x in embedding],
+        })
+    if chunks:
+        _upsert_chunks(vectorstore, chunks)
+    return [{k: c[k] for k in ("file_name", "chunk_id", "chunk_text", "page")} for c in chunks]
+
+
+def delete_file_chunks(file_name, persist_directory=CHROMA_DB_PATH):
+    """Removes every stored chunk of `file_name` from the collection."""
+    moved = _remove_file_from_store(get_vectorstore(persist_directory), file_name, persist_directory)
+    update_lexical_index(persist_directory, chunks=moved, remove_files=[file_name])
+    bump_collection_version(persist_directory)
+
+
+def ingest_pdf_stream(file_name, pages, persist_directory=CHROMA_DB_PATH, chunk_size=None, chunk_overlap=None,
+                      batch_size=EMBEDDING_BATCH_SIZE, replace=False, progress=None, chunker=None):
+    """
+    Streaming ingestion of one document: page -> chunk -> embedding batch ->
+    Chroma upsert. Peak memory is bounded by one chunking window plus one
+    embedding batch rather than the whole document.
+
+    Args:
+        file_name (str): Name the chunks are stored under.
+        pages (iterable[str]): Page texts, e.g. from pdf_extraction.iter_pdf_pages.
+        persist_directory (str): Folder path of the Chroma database.
+        chunk_size (int): Chunk size in tokens ('tokens' chunker) or characters
+                          ('chars'). Defaults to the chunker's default.
+        chunk_overlap (int): Chunk overlap, in the same unit.
+        batch_size (int): Chunks per embedding call and per upsert.
+        replace (bool): Delete the file's existing chunks first.
+        progress (callable): Optional progress(stage, counts) callback, called
+                             with stage 'extract', 'chunk', 'embed' or 'store'
+                             and running 'pages', 'chunks', 'duplicates',
+                             'embedded' and 'stored' counts.
+        chunker (str): 'tokens' or 'chars'. Defaults to RAG_CHUNKER.
+
+    With RAG_DEDUP on, chunks that duplicate an already stored chunk are
+    recorded as its sources instead of being embedded and stored.
+
+    Returns:
+        int: Number of chunks stored.
+    """
+    counts = {"pages": 0, "chunks": 0, "duplicates": 0, "embedded": 0, "stored": 0}
+
+    def report(stage, key, n=1):
+        counts[key] += n
+        if progress is not None:
+            progress(stage, dict(counts))
+
+    def counted_pages():
+        for text in pages:
+            report("extract", "pages")
+            yield text
+
+    def counted_chunks():
+        for chunk in iter_document_chunks(file_name, counted_pages(), chunker, chunk_size, chunk_overlap):
+            report("chunk", "chunks")
+            yield chunk
+
+    dedup = get_dedup_index(persist_directory) if DEDUP_ENABLED else None
+    if dedup is None:
+        _discard_dedup_index(persist_directory)
+
+    # Duplicates are only looked for within the document's project
+    scope = project_key(file_name)
+
+    def unique_chunks():
+        for chunk in counted_chunks():
+            if dedup is not None:
+                with _dedup_lock:
+                    key = dedup.find(chunk["chunk_text"], scope)
+                    if key is not None:
+                        dedup.add_source(key, chunk["file_name"], chunk["chunk_id"])
+                        report("chunk", "duplicates")
+                        continue
+                    dedup.add_canonical(chunk["file_name"], chunk["chunk_id"], chunk["chunk_text"], scope)
+            yield chunk
+
+    vectorstore = get_vectorstore(persist_directory)
+    moved = _remove_file_from_store(vectorstore, file_name, persist_directory) if replace else []
+
+    stored = []
+    try:
+        for batch in iter_embedded_batches(unique_chunks(), batch_size):
+            report("embed", "embedded", len(batch))
+            _upsert_chunks(vectorstore, batch)
+            report("store", "stored", len(batch))
+            # Only the text is kept for the lexical index, not the vectors
+            stored.extend(
+                {"file_name": c["file_name"], "chunk_id": c["chunk_id"], "chunk_text": c["chunk_text"],
+                 "page": c.get("page")}
+                for c in batch
+            )
+    finally:
+        if dedup is not None:
+            with _dedup_lock:
+                _save_dedup_index(dedup, persist_directory)
+            if counts["duplicates"]:
+                print(f"[DEDUP] {file_name}: {counts['duplicates']} duplicate chunks not stored again")
+        if replace or stored:
+            update_lexical_index(
+                persist_directory, chunks=moved + stored, remove_files=[file_name] if replace else []
+            )
+            bump_collection_version(persist_directory)
+    return len(stored)
+
+
+# Serializes manifest read-modify-write between concurrent ingestions in this process
+_manifest_lock = threading.Lock()
+
+
+def ingest_pdfs(file_paths, persist_directory=CHROMA_DB_PATH, chunk_size=None, chunk_overlap=None, prune_missing=False,
+                progress=None, chunker=None):
+    """
+    Incrementally ingests PDF files into Chroma using the ingestion manifest.
+
+    Files whose content hash and chunking parameters match the manifest are
+    skipped. New and changed files are streamed through ingest_pdf_stream,
+    and changed files have their old chunks removed first.
+
+    Args:
+        file_paths (list[str]): PDF files to ingest.
+        persist_directory (str): Folder path of the Chroma database.
+        chunk_size (int): Chunk size, see ingest_pdf_stream.
+        chunk_overlap (int): Chunk overlap, see ingest_pdf_stream.
+        prune_missing (bool): Also remove files from the store that were ingested
+                              from the same folder(s) but are no longer in `file_paths`.
+        progress (callable): Optional progress(file_name, stage, counts) callback,
+                             see ingest_pdf_stream.
+        chunker (str): 'tokens' or 'chars'. Defaults to RAG_CHUNKER.
+
+    Returns:
+        dict: File names per outcome ('added', 'updated', 'unchanged', 'removed',
+              'failed'), 'errors' by file name and the number of 'chunks_created'.
+    """
+    chunking = resolve_chunking(chunker, chunk_size, chunk_overlap)
+    with _ingestion_run(persist_directory) as (manifest, changes, summary):
+        files = manifest["files"]
+
+        # Work out which files are new or changed
+        pending = {}
+        for file_path in file_paths:
+            file_name = os.path.basename(file_path)
+            sha256 = file_content_hash(file_path)
+            entry = files.get(file_name)
+            if _manifest_entry_matches(entry, sha256, chunking):
+                summary["unchanged"].append(file_name)
+                continue
+            pending[file_name] = (file_path, sha256, "updated" if entry else "added")
+
+        # Drop files that disappeared from the source folder(s); files ingested
+        # from elsewhere (e.g. uploads) are left alone
+        if prune_missing:
+            present = {os.path.basename(p) for p in file_paths}
+            sources = {os.path.dirname(os.path.abspath(p)) for p in file_paths}
+            missing = [
+                file_name for file_name, entry in files.items()
+                if file_name not in present and entry.get("source") in sources
+            ]
+            for file_name in sorted(missing):
+                delete_file_chunks(file_name, persist_directory)
+                changes[file_name] = None
+                summary["removed"].append(file_name)
+
+        # With RAG_PDF_WORKERS > 1 the pending files are extracted up front by
+        # the process pool; otherwise each file is streamed page by page
+        loaded = {}
+        if PDF_EXTRACT_WORKERS > 1 and pending:
+            docs = _load_documents_parallel(
+                [file_path for file_path, _, _ in pending.values()], PDF_EXTRACT_WORKERS, PDF_EXTRACT_TIMEOUT,
+                with_pages=True
+            )
+            loaded = {doc["file_name"]: doc for doc in docs}
+
+        for file_name, (file_path, sha256, outcome) in pending.items():
+            if PDF_EXTRACT_WORKERS > 1:
+                doc = loaded.pop(file_name, None)
+                if doc is None:
+                    summary["failed"].append(file_name)
+                    continue
+                pages = doc["pages"]
+            else:
+                pages = (text for _, text in iter_pdf_pages(file_path))
+
+            _ingest_pending_file(
+                file_name, pages, os.path.dirname(os.path.abspath(file_path)), sha256, outcome,
+                persist_directory, chunking, progress, summary, changes
+            )
+    return summary
+
+
+# Manifest 'source' of documents ingested straight from an upload buffer
+UPLOAD_SOURCE = "upload"
+
+
+def ingest_pdf_buffer(file_name, buffer, persist_directory=CHROMA_DB_PATH, chunk_size=None, chunk_overlap=None,
+                      progress=None, chunker=None):
+    """
+    Ingests one PDF held in memory without writing it to disk.
+
+    Follows the same manifest rules as ingest_pdfs: an unchanged document is
+    skipped and a changed one replaces its old chunks.
+
+    Args:
+        file_name (str): Name the chunks are stored under.
+        buffer (file-like): Seekable binary stream with the PDF, e.g. io.BytesIO.
+        persist_directory (str): Folder path of the Chroma database.
+        chunk_size (int): Chunk size, see ingest_pdf_stream.
+        chunk_overlap (int): Chunk overlap, see ingest_pdf_stream.
+        progress (callable): Optional progress(file_name, stage, counts) callback,
+                             see ingest_pdf_stream.
+        chunker (str): 'tokens' or 'chars'. Defaults to RAG_CHUNKER.
+
+    Returns:
+        dict: The same summary as ingest_pdfs.
+    """
+    chunking = resolve_chunking(chunker, chunk_size, chunk_overlap)
+    with _ingestion_run(persist_directory) as (manifest, changes, summary):
+        sha256 = stream_content_hash(buffer)
+        entry = manifest["files"].get(file_name)
+        if _manifest_entry_matches(entry, sha256, chunking):
+            summary["unchanged"].append(file_name)
+        else:
+            _ingest_pending_file(
+                file_name, (text for _, text in iter_pdf_pages(buffer)), UPLOAD_SOURCE, sha256,
+                "updated" if entry else "added",
+                persist_directory, chunking, progress, summary, changes
+            )
+    return summary
+
+
+@contextmanager
+def _ingestion_run(persist_directory):
+    """
+    One ingest_pdfs or ingest_pdf_buffer call. Yields the manifest, the
+    manifest entries the call writes (None for a removed file) and its summary
+    inside an ingestion_batch, so the index files are saved once for the whole
+    call. The entries are recorded after the batch has saved the indexes, so
+    the manifest never lists a file they lack.
+    """
+    with ingestion_batch(persist_directory):
+        manifest, upgrade_metadata = _load_manifest_for_ingestion(persist_directory)
+        changes = {}
+        summary = {"added": [], "updated": [], "unchanged": [], "removed": [], "failed": [], "errors": {},
+                   "chunks_created": 0}
+        yield manifest, changes, summary
+    _commit_manifest_changes(persist_directory, changes, upgrade_metadata)
+    print(
+        f"[INGEST] added={len(summary['added'])} updated={len(summary['updated'])} "
+        f"unchanged={len(summary['unchanged'])} removed={len(summary['removed'])} "
+        f"failed={len(summary['failed'])} chunks={summary['chunks_created']}"
+    )
+
+
+def _load_manifest_for_ingestion(persist_directory):
+    manifest = load_manifest(persist_directory)
+    # Stores built before chunks carried a project key are tagged in place
+    upgrade_metadata = manifest.get("metadata_version", 1) < PROJECT_METADATA_VERSION
+    if upgrade_metadata and manifest["files"]:
+        backfill_project_metadata(persist_directory)
+    return manifest, upgrade_metadata
+
+
+def _manifest_entry_matches(entry, sha256, chunking):
+    chunker, chunk_size, chunk_overlap = chunking
+    return bool(
+        entry and entry.get("sha256") == sha256
+        # Entries written before the token chunker existed are 'chars'
+        and entry.get("chunker", "chars") == chunker
+        and entry.get("chunk_size") == chunk_size
+        and entry.get("chunk_overlap") == chunk_overlap
+    )
+
+
+def _ingest_pending_file(file_name, pages, source, sha256, outcome, persist_directory, chunking, progress, summary,
+                         changes):
+    """Streams one new or changed document into Chroma and records the outcome in `summary` and `changes`."""
+    chunker, chunk_size, chunk_overlap = chunking
+    try:
+        # Stale chunks of the previous version are removed before the new ones are stored
+        chunks_created = ingest_pdf_stream(
+            file_name,
+            pages,
+            persist_directory=persist_directory,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            replace=(outcome == "updated"),
+            progress=(lambda stage, counts: progress(file_name, stage, counts)) if progress else None,
+            chunker=chunker
+        )
+    except Exception as e:
+        print(f"Failed to ingest {file_name}: {e}")
+        # Drop any partial chunks so the next run starts clean
+        delete_file_chunks(file_name, persist_directory)
+        changes[file_name] = None
+        summary["failed"].append(file_name)
+        summary["errors"][file_name] = str(e)
+        return
+
+    changes[file_name] = {
+        "source": source,
+        "sha256": sha256,
+        "chunker": chunker,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "chunks": chunks_created,
+        "ingested_at": datetime.now(timezone.utc).isoformat(),
+    }
+    summary[outcome].append(file_name)
+    summary["chunks_created"] += chunks_created
+
+
+def _commit_manifest_changes(persist_directory, changes, upgrade_metadata):
+    if not changes and not upgrade_metadata:
+        return
+    # Merge into the latest manifest so concurrent ingestions do not drop each other's entries
+    with _manifest_lock:
+        manifest = load_manifest(persist_directory)
+        for file_name, entry in changes.items():
+            if entry is None:
+                manifest["files"].pop(file_name, None)
+            else:
+                manifest["files"][file_name] = entry
+        manifest["metadata_version"] = PROJECT_METADATA_VERSION
+        save_manifest(manifest, persist_directory)
 
 
 def build_chroma_db():
@@ -240,25 +1764,31 @@ def build_chroma_db():
         print("Please add PDF files to the folder and run again.")
         return
     
-    docs = load_documents(folder)
-    if not docs:
+    file_paths = [
+        os.path.join(folder, file_name)
+        for file_name in sorted(os.listdir(folder))
+        if file_name.lower().endswith('.pdf')
+    ]
+    if not file_paths:
         print(f"No PDF documents found in {folder}")
         return
     
     # Use environment variable for ChromaDB path
     chroma_db_path = os.environ.get('CHROMA_DB_PATH', CHROMA_DB_PATH)
     
-    chunks = split_into_chunks(docs)
-    embedded_chunks = generate_embeddings(chunks)
-    store_in_chromadb(embedded_chunks, persist_directory=chroma_db_path)
+    # Only new or changed PDFs are re-ingested
+    ingest_pdfs(file_paths, persist_directory=chroma_db_path, prune_missing=True)
+
+    # Snapshot for the memory-mapped 'numpy' vector backend
+    export_vector_index(chroma_db_path)
 
     print("✅ Chunks successfully stored in ChromaDB!")
 
 
-def query(query_text):
+def query(query_text, mode=None, projects=None):
     # Use the actual query text passed into the function
 
-    results = query_brochures(query_text)
+    results = query_brochures(query_text, mode=mode, projects=projects)
     return results
 
 if __name__ == "__main__":
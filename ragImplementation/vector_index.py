@@ -0,0 +1,142 @@
+"""
+Read-only NumPy snapshot of the Chroma collection for serving.
+
+The embeddings are written as one float32 matrix (rows L2-normalized) to a
+.npy file and opened with mmap_mode='r', so every worker process on a host
+shares the same page-cache pages instead of holding its own copy. A search
+is a single matrix-vector product over the mapped rows.
+"""
+import json
+import os
+
+import numpy as np
+
+VECTOR_INDEX_FILE_NAME = "vector_index.npy"
+VECTOR_INDEX_META_FILE_NAME = "vector_index.json"
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def write_vector_index(persist_directory, version, ids, embeddings, documents, metadatas):
+    """
+    Atomically writes a snapshot of the given collection contents.
+
+    Args:
+        persist_directory (str): Folder of the Chroma database.
+        version (str): Collection version the contents were read at.
+        ids, embeddings, documents, metadatas: As returned by collection.get().
+
+    Returns:
+        int: Number of vectors written.
+    """
+    os.makedirs(persist_directory, exist_ok=True)
+    if len(ids):
+        matrix = _normalize_rows(np.asarray(embeddings, dtype=np.float32)).astype(np.float32)
+    else:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+
+    index_path = os.path.join(persist_directory, VECTOR_INDEX_FILE_NAME)
+    meta_path = os.path.join(persist_directory, VECTOR_INDEX_META_FILE_NAME)
+    # Matrix first, then the metadata that names its version; readers check both
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, matrix)
+    os.replace(tmp_path, index_path)
+
+    tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": version,
+            "rows": len(ids),
+            "ids": list(ids),
+            "texts": [text or "" for text in documents],
+            "metadatas": list(metadatas),
+        }, f)
+    os.replace(tmp_path, meta_path)
+    return len(ids)
+
+
+class VectorIndex:
+    """A memory-mapped snapshot opened for searching."""
+
+    def __init__(self, matrix, version, ids, texts, metadatas):
+        self.matrix = matrix
+        self.version = version
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.projects = np.array([metadata.get("project", "") for metadata in metadatas], dtype=object)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query_vector, top_k=3, project_keys=()):
+        """
+        Cosine similarity of `query_vector` against every row.
+
+        Returns:
+            list[tuple[int, float]]: (row, score) pairs, best first.
+        """
+        return self.search_many([query_vector], top_k, project_keys)[0]
+
+    def search_many(self, query_vectors, top_k=3, project_keys=()):
+        """
+        Like search for several query vectors, scored with one matrix product.
+
+        Returns:
+            list[list[tuple[int, float]]]: (row, score) pairs per query, best first.
+        """
+        if not len(query_vectors):
+            return []
+        if not len(self.ids) or top_k <= 0:
+            return [[] for _ in query_vectors]
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+
+        scores = self.matrix @ (queries / norms).T
+
+        if project_keys:
+            rows = np.flatnonzero(np.isin(self.projects, list(project_keys)))
+            scores = scores[rows]
+        else:
+            rows = None
+        if not len(scores):
+            return [[] for _ in query_vectors]
+
+        top_k = min(top_k, scores.shape[0])
+        results = []
+        for column in scores.T:
+            best = np.argpartition(-column, top_k - 1)[:top_k]
+            best = best[np.argsort(-column[best], kind="stable")]
+            results.append([(int(rows[i]) if rows is not None else int(i), float(column[i])) for i in best])
+        return results
+
+    @classmethod
+    def load(cls, persist_directory):
+        """
+        Memory-maps the snapshot stored in `persist_directory`.
+
+        Returns:
+            VectorIndex | None: None if there is no readable, consistent snapshot.
+        """
+        index_path = os.path.join(persist_directory, VECTOR_INDEX_FILE_NAME)
+        meta_path = os.path.join(persist_directory, VECTOR_INDEX_META_FILE_NAME)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            matrix = np.load(index_path, mmap_mode="r")
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Ignoring unreadable vector index in {persist_directory}: {e}")
+            return None
+
+        if matrix.shape[0] != meta.get("rows"):
+            # Caught between the two writes of a snapshot
+            return None
+        return cls(matrix, meta.get("version", ""), meta["ids"], meta["texts"], meta["metadatas"])